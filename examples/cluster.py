@@ -88,7 +88,8 @@
 from signal import signal, SIGINT, SIG_IGN
 from subprocess import Popen, PIPE, STDOUT
 import os
-from random import randrange
+from random import randrange, Random
+from heapq import heappush, heappop
 import sys
 import re
 from itertools import groupby
@@ -332,7 +333,8 @@ def batchStartup( cls, switches, **_kwargs ):
             info( '(%s)' % server )
             group = tuple( switchGroup )
             switch = group[ 0 ]
-            OVSSwitch.batchStartup( group, run=switch.cmd )
+            # switch.cmd uses a single shell, so we can't shard
+            OVSSwitch.batchStartup( group, run=switch.cmd, shards=1 )
         return switches
 
     @classmethod
@@ -560,7 +562,7 @@ class Placer( object ):
     "Node placement algorithm for MininetCluster"
 
     def __init__( self, servers=None, nodes=None, hosts=None,
-                  switches=None, controllers=None, links=None ):
+                  switches=None, controllers=None, links=None, topo=None ):
         """Initialize placement object
            servers: list of servers
            nodes: list of all nodes
@@ -568,6 +570,7 @@ def __init__( self, servers=None, nodes=None, hosts=None,
            switches: list of switches
            controllers: list of controllers
            links: list of links
+           topo: Topo() being placed
            (all arguments are optional)
            returns: server"""
         self.servers = servers or []
@@ -576,6 +579,7 @@ def __init__( self, servers=None, nodes=None, hosts=None,
         self.switches = switches or []
         self.controllers = controllers or []
         self.links = links or []
+        self.topo = topo
 
     def place( self, node ):
         "Return server for a given node"
@@ -720,6 +724,282 @@ def place( self, nodename ):
         return server
 
 
+class GraphPartitionPlacer( Placer ):
+    """Multilevel graph partitioning placement (similar to METIS):
+       place nodes so that few (and low-bandwidth) links cross
+       servers, while balancing node count and configured link
+       bandwidth across servers.
+       The topology graph is repeatedly coarsened by heavy-edge
+       matching, the coarsest graph is partitioned by greedy region
+       growing, and the partition is projected back and refined
+       (by greedy boundary moves) at each level."""
+
+    def __init__( self, *args, **kwargs ):
+        """topo: Topo() to partition (for link bandwidths;
+                 otherwise links are used with unit weights)
+           imbalance: allowed imbalance factor (default 1.05)
+           seed: random seed (placement is deterministic)
+           passes: maximum refinement passes per level"""
+        self.imbalance = kwargs.pop( 'imbalance', 1.05 )
+        self.passes = kwargs.pop( 'passes', 8 )
+        self.random = Random( kwargs.pop( 'seed', 0 ) )
+        Placer.__init__( self, *args, **kwargs )
+        self.placement = self.calculatePlacement()
+
+    def graph( self ):
+        """Build weighted graph from topology
+           returns: names, adjacency dicts, node counts,
+                    node bandwidths (or None)"""
+        if self.topo:
+            links = self.topo.links( withInfo=True )
+            bws = [ params.get( 'bw' ) for _src, _dst, params in links ]
+        else:
+            links = [ ( src, dst, None ) for src, dst in self.links ]
+            bws = [ None ] * len( links )
+        # Unshaped links are treated like the fastest shaped link
+        maxbw = max( [ bw for bw in bws if bw ] or [ 1 ] )
+        names = list( self.nodes ) or sorted(
+            set( src for src, _dst, _params in links ) |
+            set( dst for _src, dst, _params in links ) )
+        ids = { name: i for i, name in enumerate( names ) }
+        adj = [ {} for _ in names ]
+        nodebw = [ 0 ] * len( names )
+        for ( src, dst, _params ), bw in zip( links, bws ):
+            u, v, w = ids[ src ], ids[ dst ], bw or maxbw
+            nodebw[ u ] += w
+            nodebw[ v ] += w
+            if u != v:
+                adj[ u ][ v ] = adj[ u ].get( v, 0 ) + w
+                adj[ v ][ u ] = adj[ v ].get( u, 0 ) + w
+        counts = [ 1 ] * len( names )
+        # Only balance bandwidth if some bandwidth is configured
+        if not any( bws ):
+            nodebw = None
+        return names, adj, counts, nodebw
+
+    @staticmethod
+    def coarsen( adj, weights, maxWeights, order ):
+        """Coarsen graph by heavy-edge matching
+           adj: adjacency dicts
+           weights: list of per-node weight lists (one per constraint)
+           maxWeights: maximum coarse node weight per constraint
+           order: node visiting order
+           returns: coarse node map, coarse adj, coarse weights"""
+        n = len( adj )
+        cmap = [ -1 ] * n
+        cn = 0
+
+        def fits( u, v ):
+            "Can u and v be merged?"
+            return all( wt[ u ] + wt[ v ] <= maxw
+                        for wt, maxw in zip( weights, maxWeights ) )
+
+        unmatched = []
+        for v in order:
+            if cmap[ v ] >= 0:
+                continue
+            best, bestw = None, 0
+            for u, w in adj[ v ].iteritems():
+                if cmap[ u ] < 0 and w > bestw and u != v and fits( u, v ):
+                    best, bestw = u, w
+            cmap[ v ] = cn
+            if best is not None:
+                cmap[ best ] = cn
+            else:
+                unmatched.append( v )
+            cn += 1
+        # Two-hop matching: merge unmatched leaves (e.g. hosts) that
+        # share a neighbor (e.g. a switch), since otherwise stars
+        # would only shrink by one node per level
+        leafFor = {}
+        for v in unmatched:
+            if len( adj[ v ] ) != 1:
+                continue
+            nbr = next( iter( adj[ v ] ) )
+            u = leafFor.pop( nbr, None )
+            if u is None:
+                leafFor[ nbr ] = v
+            elif fits( u, v ):
+                cmap[ v ] = cmap[ u ]
+            else:
+                leafFor[ nbr ] = v
+        # Renumber coarse nodes
+        renumber = {}
+        for v in xrange( n ):
+            cmap[ v ] = renumber.setdefault( cmap[ v ], len( renumber ) )
+        cn = len( renumber )
+        cadj = [ {} for _ in xrange( cn ) ]
+        for v in xrange( n ):
+            cv, cnbrs = cmap[ v ], cadj[ cmap[ v ] ]
+            for u, w in adj[ v ].iteritems():
+                cu = cmap[ u ]
+                if cu != cv:
+                    cnbrs[ cu ] = cnbrs.get( cu, 0 ) + w
+        cweights = []
+        for wt in weights:
+            cwt = [ 0 ] * cn
+            for v in xrange( n ):
+                cwt[ cmap[ v ] ] += wt[ v ]
+            cweights.append( cwt )
+        return cmap, cadj, cweights
+
+    def grow( self, adj, weights, k ):
+        """Initial partition by greedy region growing: each part
+           grows from a seed node, adding the frontier node which
+           most reduces the cut, until it reaches its share of load
+           returns: part list"""
+        n = len( adj )
+        totals = [ float( sum( wt ) ) or 1.0 for wt in weights ]
+        degree = [ sum( nbrs.itervalues() ) for nbrs in adj ]
+        part = [ -1 ] * n
+        unassigned = set( xrange( n ) )
+        for p in xrange( k - 1 ):
+            loads = [ 0 ] * len( weights )
+            # conn[ u ]: weight of links from u to part p;
+            # frontier: heap of ( -gain, u ), with stale entries
+            conn, frontier = {}, []
+            while unassigned and max(
+                    load / total for load, total in zip( loads, totals )
+                    ) < 1.0 / k:
+                v = None
+                while frontier and v is None:
+                    gain, u = heappop( frontier )
+                    if part[ u ] < 0 and -gain == 2 * conn[ u ] - degree[ u ]:
+                        v = u
+                if v is None:
+                    v = self.random.choice( list( unassigned ) )
+                part[ v ] = p
+                unassigned.discard( v )
+                for i, wt in enumerate( weights ):
+                    loads[ i ] += wt[ v ]
+                for u, w in adj[ v ].iteritems():
+                    if part[ u ] < 0:
+                        conn[ u ] = conn.get( u, 0 ) + w
+                        heappush( frontier,
+                                  ( degree[ u ] - 2 * conn[ u ], u ) )
+        for v in unassigned:
+            part[ v ] = k - 1
+        return part
+
+    @staticmethod
+    def cut( adj, part ):
+        "Return total weight of links between parts"
+        return sum( w for v, nbrs in enumerate( adj )
+                    for u, w in nbrs.iteritems()
+                    if part[ u ] != part[ v ] ) / 2
+
+    def refine( self, adj, weights, part, k, limits ):
+        """Refine partition in place by greedy boundary moves,
+           first moving nodes out of overweight parts"""
+        loads = [ [ 0 ] * k for _ in weights ]
+        for i, wt in enumerate( weights ):
+            for v, p in enumerate( part ):
+                loads[ i ][ p ] += wt[ v ]
+
+        def fits( v, p ):
+            "Can we move v to part p?"
+            return all( load[ p ] + wt[ v ] <= limit
+                        for load, wt, limit in zip( loads, weights, limits ) )
+
+        def over( p ):
+            "Is part p overweight?"
+            return any( load[ p ] > limit
+                        for load, limit in zip( loads, limits ) )
+
+        order = range( len( adj ) )
+        for _ in xrange( self.passes ):
+            self.random.shuffle( order )
+            moved = 0
+            for v in order:
+                a = part[ v ]
+                conn = {}
+                for u, w in adj[ v ].iteritems():
+                    conn[ part[ u ] ] = conn.get( part[ u ], 0 ) + w
+                overweight = over( a )
+                if not overweight and len( conn ) == 1 and a in conn:
+                    # Interior node of a balanced part
+                    continue
+                candidates = conn.keys() if not overweight else range( k )
+                best, bestgain = None, None
+                for b in candidates:
+                    if b == a or not fits( v, b ):
+                        continue
+                    gain = conn.get( b, 0 ) - conn.get( a, 0 )
+                    if bestgain is None or gain > bestgain:
+                        best, bestgain = b, gain
+                if best is None or ( bestgain <= 0 and not overweight ):
+                    continue
+                part[ v ] = best
+                for load, wt in zip( loads, weights ):
+                    load[ a ] -= wt[ v ]
+                    load[ best ] += wt[ v ]
+                moved += 1
+            if not moved:
+                break
+        return part
+
+    def partition( self, adj, weights, k ):
+        """Multilevel k-way partition
+           adj: adjacency dicts
+           weights: list of per-node weight lists
+           k: number of parts
+           returns: part list"""
+        totals = [ sum( wt ) for wt in weights ]
+        # Coarsen until the graph is small or stops shrinking
+        levels = []
+        maxWeights = [ 1.5 * total / ( 20 * k ) for total in totals ]
+        while len( adj ) > 20 * k:
+            order = range( len( adj ) )
+            self.random.shuffle( order )
+            cmap, cadj, cweights = self.coarsen( adj, weights,
+                                                 maxWeights, order )
+            if len( cadj ) > 0.95 * len( adj ):
+                break
+            levels.append( ( cmap, adj, weights ) )
+            adj, weights = cadj, cweights
+        # Partition coarsest graph, keeping the best of a few tries
+        limits = [ max( self.imbalance * total / k,
+                        float( total ) / k + max( wt ) )
+                   for total, wt in zip( totals, weights ) ]
+        best, bestcut = None, None
+        for _ in xrange( 4 ):
+            part = self.refine( adj, weights,
+                                self.grow( adj, weights, k ), k, limits )
+            cut = self.cut( adj, part )
+            if bestcut is None or cut < bestcut:
+                best, bestcut = part, cut
+        part = best
+        # Project back to the original graph, refining at each level
+        for cmap, adj, weights in reversed( levels ):
+            part = [ part[ cv ] for cv in cmap ]
+            limits = [ max( self.imbalance * total / k,
+                            float( total ) / k + max( wt ) )
+                       for total, wt in zip( totals, weights ) ]
+            part = self.refine( adj, weights, part, k, limits )
+        return part
+
+    def calculatePlacement( self ):
+        "Pre-calculate node placement"
+        names, adj, counts, nodebw = self.graph()
+        weights = [ counts ] + ( [ nodebw ] if nodebw else [] )
+        k = len( self.servers )
+        if k > 1 and names:
+            part = self.partition( adj, weights, k )
+        else:
+            part = [ 0 ] * len( names )
+        placement = { name: self.servers[ p ]
+                      for name, p in zip( names, part ) }
+        # Controllers aren't part of the graph; just spread them out
+        for i, controller in enumerate( self.controllers ):
+            placement[ controller ] = self.servers[ i % k ]
+        return placement
+
+    def place( self, node ):
+        """Graph partition placement:
+           place nodes to minimize cross-server links"""
+        return self.placement[ node ]
+
+
 # The MininetCluster class is not strictly necessary.
 # However, it has several purposes:
 # 1. To set up ssh connection sharing/multiplexing
@@ -821,7 +1101,8 @@ def placeNodes( self ):
                                  nodes=self.topo.nodes(),
                                  hosts=self.topo.hosts(),
                                  switches=self.topo.switches(),
-                                 links=self.topo.links() )
+                                 links=self.topo.links(),
+                                 topo=self.topo )
         for node in nodes:
             config = self.topo.nodeInfo( node )
             # keep local server name consistent accross nodes
@@ -0,0 +1,177 @@
+#!/usr/bin/python
+
+"""
+controllerbench.py: measure OpenFlow controller flow setup rate,
+in the style of cbench.
+
+A number of emulated OpenFlow 1.0 switches (plain TCP connections)
+connect to a controller and keep a window of packet-ins outstanding,
+each for a pair of MAC addresses the controller has already learned;
+we count the flow-mods the controller sends back per second.
+
+The built-in Python controller (mininet.ofcontroller) is always
+measured; the reference controller and ovs-testcontroller are also
+measured if they are installed. No switches are created, so it
+does not require root.
+
+Usage: controllerbench.py [switches [seconds [window]]]
+"""
+
+import socket
+import struct
+import sys
+from distutils.spawn import find_executable
+from select import poll, POLLIN
+from subprocess import Popen
+from time import time, sleep
+
+from mininet.ofcontroller import ( OFP10, HELLO, ECHO_REQUEST,
+                                   ECHO_REPLY, FEATURES_REQUEST,
+                                   FEATURES_REPLY, PACKET_IN, FLOW_MOD,
+                                   NO_BUFFER, header, message )
+from mininet.node import PyController
+from mininet.log import setLogLevel, info
+
+
+class FakeSwitch( object ):
+    "Emulated OpenFlow 1.0 switch which only sends packet-ins"
+
+    hosts = 16  # MAC addresses per switch, one per port
+
+    def __init__( self, dpid, port ):
+        self.dpid = dpid
+        self.sock = socket.create_connection( ( '127.0.0.1', port ) )
+        self.sock.setsockopt( socket.IPPROTO_TCP, socket.TCP_NODELAY, 1 )
+        self.inbuf = ''
+        self.flowMods = 0
+        self.packets = 0
+        self.sock.sendall( message( OFP10, HELLO ) )
+
+    def mac( self, host ):
+        "Return MAC address bytes for host"
+        return struct.pack( '!HI', self.dpid, host )
+
+    def packetIn( self ):
+        "Return PACKET_IN from one host to another"
+        self.packets += 1
+        src = self.packets % self.hosts
+        dst = ( src + 1 + self.packets // self.hosts ) % self.hosts
+        if dst == src:
+            dst = ( dst + 1 ) % self.hosts
+        frame = ( self.mac( dst ) + self.mac( src ) + '\x08\x00' +
+                  '\0' * 46 )
+        return message( OFP10, PACKET_IN, struct.pack(
+            '!IHHBx', NO_BUFFER, len( frame ), src + 1, 0 ) + frame )
+
+    def learn( self ):
+        "Send one packet-in from every host so the controller learns it"
+        self.sock.sendall( ''.join( self.packetIn()
+                                    for _ in range( self.hosts ) ) )
+
+    def read( self ):
+        """Read and answer messages from controller
+           returns: number of new flow-mods"""
+        data = self.sock.recv( 65536 )
+        if not data:
+            raise Exception( 'controller closed connection' )
+        self.inbuf += data
+        replies, flowMods = [], 0
+        while len( self.inbuf ) >= header.size:
+            _version, msgType, length, xid = header.unpack_from(
+                self.inbuf )
+            if len( self.inbuf ) < length:
+                break
+            body = self.inbuf[ header.size: length ]
+            self.inbuf = self.inbuf[ length: ]
+            if msgType == FLOW_MOD:
+                flowMods += 1
+            elif msgType == ECHO_REQUEST:
+                replies.append( message( OFP10, ECHO_REPLY, body, xid ) )
+            elif msgType == FEATURES_REQUEST:
+                replies.append( message( OFP10, FEATURES_REPLY,
+                                         struct.pack( '!QIB3xII',
+                                                      self.dpid, 256, 1,
+                                                      0, 0 ), xid ) )
+        if replies:
+            self.sock.sendall( ''.join( replies ) )
+        self.flowMods += flowMods
+        return flowMods
+
+
+def benchmark( port, switches=16, seconds=5, window=32 ):
+    """Drive the controller on port with fake switches
+       returns: flow-mods per second"""
+    fakes = [ FakeSwitch( dpid, port ) for dpid in range( 1, switches + 1 ) ]
+    poller = poll()
+    byFd = {}
+    for fake in fakes:
+        byFd[ fake.sock.fileno() ] = fake
+        poller.register( fake.sock.fileno(), POLLIN )
+    # Handshake and let the controller learn every host
+    for fake in fakes:
+        fake.learn()
+    end = time() + 1
+    while time() < end:
+        for fd, _event in poller.poll( 100 ):
+            byFd[ fd ].read()
+    for fake in fakes:
+        fake.flowMods = 0
+        fake.sock.sendall( ''.join( fake.packetIn()
+                                    for _ in range( window ) ) )
+    start = time()
+    end = start + seconds
+    while time() < end:
+        for fd, _event in poller.poll( 100 ):
+            fake = byFd[ fd ]
+            count = fake.read()
+            # Keep the window of outstanding packet-ins full
+            if count:
+                fake.sock.sendall( ''.join( fake.packetIn()
+                                            for _ in range( count ) ) )
+    elapsed = time() - start
+    for fake in fakes:
+        fake.sock.close()
+    return sum( fake.flowMods for fake in fakes ) / elapsed
+
+
+def waitListening( port, timeout=5 ):
+    "Wait for a controller to listen on port"
+    end = time() + timeout
+    while time() < end:
+        try:
+            socket.create_connection( ( '127.0.0.1', port ) ).close()
+            return True
+        except socket.error:
+            sleep( .1 )
+    return False
+
+
+def controllerBench( switches=16, seconds=5, window=32, port=16653 ):
+    "Measure the built-in controller and any installed C controllers"
+    commands = [ ( 'PyController', [ sys.executable, PyController.script,
+                                     '--port', str( port ) ] ) ]
+    for name in 'controller', 'ovs-testcontroller', 'test-controller':
+        path = find_executable( name )
+        if path:
+            commands.append( ( name, [ path, 'ptcp:%d' % port ] ) )
+    info( '*** %d switches, window %d, %d seconds per controller\n' %
+          ( switches, window, seconds ) )
+    results = {}
+    for name, args in commands:
+        proc = Popen( args )
+        try:
+            if not waitListening( port ):
+                info( '*** %s: not listening on port %d\n' % ( name, port ) )
+                continue
+            results[ name ] = benchmark( port, switches, seconds, window )
+            info( '*** %s: %.0f flow-mods/s\n' % ( name, results[ name ] ) )
+        finally:
+            proc.terminate()
+            proc.wait()
+    return results
+
+
+if __name__ == '__main__':
+    setLogLevel( 'info' )
+    args = [ int( arg ) for arg in sys.argv[ 1: ] ]
+    controllerBench( *args )
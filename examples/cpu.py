@@ -67,7 +67,7 @@ def bwtest( cpuLimits, period_us=100000, seconds=10 ):
             # the client's buffer fill rate
             popen = server.popen( 'iperf -yc -s -p 5001' )
             waitListening( client, server, 5001 )
-            popen.stdout.readline()  # ignore empty result from waitListening/telnet
+            popen.stdout.readline()  # ignore empty result from waitListening
             client.cmd( 'iperf -yc -t %s -c %s' % ( seconds, server.IP() ) )
             result = popen.stdout.readline().split( ',' )
             bps = float( result[ -1 ] )
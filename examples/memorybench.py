@@ -0,0 +1,67 @@
+#!/usr/bin/python
+
+"""
+memorybench.py: measure the Python memory used by Mininet's
+interface and link bookkeeping for large tree topologies.
+
+The nodes used here have no shells and run no commands, so only
+the cost of the Node, Intf and Link objects themselves is measured.
+It does not require root.
+
+Usage: memorybench.py [depth [fanout]]
+"""
+
+import sys
+from resource import getrusage, RUSAGE_SELF
+
+from mininet.node import Node
+from mininet.link import Link
+from mininet.topolib import TreeTopo
+from mininet.log import setLogLevel, info
+
+
+class BookkeepingNode( Node ):
+    "Node without a shell, for measuring bookkeeping overhead"
+
+    isSetup = True  # no dependencies to check
+
+    def __init__( self, name, **params ):
+        Node.__init__( self, name, inNamespace=False, **params )
+
+    def startShell( self, *_args, **_kwargs ):
+        "Don't start a shell"
+        pass
+
+    def cmd( self, *_args, **_kwargs ):
+        "Pretend that every command succeeds silently"
+        return ''
+
+
+def maxrss():
+    "Return maximum resident set size in KB"
+    return getrusage( RUSAGE_SELF ).ru_maxrss
+
+
+def memoryBench( depth=4, fanout=10 ):
+    """Build a tree of bookkeeping-only nodes and links
+       and report memory use per interface"""
+    topo = TreeTopo( depth=depth, fanout=fanout )
+    info( '*** Tree depth=%d fanout=%d: %d nodes, %d links\n' %
+          ( depth, fanout, len( topo.nodes() ), len( topo.links() ) ) )
+    start = maxrss()
+    nodes = { name: BookkeepingNode( name ) for name in topo.nodes() }
+    afterNodes = maxrss()
+    links = [ Link( nodes[ src ], nodes[ dst ] )
+              for src, dst in topo.links() ]
+    end = maxrss()
+    intfs = 2 * len( links )
+    info( '*** Nodes: %d KB\n' % ( afterNodes - start ) )
+    info( '*** Links and interfaces: %d KB (%.0f bytes/interface)\n' %
+          ( end - afterNodes, 1024.0 * ( end - afterNodes ) / intfs ) )
+    return nodes, links
+
+
+if __name__ == '__main__':
+    setLogLevel( 'info' )
+    args = [ int( arg ) for arg in sys.argv[ 1: ] ]
+    memoryBench( *args )
@@ -0,0 +1,78 @@
+#!/usr/bin/python
+
+"""
+pinbench.py: compare round-robin and topology-aware CPU pinning
+
+For each pinning strategy, we build a tree network of CPU-limited
+hosts, run iperf between pairs of hosts on the same edge switch (all
+pairs at once), and ping between the other hosts at the same time.
+We report total iperf throughput and the mean ping jitter (mdev).
+
+Usage: pinbench.py [depth [fanout [seconds]]]
+"""
+
+import re
+import sys
+from functools import partial
+
+from mininet.net import Mininet
+from mininet.node import CPULimitedHost
+from mininet.topolib import TreeTopo
+from mininet.cpuplan import CpuPlanner
+from mininet.util import pmonitor
+from mininet.log import setLogLevel, info, output
+
+
+def runTraffic( net, seconds ):
+    """Run iperf between neighboring hosts and ping between the others
+       returns: total iperf Mbps, mean ping mdev in ms"""
+    hosts = net.hosts
+    pairs = [ hosts[ i: i + 2 ] for i in range( 0, len( hosts ) - 1, 4 ) ]
+    pingers = [ hosts[ i: i + 2 ] for i in range( 2, len( hosts ) - 1, 4 ) ]
+    popens = {}
+    for server, _client in pairs:
+        server.cmd( 'iperf -s -p 5001 &' )
+    for server, client in pairs:
+        popens[ client ] = client.popen(
+            'iperf -y c -p 5001 -t %d -c %s' % ( seconds, server.IP() ) )
+    for src, dst in pingers:
+        popens[ src ] = src.popen( 'ping -q -i .05 -w %d %s' %
+                                   ( seconds, dst.IP() ) )
+    outputs = {}
+    for host, line in pmonitor( popens ):
+        if host:
+            outputs[ host ] = outputs.get( host, '' ) + line
+    for server, _client in pairs:
+        server.cmd( 'kill %iperf' )
+    bps = sum( float( outputs.get( client, '0' ).strip().split( ',' )[ -1 ]
+                      or 0 ) for _server, client in pairs )
+    mdevs = [ float( m.group( 1 ) ) for src, _dst in pingers for m in
+              [ re.search( r'= [\d.]+/[\d.]+/[\d.]+/([\d.]+) ms',
+                           outputs.get( src, '' ) ) ] if m ]
+    return bps / 1e6, sum( mdevs ) / max( len( mdevs ), 1 )
+
+
+def pinBench( depth=2, fanout=4, seconds=10 ):
+    "Compare round-robin and topology-aware pinning"
+    topo = TreeTopo( depth=depth, fanout=fanout )
+    # Hosts share half of the system's CPU time
+    host = partial( CPULimitedHost, cpu=.5 / len( topo.hosts() ) )
+    results = {}
+    for name, pin in ( ( 'round-robin', True ),
+                       ( 'topology', CpuPlanner( switchCores=1 ) ) ):
+        info( '*** Testing %s pinning\n' % name )
+        net = Mininet( topo=topo, host=host, autoPinCpus=pin,
+                       waitConnected=True )
+        net.start()
+        results[ name ] = runTraffic( net, seconds )
+        net.stop()
+    for name, ( mbps, jitter ) in sorted( results.items() ):
+        output( '%s: %.1f Mbps iperf, %.3f ms ping mdev\n' %
+                ( name, mbps, jitter ) )
+    return results
+
+
+if __name__ == '__main__':
+    setLogLevel( 'info' )
+    args = [ int( arg ) for arg in sys.argv[ 1: ] ]
+    pinBench( *args )
@@ -0,0 +1,527 @@
+"""
+Direct cgroup filesystem access for resource-limited hosts
+
+Rather than running cgcreate, cgset, cgget, cgclassify and cgdelete
+(one process each, per host and parameter), we create cgroups with
+mkdir(), set and read parameters by writing and reading their files,
+move processes by writing to cgroup.procs and remove cgroups with
+rmdir(). A parameter write fails with IOError if the kernel rejects
+its value, so there is no need to read values back.
+
+Both cgroup hierarchies are supported, and detected automatically:
+
+- CgroupV1: separate (or co-mounted) controller hierarchies at
+  /sys/fs/cgroup/<controller>/<name>
+- CgroupV2: one unified hierarchy at /sys/fs/cgroup/<name>, with
+  controllers enabled in the root's cgroup.subtree_control
+
+makeCgroup( name ) returns a cgroup of the right type. Besides CPU
+bandwidth and placement, cgroups can limit memory, processes and block
+I/O, and report how often those limits (and CPU quotas) were hit.
+
+CpuSampler samples CPU usage and throttling of many cgroups at short
+intervals, reading stat files which it keeps open.
+"""
+
+import errno
+import os
+import threading
+from array import array
+from time import sleep, time
+
+
+cgroupRoot = '/sys/fs/cgroup'
+
+def cgroupVersion( root=cgroupRoot ):
+    "Return 2 for a unified (v2-only) cgroup hierarchy, else 1"
+    return 2 if os.path.exists(
+        os.path.join( root, 'cgroup.controllers' ) ) else 1
+
+def writeFile( path, value ):
+    "Write value to a cgroup (or other kernel) file"
+    with open( path, 'w' ) as f:
+        f.write( '%s\n' % value )
+
+def readFile( path ):
+    "Return contents of a cgroup (or other kernel) file"
+    with open( path ) as f:
+        return f.read()
+
+def sizeBytes( size ):
+    """Convert size with optional K, M, G or T suffix (e.g. '512M')
+       to bytes; None and -1 (unlimited) are returned unchanged"""
+    if size is None or isinstance( size, ( int, long ) ):
+        return size
+    size = str( size ).strip().upper().rstrip( 'B' )
+    units = { 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40 }
+    if size and size[ -1 ] in units:
+        return int( float( size[ :-1 ] ) * units[ size[ -1 ] ] )
+    return int( size )
+
+def deviceNumber( device ):
+    "Return major:minor for a block device path (or major:minor)"
+    if ':' in device:
+        return device
+    rdev = os.stat( device ).st_rdev
+    return '%d:%d' % ( os.major( rdev ), os.minor( rdev ) )
+
+
+class Cgroup( object ):
+    "A cgroup for one node, managed through the cgroup filesystem"
+
+    version = None
+    # Controllers to use if none are specified
+    defaultControllers = ( 'cpu', 'cpuacct', 'cpuset' )
+
+    def __init__( self, name, controllers=None, root=cgroupRoot ):
+        """name: cgroup name (usually the node name)
+           controllers: controllers to use (defaultControllers)
+           root: cgroup filesystem mount point"""
+        self.name = name
+        self.controllers = tuple( controllers or self.defaultControllers )
+        self.root = root
+        for path in self.dirs():
+            try:
+                os.mkdir( path )
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+    def dirs( self ):
+        "Return our cgroup directories"
+        raise NotImplementedError
+
+    def filename( self, resource, param ):
+        "Return path of resource.param"
+        raise NotImplementedError
+
+    def set( self, resource, param, value ):
+        "Set resource.param to value"
+        writeFile( self.filename( resource, param ), value )
+
+    def get( self, resource, param ):
+        "Return value of resource.param (a string)"
+        return readFile( self.filename( resource, param ) ).strip()
+
+    def addPid( self, pid, resources=None ):
+        """Move process pid into our cgroup
+           resources: v1 controllers to move it in (all)"""
+        raise NotImplementedError
+
+    def delete( self, timeout=1.0 ):
+        """Remove our cgroup, retrying while exiting processes
+           are still in it
+           returns: True if removed"""
+        end, delay = time() + timeout, .001
+        for path in reversed( self.dirs() ):
+            while True:
+                try:
+                    os.rmdir( path )
+                    break
+                except OSError as e:
+                    if e.errno == errno.ENOENT:
+                        break
+                    if e.errno != errno.EBUSY or time() > end:
+                        return False
+                sleep( delay )
+                delay = min( delay * 2, .1 )
+        return True
+
+    # CPU bandwidth and placement
+
+    def setCPUQuota( self, period, quota ):
+        """Set CFS bandwidth limit
+           period: period in us
+           quota: CPU time per period in us, or -1 for unlimited"""
+        raise NotImplementedError
+
+    def setRT( self, period, runtime ):
+        "Set RT bandwidth limit (us of runtime per period)"
+        raise NotImplementedError
+
+    def setCPUs( self, cpus, mems=0, pid=None ):
+        """Restrict to cores cpus (and memory nodes mems),
+           then move process pid into our cpuset"""
+        self.set( 'cpuset', 'cpus', cpus )
+        self.set( 'cpuset', 'mems', mems )
+        if pid is not None:
+            self.addPid( pid, resources=( 'cpuset', ) )
+
+    def cpuUsage( self ):
+        "Return total CPU time used by our processes in ns"
+        raise NotImplementedError
+
+    # Memory, process and I/O limits
+
+    def setMemory( self, limit=None, high=None, swap=None ):
+        """Set memory limits in bytes (-1: unlimited)
+           limit: hard limit (OOM killer beyond it)
+           high: throttling/reclaim threshold
+           swap: swap limit"""
+        raise NotImplementedError
+
+    def setPids( self, limit ):
+        "Limit number of processes and threads (-1: unlimited)"
+        self.set( 'pids', 'max', 'max' if limit < 0 else limit )
+
+    def setIO( self, device, rbps=None, wbps=None, riops=None,
+               wiops=None ):
+        """Limit block I/O to device (path or major:minor) in bytes
+           and operations per second"""
+        raise NotImplementedError
+
+    @staticmethod
+    def parseStat( text ):
+        "Return { key: int } for flat-keyed stat text"
+        result = {}
+        for line in text.splitlines():
+            fields = line.split()
+            if len( fields ) == 2 and fields[ 1 ].isdigit():
+                result[ fields[ 0 ] ] = int( fields[ 1 ] )
+        return result
+
+    def stat( self, resource, param ):
+        """Return { key: int } for a flat-keyed stat file
+           such as cpu.stat (empty if it doesn't exist)"""
+        try:
+            return self.parseStat( self.get( resource, param ) )
+        except IOError:
+            return {}
+
+    def cpuFiles( self ):
+        "Return files which cpuSample() parses"
+        raise NotImplementedError
+
+    def cpuSample( self, texts ):
+        """Parse contents of cpuFiles()
+           returns: CPU time in ns, throttled periods, throttled ns"""
+        raise NotImplementedError
+
+    def events( self ):
+        """Return counts of limit events since the cgroup was created:
+           oom_kill: processes killed by the OOM killer
+           mem_max: times the memory limit was hit
+           mem_high: times memory was throttled by the high limit
+           pids_max: forks which failed at the process limit
+           cpu_throttled: periods in which the CPU quota ran out"""
+        raise NotImplementedError
+
+    def __repr__( self ):
+        return '<%s %s>' % ( self.__class__.__name__, self.name )
+
+
+class CgroupV1( Cgroup ):
+    "cgroup in the v1 (per-controller) hierarchies"
+
+    version = 1
+    # v1 names for v2 controllers
+    v1names = { 'io': 'blkio' }
+
+    def __init__( self, name, controllers=None, root=cgroupRoot ):
+        controllers = [ self.v1names.get( c, c ) for c in
+                        ( controllers or self.defaultControllers ) ]
+        Cgroup.__init__( self, name, controllers, root )
+
+    def dirs( self ):
+        "Return one directory per distinct controller hierarchy"
+        dirs, seen = [], set()
+        for controller in self.controllers:
+            path = os.path.join( self.root, controller, self.name )
+            real = os.path.realpath( os.path.join( self.root, controller ) )
+            if real not in seen:
+                seen.add( real )
+                dirs.append( path )
+        return dirs
+
+    def filename( self, resource, param ):
+        "Return path of resource.param"
+        return os.path.join( self.root, resource, self.name,
+                             '%s.%s' % ( resource, param ) )
+
+    def addPid( self, pid, resources=None ):
+        """Move process pid into our cgroup
+           resources: controllers to move it in (default: all but
+                      cpuset, which can't hold processes until its
+                      cpus and mems are set)"""
+        if resources is None:
+            resources = [ c for c in self.controllers if c != 'cpuset' ]
+        written = set()
+        for resource in resources:
+            path = os.path.realpath(
+                os.path.join( self.root, resource, self.name ) )
+            if path not in written:
+                writeFile( os.path.join( path, 'cgroup.procs' ), pid )
+                written.add( path )
+
+    def setCPUQuota( self, period, quota ):
+        "Set CFS period and quota (-1: unlimited)"
+        self.set( 'cpu', 'cfs_period_us', period )
+        self.set( 'cpu', 'cfs_quota_us', quota )
+
+    def setRT( self, period, runtime ):
+        "Set RT period and runtime"
+        self.set( 'cpu', 'rt_period_us', period )
+        self.set( 'cpu', 'rt_runtime_us', runtime )
+
+    def cpuUsage( self ):
+        "Return total CPU time used by our processes in ns"
+        return int( self.get( 'cpuacct', 'usage' ) )
+
+    def cpuFiles( self ):
+        "Return cpuacct.usage and cpu.stat"
+        return [ self.filename( 'cpuacct', 'usage' ),
+                 self.filename( 'cpu', 'stat' ) ]
+
+    def cpuSample( self, texts ):
+        "Return CPU time, throttled periods and throttled time (ns)"
+        stat = self.parseStat( texts[ 1 ] )
+        return ( int( texts[ 0 ] ), stat.get( 'nr_throttled', 0 ),
+                 stat.get( 'throttled_time', 0 ) )
+
+    def setMemory( self, limit=None, high=None, swap=None ):
+        """Set memory limits in bytes (-1: unlimited); high is
+           approximated by the soft limit, and swap by limiting
+           memory+swap to limit+swap"""
+        if limit is not None:
+            self.set( 'memory', 'limit_in_bytes', limit )
+        if high is not None:
+            self.set( 'memory', 'soft_limit_in_bytes', high )
+        if swap is not None and limit is not None:
+            self.set( 'memory', 'memsw.limit_in_bytes',
+                      -1 if limit < 0 or swap < 0 else limit + swap )
+
+    def setIO( self, device, rbps=None, wbps=None, riops=None,
+               wiops=None ):
+        "Set blkio throttling for device"
+        device = deviceNumber( device )
+        for param, value in ( ( 'read_bps_device', rbps ),
+                              ( 'write_bps_device', wbps ),
+                              ( 'read_iops_device', riops ),
+                              ( 'write_iops_device', wiops ) ):
+            if value is not None:
+                self.set( 'blkio', 'throttle.' + param,
+                          '%s %d' % ( device, max( value, 0 ) ) )
+
+    def events( self ):
+        "Return counts of limit events (see Cgroup.events())"
+        oom = self.stat( 'memory', 'oom_control' )
+        try:
+            failcnt = int( self.get( 'memory', 'failcnt' ) )
+        except IOError:
+            failcnt = 0
+        return { 'oom_kill': oom.get( 'oom_kill', 0 ),
+                 'mem_max': failcnt,
+                 'mem_high': 0,
+                 'pids_max': self.stat( 'pids', 'events' ).get( 'max', 0 ),
+                 'cpu_throttled': self.stat( 'cpu', 'stat' ).get(
+                     'nr_throttled', 0 ) }
+
+
+class CgroupV2( Cgroup ):
+    "cgroup in the v2 (unified) hierarchy"
+
+    version = 2
+    # Controllers which must be enabled in cgroup.subtree_control
+    enabled = set()
+
+    def __init__( self, name, controllers=None, root=cgroupRoot ):
+        controllers = [ c for c in ( controllers or
+                                     self.defaultControllers )
+                        if c != 'cpuacct' ]  # part of cpu in v2
+        self.enable( controllers, root )
+        Cgroup.__init__( self, name, controllers, root )
+
+    @classmethod
+    def enable( cls, controllers, root=cgroupRoot ):
+        "Enable controllers for children of root (once)"
+        for controller in controllers:
+            if ( root, controller ) in cls.enabled:
+                continue
+            writeFile( os.path.join( root, 'cgroup.subtree_control' ),
+                       '+' + controller )
+            cls.enabled.add( ( root, controller ) )
+
+    def dirs( self ):
+        "Return our (single) cgroup directory"
+        return [ os.path.join( self.root, self.name ) ]
+
+    def filename( self, resource, param ):
+        "Return path of resource.param"
+        return os.path.join( self.root, self.name,
+                             '%s.%s' % ( resource, param ) )
+
+    def addPid( self, pid, resources=None ):
+        "Move process pid into our cgroup (for all controllers)"
+        writeFile( os.path.join( self.root, self.name, 'cgroup.procs' ),
+                   pid )
+
+    def setCPUQuota( self, period, quota ):
+        "Set cpu.max (quota -1: unlimited)"
+        self.set( 'cpu', 'max', '%s %d' % (
+            'max' if quota < 0 else quota, period ) )
+
+    def setRT( self, period, runtime ):
+        "RT bandwidth is not available in cgroup v2"
+        raise Exception( 'cgroup v2 has no RT bandwidth control; '
+                         'please use sched=cfs' )
+
+    def setCPUs( self, cpus, mems=0, pid=None ):
+        "Restrict to cores cpus (and memory nodes mems)"
+        self.set( 'cpuset', 'cpus', cpus )
+        self.set( 'cpuset', 'mems', mems )
+
+    def cpuUsage( self ):
+        "Return total CPU time used by our processes in ns"
+        return self.stat( 'cpu', 'stat' ).get( 'usage_usec', 0 ) * 1000
+
+    def cpuFiles( self ):
+        "Return cpu.stat"
+        return [ self.filename( 'cpu', 'stat' ) ]
+
+    def cpuSample( self, texts ):
+        "Return CPU time, throttled periods and throttled time (ns)"
+        stat = self.parseStat( texts[ 0 ] )
+        return ( stat.get( 'usage_usec', 0 ) * 1000,
+                 stat.get( 'nr_throttled', 0 ),
+                 stat.get( 'throttled_usec', 0 ) * 1000 )
+
+    @staticmethod
+    def limit( value ):
+        "Return v2 limit value ('max' for unlimited)"
+        return 'max' if value < 0 else value
+
+    def setMemory( self, limit=None, high=None, swap=None ):
+        "Set memory.max, memory.high and memory.swap.max"
+        for param, value in ( ( 'max', limit ), ( 'high', high ),
+                              ( 'swap.max', swap ) ):
+            if value is not None:
+                self.set( 'memory', param, self.limit( value ) )
+
+    def setIO( self, device, rbps=None, wbps=None, riops=None,
+               wiops=None ):
+        "Set io.max for device"
+        limits = [ '%s=%s' % ( key, self.limit( value ) )
+                   for key, value in ( ( 'rbps', rbps ), ( 'wbps', wbps ),
+                                       ( 'riops', riops ),
+                                       ( 'wiops', wiops ) )
+                   if value is not None ]
+        self.set( 'io', 'max', '%s %s' % ( deviceNumber( device ),
+                                           ' '.join( limits ) ) )
+
+    def events( self ):
+        "Return counts of limit events (see Cgroup.events())"
+        memory = self.stat( 'memory', 'events' )
+        return { 'oom_kill': memory.get( 'oom_kill', 0 ),
+                 'mem_max': memory.get( 'max', 0 ),
+                 'mem_high': memory.get( 'high', 0 ),
+                 'pids_max': self.stat( 'pids', 'events' ).get( 'max', 0 ),
+                 'cpu_throttled': self.stat( 'cpu', 'stat' ).get(
+                     'nr_throttled', 0 ) }
+
+
+def makeCgroup( name, controllers=None, root=cgroupRoot ):
+    "Return a CgroupV1 or CgroupV2 for name, as appropriate"
+    cls = CgroupV2 if cgroupVersion( root ) == 2 else CgroupV1
+    return cls( name, controllers, root )
+
+
+class CpuSampler( object ):
+    """Sample CPU usage and throttling of many cgroups
+
+       The stat files of every cgroup are opened once and re-read
+       from offset 0 for each sample, so a sample of hundreds of hosts
+       costs two system calls per file and no processes. Samples are
+       recorded in arrays:
+
+       times: sample times (s)
+       usage[ name ]: total CPU time (ns)
+       throttled[ name ]: total throttled periods
+       throttledTime[ name ]: total throttled time (ns)"""
+
+    def __init__( self, nodes, interval=.1 ):
+        """nodes: hosts with cgroups (or Cgroup objects) to sample
+           interval: seconds between samples for run() and start()"""
+        self.cgroups = [ getattr( node, 'cgroup', node ) for node in nodes ]
+        self.names = [ cgroup.name for cgroup in self.cgroups ]
+        self.interval = interval
+        self.fds = [ [ os.open( path, os.O_RDONLY )
+                       for path in cgroup.cpuFiles() ]
+                     for cgroup in self.cgroups ]
+        self.times = array( 'd' )
+        self.usage = { name: array( 'd' ) for name in self.names }
+        self.throttled = { name: array( 'd' ) for name in self.names }
+        self.throttledTime = { name: array( 'd' ) for name in self.names }
+        self.thread, self.stopped = None, threading.Event()
+
+    @staticmethod
+    def pread( fd, size=4096 ):
+        "Read fd from the beginning"
+        os.lseek( fd, 0, os.SEEK_SET )
+        return os.read( fd, size )
+
+    def sample( self ):
+        "Record one sample of every cgroup"
+        pread = self.pread
+        self.times.append( time() )
+        for cgroup, name, fds in zip( self.cgroups, self.names, self.fds ):
+            usage, throttled, throttledTime = cgroup.cpuSample(
+                [ pread( fd ) for fd in fds ] )
+            self.usage[ name ].append( usage )
+            self.throttled[ name ].append( throttled )
+            self.throttledTime[ name ].append( throttledTime )
+
+    def run( self, duration ):
+        "Sample every interval for duration seconds"
+        start = time()
+        count = int( round( duration / self.interval ) )
+        self.sample()
+        for i in range( 1, count + 1 ):
+            sleep( max( start + i * self.interval - time(), 0 ) )
+            self.sample()
+
+    def start( self ):
+        "Sample every interval in a background thread until stop()"
+        def loop():
+            "Sample until stopped"
+            start, i = time(), 0
+            while not self.stopped.is_set():
+                self.sample()
+                i += 1
+                self.stopped.wait( max( start + i * self.interval - time(),
+                                        0 ) )
+        self.stopped.clear()
+        self.thread = threading.Thread( target=loop )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop( self ):
+        "Stop background sampling"
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def close( self ):
+        "Stop sampling and close stat files"
+        self.stop()
+        for fds in self.fds:
+            for fd in fds:
+                os.close( fd )
+        self.fds = []
+
+    def fractions( self, name, cores=1 ):
+        """Return CPU used by name in each sampling interval,
+           as a fraction of cores CPUs"""
+        usage, times = self.usage[ name ], self.times
+        return [ ( usage[ i ] - usage[ i - 1 ] ) / 1e9 /
+                 ( times[ i ] - times[ i - 1 ] ) / cores
+                 for i in range( 1, len( times ) ) ]
+
+    def throttling( self, name ):
+        "Return ( throttled periods, throttled seconds ) so far"
+        if not self.times:
+            return 0, 0.0
+        return ( int( self.throttled[ name ][ -1 ] -
+                      self.throttled[ name ][ 0 ] ),
+                 ( self.throttledTime[ name ][ -1 ] -
+                   self.throttledTime[ name ][ 0 ] ) / 1e9 )
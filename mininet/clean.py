@@ -103,6 +103,7 @@ def cleanup( cls):
 
         info( "*** Killing stale mininet node processes\n" )
         killprocs( 'mininet:' )
+        killprocs( 'mininet/ofcontroller.py' )
 
         info( "*** Shutting down stale tunnels\n" )
         killprocs( 'Tunnel=Ethernet' )
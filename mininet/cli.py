@@ -36,6 +36,7 @@
 
 from mininet.log import info, output, error
 from mininet.term import makeTerms, runX11
+from mininet.stats import StatsCollector
 from mininet.util import ( quietRun, dumpNodeConnections,
                            dumpPorts )
 
@@ -363,6 +364,29 @@ def do_dpctl( self, line ):
             output( '*** ' + sw.name + ' ' + ('-' * 72) + '\n' )
             output( sw.dpctl( *args ) )
 
+    def do_stats( self, line ):
+        """Show per-port packet and byte rates for all switches,
+           collected in parallel.
+           Usage: stats [seconds]"""
+        args = line.split()
+        try:
+            interval = float( args[ 0 ] ) if args else 1.0
+        except ValueError:
+            error( 'usage: stats [seconds]\n' )
+            return
+        stats = StatsCollector( self.mn.switches, flows=False )
+        stats.poll()
+        time.sleep( interval )
+        stats.poll()
+        for ( name, port ), rates in sorted( stats.portRates().items() ):
+            output( '%s port %s: rx %.1f pkt/s %.1f B/s, '
+                    'tx %.1f pkt/s %.1f B/s\n' % (
+                        name, port,
+                        rates.get( 'rx_packets', 0 ),
+                        rates.get( 'rx_bytes', 0 ),
+                        rates.get( 'tx_packets', 0 ),
+                        rates.get( 'tx_bytes', 0 ) ) )
+
     def do_time( self, line ):
         "Measure time taken for any command in Mininet."
         start = time.time()
@@ -0,0 +1,186 @@
+"""
+Topology-aware CPU pinning for hosts
+
+Round-robin pinning (Mininet( autoPinCpus=True )) spreads hosts over
+cores in creation order, so hosts which talk to each other through
+the same edge switch may end up on different NUMA nodes, while the
+switch datapath and Mininet itself compete with hosts for cores.
+
+CpuPlanner instead
+
+- reads the CPU topology (NUMA node, package and core of each online
+  CPU) from /sys/devices/system/cpu and /sys/devices/system/node
+- optionally reserves cores for the Open vSwitch daemon (whose
+  handler threads do the kernel datapath's upcalls) and for the
+  Mininet (Python) control process
+- orders switches by breadth-first search of the topology, so that
+  neighboring switches are adjacent, and lists each switch's hosts
+  together
+- assigns the hosts in that order to contiguous ranges of the
+  remaining cores, so that each edge switch's hosts share cores and
+  NUMA nodes (and their memory node) as far as possible
+
+Use Mininet( autoPinCpus='topo' ) or pass a CpuPlanner object, e.g.
+Mininet( autoPinCpus=CpuPlanner( switchCores=2, controlCores=1 ) ).
+Placements are passed to CPULimitedHost.setCPUs() through the host's
+cores parameter.
+"""
+
+import os
+from collections import deque
+
+from mininet.log import info, warn
+from mininet.util import natural, quietRun
+
+
+sysCpu = '/sys/devices/system/cpu'
+sysNode = '/sys/devices/system/node'
+
+def parseCpuList( text ):
+    "Parse CPU list such as 0-3,8,10-11 into a list of ints"
+    cpus = []
+    for part in text.strip().split( ',' ):
+        if not part:
+            continue
+        first, _, last = part.partition( '-' )
+        cpus.extend( range( int( first ), int( last or first ) + 1 ) )
+    return cpus
+
+def cpuList( cpus ):
+    "Return CPU list string for cpus, e.g. 0-3,8"
+    cpus, ranges = sorted( cpus ), []
+    for cpu in cpus:
+        if ranges and ranges[ -1 ][ 1 ] == cpu - 1:
+            ranges[ -1 ][ 1 ] = cpu
+        else:
+            ranges.append( [ cpu, cpu ] )
+    return ','.join( '%d' % a if a == b else '%d-%d' % ( a, b )
+                     for a, b in ranges )
+
+def readSys( path, default=None ):
+    "Return stripped contents of a sysfs file, or default"
+    try:
+        with open( path ) as f:
+            return f.read().strip()
+    except IOError:
+        return default
+
+def cpuTopology( cpuDir=sysCpu, nodeDir=sysNode ):
+    """Return the topology of online CPUs
+       returns: { cpu: ( NUMA node, package, core ) }"""
+    online = parseCpuList( readSys( os.path.join( cpuDir, 'online' ),
+                                    '0' ) )
+    numa = {}
+    if os.path.isdir( nodeDir ):
+        for entry in os.listdir( nodeDir ):
+            if entry.startswith( 'node' ) and entry[ 4: ].isdigit():
+                cpus = readSys( os.path.join( nodeDir, entry, 'cpulist' ),
+                                '' )
+                for cpu in parseCpuList( cpus ):
+                    numa[ cpu ] = int( entry[ 4: ] )
+    topology = {}
+    for cpu in online:
+        base = os.path.join( cpuDir, 'cpu%d' % cpu, 'topology' )
+        package = int( readSys( os.path.join(
+            base, 'physical_package_id' ), 0 ) )
+        core = int( readSys( os.path.join( base, 'core_id' ), cpu ) )
+        topology[ cpu ] = ( numa.get( cpu, 0 ), package, core )
+    return topology
+
+
+class CpuPlanner( object ):
+    "Plan host CPU placement from a Topo and the CPU topology"
+
+    def __init__( self, switchCores=0, controlCores=0, topology=None ):
+        """switchCores: cores to reserve for ovs-vswitchd
+           controlCores: cores to reserve for the Mininet process
+           topology: { cpu: ( node, package, core ) } (cpuTopology())"""
+        self.switchCores = switchCores
+        self.controlCores = controlCores
+        self.topology = topology
+        self.hosts, self.switchCpus, self.controlCpus = {}, [], []
+
+    def orderedCpus( self ):
+        """Return online CPUs ordered by NUMA node, package and core,
+           so that neighbors in the list are close together"""
+        if self.topology is None:
+            self.topology = cpuTopology()
+        return sorted( self.topology,
+                       key=lambda cpu: self.topology[ cpu ] + ( cpu, ) )
+
+    @staticmethod
+    def hostGroups( topo ):
+        """Return topo's hosts grouped by edge switch, with switches
+           in breadth-first order so that neighbors are adjacent
+           returns: [ [ host, ... ], ... ]"""
+        switches = set( topo.switches() )
+        neighbors = { node: sorted( set( topo.g.neighbors( node ) ),
+                                    key=natural )
+                      for node in topo.nodes() }
+        groups, seen = [], set()
+        for root in topo.switches():
+            if root in seen:
+                continue
+            seen.add( root )
+            queue = deque( [ root ] )
+            while queue:
+                switch = queue.popleft()
+                group = []
+                for node in neighbors[ switch ]:
+                    if node in seen:
+                        continue
+                    seen.add( node )
+                    if node in switches:
+                        queue.append( node )
+                    else:
+                        group.append( node )
+                if group:
+                    groups.append( group )
+        # Hosts which aren't connected to any switch
+        groups += [ [ h ] for h in topo.hosts() if h not in seen ]
+        return groups
+
+    def plan( self, topo ):
+        """Compute placements for topo's hosts
+           returns: { host name: { 'cores': cpu, 'mems': NUMA node } }"""
+        cpus = self.orderedCpus()
+        count = len( cpus )
+        reserved = self.switchCores + self.controlCores
+        self.switchCpus, self.controlCpus = [], []
+        if reserved >= count:
+            warn( '*** CpuPlanner: cannot reserve %d of %d cores\n' %
+                  ( reserved, count ) )
+        elif reserved:
+            # Reserve cores at the end, away from the first hosts
+            self.switchCpus = cpus[ count - reserved:
+                                    count - self.controlCores ]
+            self.controlCpus = cpus[ count - self.controlCores: ]
+            cpus = cpus[ :count - reserved ]
+        groups = self.hostGroups( topo )
+        total, done = sum( len( group ) for group in groups ), 0
+        self.hosts = {}
+        for group in groups:
+            # Each group gets its share of (contiguous) cores
+            first = done * len( cpus ) // total
+            last = max( first + 1,
+                        ( done + len( group ) ) * len( cpus ) // total )
+            for i, host in enumerate( group ):
+                cpu = cpus[ first + i * ( last - first ) // len( group ) ]
+                self.hosts[ host ] = { 'cores': cpu,
+                                       'mems': self.topology[ cpu ][ 0 ] }
+            done += len( group )
+        return self.hosts
+
+    def pinProcesses( self, ovs=True ):
+        "Pin ovs-vswitchd and this process to their reserved cores"
+        targets = [ ( 'Mininet', self.controlCpus, [ os.getpid() ] ) ]
+        if ovs and self.switchCpus:
+            targets.append( ( 'ovs-vswitchd', self.switchCpus,
+                              quietRun( 'pgrep -x ovs-vswitchd' ).split() ) )
+        for name, cpus, pids in targets:
+            if not cpus or not pids:
+                continue
+            for pid in pids:
+                # -a: all threads, including OVS handler threads
+                quietRun( 'taskset -apc %s %s' % ( cpuList( cpus ), pid ) )
+            info( '*** Pinned %s to cores %s\n' % ( name, cpuList( cpus ) ) )
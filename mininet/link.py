@@ -28,10 +28,48 @@
 from mininet.util import makeIntfPair
 import re
 
+
+class Params( dict ):
+    """Read-only parameter record. Identical interface parameters
+       are interned and shared between interfaces, so they must not
+       be modified in place; copy them with dict( params ) instead."""
+
+    __slots__ = ()
+
+    def _readOnly( self, *_args, **_kwargs ):
+        "Refuse to modify a shared parameter record"
+        raise TypeError( 'interface params are shared and read-only; '
+                         'use dict( intf.params ) to make a copy' )
+
+    __setitem__ = __delitem__ = clear = pop = popitem = _readOnly
+    setdefault = update = _readOnly
+
+    def __reduce__( self ):
+        return ( Params, ( dict( self ), ) )
+
+
+_paramsCache = {}
+
+def internParams( params ):
+    """Return a shared, read-only Params record equal to params.
+       params: dict of interface parameters
+       Parameters with unhashable values are copied, not shared."""
+    try:
+        key = tuple( sorted( params.iteritems() ) )
+        return _paramsCache.setdefault( key, Params( params ) )
+    except TypeError:
+        return Params( params )
+
+
 class Intf( object ):
 
     "Basic interface object that can configure itself."
 
+    # Large networks have hundreds of thousands of interfaces,
+    # so we avoid a per-instance __dict__
+    __slots__ = ( 'node', 'name', 'link', 'mac', 'ip', 'prefixLen',
+                  'port', 'params' )
+
     def __init__( self, name, node=None, port=None, link=None,
                   mac=None, **params ):
         """name: interface name (e.g. h1-eth0)
@@ -43,6 +81,7 @@ def __init__( self, name, node=None, port=None, link=None,
         self.link = link
         self.mac = mac
         self.ip, self.prefixLen = None, None
+        self.port = None  # set by node.addIntf()
 
         # if interface is lo, we know the ip is 127.0.0.1.
         # This saves an ifconfig command per node
@@ -56,8 +95,10 @@ def __init__( self, name, node=None, port=None, link=None,
         else:
             node.addIntf( self, port=port )
         # Save params for future reference
-        self.params = params
-        self.config( **params )
+        self.params = internParams( params )
+        # Some nodes apply our configuration themselves later on
+        if not node.deferIntfConfig( self ):
+            self.config( **params )
 
     def cmd( self, *args, **kwargs ):
         "Run a command in our owning node"
@@ -224,6 +265,8 @@ class TCIntf( Intf ):
        Allows specification of bandwidth limits (various methods)
        as well as delay, loss and max queue length"""
 
+    __slots__ = ()
+
     # The parameters we use seem to work reasonably up to 1 Gb/sec
     # For higher data rates, we will probably need to change them.
     bwParamMax = 1000
@@ -403,6 +446,8 @@ class Link( object ):
     """A basic link is just a veth pair.
        Other types of links could be tunnels, link emulators, etc.."""
 
+    __slots__ = ( 'intf1', 'intf2', 'fast' )
+
     # pylint: disable=too-many-branches
     def __init__( self, node1, node2, port1=None, port2=None,
                   intfName1=None, intfName2=None, addr1=None, addr2=None,
@@ -515,6 +560,8 @@ def __str__( self ):
 class OVSIntf( Intf ):
     "Patch interface on an OVSSwitch"
 
+    __slots__ = ()
+
     def ifconfig( self, *args ):
         cmd = ' '.join( args )
         if cmd == 'up':
@@ -529,6 +576,8 @@ class OVSLink( Link ):
        Warning: in testing we have found that no more
        than ~64 OVS patch links should be used in row."""
 
+    __slots__ = ( 'isPatchLink', )
+
     def __init__( self, node1, node2, **kwargs ):
         from mininet.node import OVSSwitch
 
@@ -550,6 +599,9 @@ def makeIntfPair( self, *args, **kwargs ):
 
 class TCLink( Link ):
     "Link with symmetric TC interfaces configured via opts"
+
+    __slots__ = ()
+
     def __init__( self, node1, node2, port1=None, port2=None,
                   intfName1=None, intfName2=None,
                   addr1=None, addr2=None, **params ):
@@ -572,6 +624,8 @@ class TCULink( TCLink ):
        to cope with this somehow, but it is likely to be an issue with
        many software Ethernet bridges."""
 
+    __slots__ = ()
+
     def __init__( self, *args, **kwargs ):
         kwargs.update( txo=False, rxo=False )
         TCLink.__init__( self, *args, **kwargs )
@@ -92,19 +92,24 @@
 import signal
 import random
 
-from time import sleep
+from contextlib import contextmanager
+from tempfile import NamedTemporaryFile
+from time import sleep, time
 from itertools import chain, groupby
 from math import ceil
 
 from mininet.cli import CLI
 from mininet.log import info, error, debug, output, warn
 from mininet.node import ( Node, Host, OVSKernelSwitch, DefaultController,
-                           Controller )
+                           Controller, OVSSwitch )
 from mininet.nodelib import NAT
-from mininet.link import Link, Intf
+from mininet.routing import installRoutes
+from mininet.cpuplan import CpuPlanner
+from mininet.cgroup import CpuSampler
+from mininet.link import Link, Intf, TCIntf, internParams
 from mininet.util import ( quietRun, fixLimits, numCores, ensureRoot,
                            macColonHex, ipStr, ipParse, netParse, ipAdd,
-                           waitListening )
+                           waitListening, parallel )
 from mininet.term import cleanUpScreens, makeTerms
 
 # Mininet version: should be consistent with README and LICENSE
@@ -118,7 +123,7 @@ def __init__( self, topo=None, switch=OVSKernelSwitch, host=Host,
                   build=True, xterms=False, cleanup=False, ipBase='10.0.0.0/8',
                   inNamespace=False,
                   autoSetMacs=False, autoStaticArp=False, autoPinCpus=False,
-                  listenPort=None, waitConnected=False ):
+                  listenPort=None, waitConnected=False, proactive=None ):
         """Create Mininet object.
            topo: Topo (topology) object or None
            switch: default Switch class
@@ -133,9 +138,14 @@ def __init__( self, topo=None, switch=OVSKernelSwitch, host=Host,
            inNamespace: spawn switches and controller in net namespaces?
            autoSetMacs: set MAC addrs automatically like IP addresses?
            autoStaticArp: set all-pairs static MAC addrs?
+               ( 'subnet': only between hosts in the same subnet )
            autoPinCpus: pin hosts to (real) cores (requires CPULimitedHost)?
+               True: round-robin; 'topo' or a CpuPlanner: by topology
            listenPort: base listening port to open; will be incremented for
-               each additional switch in the net if inNamespace=False"""
+               each additional switch in the net if inNamespace=False
+           proactive: install 'shortest' path or 'ecmp' routes into
+               OVS switches at start(), instead of adding a default
+               controller (None)"""
         self.topo = topo
         self.switch = switch
         self.host = host
@@ -154,8 +164,17 @@ def __init__( self, topo=None, switch=OVSKernelSwitch, host=Host,
         self.autoPinCpus = autoPinCpus
         self.numCores = numCores()
         self.nextCore = 0  # next core for pinning hosts to CPUs
+        if autoPinCpus == 'topo':
+            autoPinCpus = CpuPlanner()
+        self.cpuPlanner = ( autoPinCpus if isinstance( autoPinCpus,
+                                                       CpuPlanner )
+                            else None )
+        self.cpuPlacements = {}  # host name -> planned cores and mems
         self.listenPort = listenPort
         self.waitConn = waitConnected
+        if proactive not in ( None, False, 'shortest', 'ecmp' ):
+            raise Exception( "proactive must be 'shortest' or 'ecmp'" )
+        self.proactive = proactive
 
         self.hosts = []
         self.switches = []
@@ -166,6 +185,9 @@ def __init__( self, topo=None, switch=OVSKernelSwitch, host=Host,
 
         self.terms = []  # list of spawned xterm processes
 
+        self.batching = False  # in batch() context?
+        self.deferredNodes = []  # nodes with queued commands
+
         Mininet.init()  # Initialize Mininet if necessary
 
         self.built = False
@@ -178,9 +200,22 @@ def waitConnected( self, timeout=None, delay=.5 ):
            timeout: time to wait, or None to wait indefinitely
            delay: seconds to sleep per iteration
            returns: True if all switches are connected"""
+        if self.proactive and not self.controllers:
+            # Switches forward using routes installed by start()
+            return True
         info( '*** Waiting for switches to connect\n' )
-        time = 0
+        start = time()
         remaining = list( self.switches )
+        # Switch classes may wait for all of their switches at once
+        for swclass, switches in groupby(
+                sorted( self.switches, key=type ), type ):
+            if hasattr( swclass, 'waitConnected' ):
+                left = None if timeout is None else max(
+                    timeout - ( time() - start ), 0 )
+                for switch in swclass.waitConnected(
+                        tuple( switches ), timeout=left, delay=delay ):
+                    info( '%s ' % switch )
+                    remaining.remove( switch )
         while True:
             for switch in tuple( remaining ):
                 if switch.connected():
@@ -189,11 +224,10 @@ def waitConnected( self, timeout=None, delay=.5 ):
             if not remaining:
                 info( '\n' )
                 return True
-            if time > timeout and timeout is not None:
+            if timeout is not None and time() - start > timeout:
                 break
             sleep( delay )
-            time += delay
-        warn( 'Timed out after %d seconds\n' % time )
+        warn( 'Timed out after %d seconds\n' % ( time() - start ) )
         for switch in remaining:
             if not switch.connected():
                 warn( 'Warning: %s is not connected to a controller\n'
@@ -215,7 +249,9 @@ def addHost( self, name, cls=None, **params ):
                                   '/%s' % self.prefixLen }
         if self.autoSetMacs:
             defaults[ 'mac' ] = macColonHex( self.nextIP )
-        if self.autoPinCpus:
+        if name in self.cpuPlacements:
+            defaults[ 'cores' ] = self.cpuPlacements[ name ]
+        elif self.autoPinCpus:
             defaults[ 'cores' ] = self.nextCore
             self.nextCore = ( self.nextCore + 1 ) % self.numCores
         self.nextIP += 1
@@ -225,6 +261,8 @@ def addHost( self, name, cls=None, **params ):
         h = cls( name, **defaults )
         self.hosts.append( h )
         self.nameToNode[ name ] = h
+        if self.batching:
+            self.deferNode( h )
         return h
 
     def delNode( self, node, nodes=None):
@@ -256,11 +294,15 @@ def addSwitch( self, name, cls=None, **params ):
         defaults.update( params )
         if not cls:
             cls = self.switch
+        if self.batching and hasattr( cls, 'batchCommands' ):
+            defaults.setdefault( 'batch', True )
         sw = cls( name, **defaults )
         if not self.inNamespace and self.listenPort:
             self.listenPort += 1
         self.switches.append( sw )
         self.nameToNode[ name ] = sw
+        if self.batching:
+            self.deferNode( sw )
         return sw
 
     def delSwitch( self, switch ):
@@ -424,9 +466,300 @@ def delLinkBetween( self, node1, node2, index=0, allLinks=False ):
             self.delLink( link )
         return links
 
-    def configHosts( self ):
-        "Configure a set of hosts."
-        for host in self.hosts:
+    # Incremental reconfiguration
+
+    # Link parameters that can be changed by reconfiguring TCIntfs
+    tcParams = ( 'bw', 'delay', 'jitter', 'loss', 'max_queue_size',
+                 'speedup', 'use_hfsc', 'use_tbf', 'latency_ms',
+                 'enable_ecn', 'enable_red' )
+
+    @staticmethod
+    def linkKey( node1, node2, port1, port2 ):
+        "Return orientation-independent key for a link"
+        if ( node2, port2 ) < ( node1, port1 ):
+            return node2, node1, port2, port1
+        return node1, node2, port1, port2
+
+    def liveTopo( self ):
+        """Return nodes and links of the running network which
+           were created from self.topo (or all of them if there is
+           no topo) as { name: info } and { linkKey: ( link, info ) },
+           with info from self.topo or None"""
+        topo = self.topo
+        nodes = {}
+        for node in self.hosts + self.switches:
+            if not topo:
+                nodes[ node.name ] = None
+            elif node.name in topo.g.node:
+                nodes[ node.name ] = topo.nodeInfo( node.name )
+        infos = {}
+        if topo:
+            for _src, _dst, info in topo.links( withInfo=True ):
+                key = self.linkKey( info[ 'node1' ], info[ 'node2' ],
+                                    info[ 'port1' ], info[ 'port2' ] )
+                infos[ key ] = info
+        links = {}
+        for link in self.links:
+            intf1, intf2 = link.intf1, link.intf2
+            if ( intf1.node.name not in nodes or
+                 intf2.node.name not in nodes ):
+                continue
+            key = self.linkKey( intf1.node.name, intf2.node.name,
+                                intf1.port, intf2.port )
+            if topo and key not in infos:
+                continue
+            links[ key ] = ( link, infos.get( key ) )
+        return nodes, links
+
+    def diffTopo( self, topo ):
+        """Compare topo with the running network
+           topo: new Topo object
+           returns: dict of lists: delNodes, addNodes (names),
+                    delLinks (Links), addLinks (link info dicts),
+                    tcLinks ( Link, info ) to reconfigure"""
+        nodes, links = self.liveTopo()
+        isSwitch = lambda name: self[ name ] in self.switches
+        diff = { 'delNodes': [], 'addNodes': [], 'delLinks': [],
+                 'addLinks': [], 'tcLinks': [] }
+        for name in topo.nodes():
+            info = topo.nodeInfo( name )
+            if name not in nodes:
+                diff[ 'addNodes' ].append( name )
+            elif ( isSwitch( name ) != topo.isSwitch( name ) or
+                   nodes[ name ] is not None and nodes[ name ] != info ):
+                # Node changed: replace it
+                diff[ 'delNodes' ].append( name )
+                diff[ 'addNodes' ].append( name )
+        kept = set( nodes ) - set( diff[ 'delNodes' ] )
+        diff[ 'delNodes' ] += [ name for name in nodes
+                                if name not in topo.g.node ]
+        newLinks = set()
+        for _src, _dst, info in topo.links( sort=True, withInfo=True ):
+            key = self.linkKey( info[ 'node1' ], info[ 'node2' ],
+                                info[ 'port1' ], info[ 'port2' ] )
+            newLinks.add( key )
+            link, old = links.get( key, ( None, None ) )
+            if ( link is None or key[ 0 ] not in kept or
+                 key[ 1 ] not in kept ):
+                diff[ 'addLinks' ].append( info )
+            elif old is None or old == info:
+                continue
+            elif all( old.get( k ) == info.get( k ) for k in
+                      set( old ) | set( info ) if k not in self.tcParams ):
+                diff[ 'tcLinks' ].append( ( link, info ) )
+            else:
+                diff[ 'delLinks' ].append( link )
+                diff[ 'addLinks' ].append( info )
+        # Links which are gone, and any links of deleted nodes
+        gone = set( diff[ 'delNodes' ] )
+        dropped = set( diff[ 'delLinks' ] )
+        dropped.update( link for key, ( link, _info ) in links.iteritems()
+                        if key not in newLinks )
+        dropped.update( link for link in self.links
+                        if link.intf1.node.name in gone or
+                        link.intf2.node.name in gone )
+        # Keep network order
+        diff[ 'delLinks' ] = [ link for link in self.links
+                               if link in dropped ]
+        return diff
+
+    def applyTopo( self, topo ):
+        """Reconfigure the running network to match topo, changing
+           only nodes and links which differ from the current
+           topology (self.topo), in one batch(). Unchanged nodes
+           keep running.
+           topo: new Topo object
+           returns: diff (see diffTopo())"""
+        diff = self.diffTopo( topo )
+        info( '*** Applying topology: -%d +%d nodes, -%d +%d ~%d links\n' %
+              ( len( diff[ 'delNodes' ] ), len( diff[ 'addNodes' ] ),
+                len( diff[ 'delLinks' ] ), len( diff[ 'addLinks' ] ),
+                len( diff[ 'tcLinks' ] ) ) )
+        with self.batch():
+            self.applyDiff( topo, diff )
+        self.topo = topo
+        return diff
+
+    def applyDiff( self, topo, diff ):
+        """Apply diff from diffTopo() (in a batch)
+           topo: new Topo object
+           diff: changes to apply"""
+        delNodes = set( diff[ 'delNodes' ] )
+        running = set( switch for switch in self.switches
+                       if switch.name not in delNodes )
+        # Remove links, detaching them from running switches
+        for link in diff[ 'delLinks' ]:
+            for intf in link.intf1, link.intf2:
+                if intf.node in running and hasattr( intf.node, 'detach' ):
+                    intf.node.detach( intf )
+            link.delete()
+        dropped = set( diff[ 'delLinks' ] )
+        self.links = [ link for link in self.links if link not in dropped ]
+        for name in diff[ 'delNodes' ]:
+            self.delNode( self[ name ] )
+        # Add new nodes
+        hosts, switches = [], []
+        for name in diff[ 'addNodes' ]:
+            params = topo.nodeInfo( name )
+            if topo.isSwitch( name ):
+                switches.append( self.addSwitch( name, **params ) )
+            else:
+                hosts.append( self.addHost( name, **params ) )
+        # Add new links, attaching them to running switches
+        for params in diff[ 'addLinks' ]:
+            link = self.addLink( **params )
+            for intf in link.intf1, link.intf2:
+                if intf.node in running and hasattr( intf.node, 'attach' ):
+                    intf.node.attach( intf )
+        # Change link parameters in place
+        for link, params in diff[ 'tcLinks' ]:
+            self.configLinkParams( link, params )
+        # Configure and start new nodes
+        self.configHosts( hosts )
+        for switch in switches:
+            switch.start( self.controllers )
+
+    @staticmethod
+    def commitSwitches( switches ):
+        "Run queued port commands for switches in batch mode"
+        for swclass, group in groupby( sorted( switches, key=type ), type ):
+            if hasattr( swclass, 'batchCommands' ):
+                swclass.batchCommands( tuple( group ) )
+
+    def configLinkParams( self, link, params ):
+        """Reconfigure traffic control parameters of a running link
+           link: Link to reconfigure
+           params: new link info (e.g. from Topo.linkInfo())"""
+        assert self  # please pylint
+        for intf, side in ( link.intf1, 'params1' ), ( link.intf2, 'params2' ):
+            if not isinstance( intf, TCIntf ):
+                continue
+            options = dict( intf.params )
+            options.update( { k: params.get( k ) for k in self.tcParams } )
+            options.update( params.get( side, {} ) )
+            intf.params = internParams( options )
+            intf.config( **options )
+
+    # Batched runtime changes
+
+    @contextmanager
+    def batch( self ):
+        """Context manager which queues runtime changes and commits
+           them together on exit, e.g.
+               with net.batch():
+                   h = net.addHost( 'h10' )
+                   link = net.addLink( h, 's1' )
+                   net[ 's1' ].attach( link.intf2 )
+           Node shells still start immediately, but ip, ifconfig and
+           tc commands and OVS bridge and port changes are queued,
+           then run as one 'ip -batch' and one 'tc -batch' per
+           network namespace, one script per node and one ovs-vsctl
+           call. Commands run in the batch return empty output.
+           Changes are committed even if the body raises."""
+        if self.batching:
+            # Nested batch: commit with the outer one
+            yield self
+            return
+        self.batching = True
+        for node in self.hosts + self.switches:
+            self.deferNode( node )
+        try:
+            yield self
+        finally:
+            self.batching = False
+            self.commitBatch()
+
+    def deferNode( self, node ):
+        "Queue node's commands until the end of the batch"
+        node.deferred = []
+        if hasattr( type( node ), 'batchCommands' ):
+            node.batch = True
+        self.deferredNodes.append( node )
+
+    @staticmethod
+    def batchTool( cmd ):
+        "Return 'ip' or 'tc' if cmd can be run in a -batch file"
+        tool = cmd.split( None, 1 )[ 0 ] if cmd.strip() else None
+        if tool in ( 'ip', 'tc' ) and not re.search( r'[;&|<>`$()]', cmd ):
+            return tool
+        return None
+
+    def runDeferred( self, nodes, tool=None ):
+        """Run queued commands for nodes, in parallel
+           nodes: nodes with queued commands
+           tool: 'ip' or 'tc' to run only those commands, as one
+                 -batch file per namespace, or None to run only
+                 other commands, as one script per namespace"""
+        # Scripts per node, or None for the root namespace
+        scripts = {}
+        for node in nodes:
+            remaining = []
+            for cmd in node.deferred:
+                if self.batchTool( cmd ) != tool:
+                    remaining.append( cmd )
+                    continue
+                if tool:
+                    cmd = cmd.split( None, 1 )[ 1 ]
+                key = node if node.inNamespace else None
+                scripts.setdefault( key, [] ).append( cmd )
+            node.deferred[ : ] = remaining
+        run = '%s -force -batch' % tool if tool else 'sh'
+        files = {}
+        for key, lines in scripts.iteritems():
+            if key is not None and not key.shell:
+                # Node has exited, and its namespace is gone
+                continue
+            f = NamedTemporaryFile( prefix='mn-batch-', delete=False )
+            f.write( '\n'.join( lines ) + '\n' )
+            f.close()
+            files[ key ] = f.name
+        for key, filename in files.iteritems():
+            if key is not None:
+                # Source script in the node's shell
+                key.sendCmd( '%s %s' % ( run if tool else '.', filename ) )
+        outputs = []
+        if None in files:
+            outputs.append( ( 'root', quietRun( '%s %s' % (
+                run, files[ None ] ), shell=True ) ) )
+        for key in files:
+            if key is not None:
+                outputs.append( ( key.name, key.waitOutput() ) )
+        for filename in files.itervalues():
+            os.unlink( filename )
+        for name, output in outputs:
+            if output.strip():
+                debug( '*** batch %s (%s): %s\n' % ( run, name, output ) )
+
+    def commitBatch( self ):
+        """Run commands queued by batch(): ip commands, then OVS
+           changes, then other commands and finally tc commands"""
+        nodes, self.deferredNodes = self.deferredNodes, []
+        self.runDeferred( nodes, 'ip' )
+        # Commit OVS changes, then restore TC config which OVS
+        # may have overwritten on added ports
+        switches = [ node for node in nodes
+                     if getattr( node, 'commands', None ) or
+                     getattr( node, 'ops', None ) ]
+        added = set( port for switch in switches
+                     for port in switch.queuedPorts() )
+        self.commitSwitches( switches )
+        for node in nodes:
+            if hasattr( node, 'reapplyDeferred' ):
+                node.reapplyDeferred( [ intf for intf in node.intfList()
+                                        if intf.name in added ] )
+        # Run everything else (repeating if commands queue more)
+        while any( node.deferred for node in nodes ):
+            for tool in 'ip', None, 'tc':
+                self.runDeferred( nodes, tool )
+        for node in nodes:
+            node.deferred = None
+            if hasattr( type( node ), 'batchCommands' ):
+                node.batch = False
+
+    def configHosts( self, hosts=None ):
+        """Configure a set of hosts.
+           hosts: hosts to configure (self.hosts)"""
+        for host in self.hosts if hosts is None else hosts:
             info( host.name + ' ' )
             intf = host.defaultIntf()
             if intf:
@@ -454,7 +787,8 @@ def buildFromTopo( self, topo=None ):
 
         info( '*** Creating network\n' )
 
-        if not self.controllers and self.controller:
+        if ( not self.controllers and self.controller and
+             not self.proactive ):
             # Add a default controller
             info( '*** Adding controller\n' )
             classes = self.controller
@@ -467,6 +801,9 @@ def buildFromTopo( self, topo=None ):
                 else:
                     self.addController( 'c%d' % i, cls )
 
+        if self.cpuPlanner:
+            self.cpuPlacements = self.cpuPlanner.plan( topo )
+
         info( '*** Adding hosts:\n' )
         for hostName in topo.hosts():
             self.addHost( hostName, **topo.nodeInfo( hostName ) )
@@ -506,7 +843,7 @@ def build( self ):
         if self.xterms:
             self.startTerms()
         if self.autoStaticArp:
-            self.staticArp()
+            self.staticArp( subnet=self.autoStaticArp == 'subnet' )
         self.built = True
 
     def startTerms( self ):
@@ -526,12 +863,49 @@ def stopXterms( self ):
             os.kill( term.pid, signal.SIGKILL )
         cleanUpScreens()
 
-    def staticArp( self ):
-        "Add all-pairs ARP entries to remove the need to handle broadcast."
-        for src in self.hosts:
-            for dst in self.hosts:
-                if src != dst:
-                    src.setARP( ip=dst.IP(), mac=dst.MAC() )
+    def staticArp( self, subnet=False, workers=64 ):
+        """Add all-pairs ARP entries to remove the need to handle broadcast.
+           The entries are computed once and loaded into each host
+           with a single command.
+           subnet: only add entries for hosts in the same subnet
+           workers: maximum number of hosts to update at once"""
+        groups = {}  # subnet -> [ ( host, ip, mac ) ]
+        for host in self.hosts:
+            intf = host.defaultIntf()
+            if not intf or not intf.IP() or not intf.MAC():
+                continue
+            prefixLen = int( intf.prefixLen ) if subnet else 0
+            key = ( ipParse( intf.IP() ) >> ( 32 - prefixLen )
+                    if prefixLen else 0, prefixLen )
+            groups.setdefault( key, [] ).append(
+                ( host, intf.IP(), intf.MAC() ) )
+
+        def install( item ):
+            "Load entries for one host"
+            src, group = item
+            return src.setARPs( [ ( ip, mac ) for dst, ip, mac in group
+                                  if dst is not src ] )
+
+        parallel( install, [ ( src, group ) for group in groups.values()
+                             for src, _ip, _mac in group ], workers )
+
+    def addFlows( self, flows, workers=None, **params ):
+        """Install flows on several switches in parallel, using
+           each switch's bulk addFlows()
+           flows: { switch or switch name: list of flows }
+           workers: maximum number of concurrent switches (all)
+           params: passed to addFlows(), e.g. bundle=True
+           returns: { switch name: output }"""
+        items = [ ( self[ sw ] if isinstance( sw, basestring ) else sw,
+                    swflows ) for sw, swflows in flows.iteritems() ]
+
+        def install( item ):
+            "Install flows on one switch"
+            sw, swflows = item
+            return sw.addFlows( swflows, **params )
+
+        outputs = parallel( install, items, workers )
+        return { sw.name: out for ( sw, _ ), out in zip( items, outputs ) }
 
     def start( self ):
         "Start controller and switches."
@@ -540,11 +914,17 @@ def start( self ):
         info( '*** Starting controller\n' )
         for controller in self.controllers:
             info( controller.name + ' ')
+            if hasattr( controller, 'setRoutes' ):
+                controller.setRoutes( self )
             controller.start()
         info( '\n' )
         info( '*** Starting %s switches\n' % len( self.switches ) )
         for switch in self.switches:
             info( switch.name + ' ')
+            if ( self.proactive == 'ecmp' and
+                 isinstance( switch, OVSSwitch ) and not switch.protocols ):
+                # Select groups require OpenFlow 1.1+
+                switch.protocols = 'OpenFlow10,OpenFlow13'
             switch.start( self.controllers )
         started = {}
         for swclass, switches in groupby(
@@ -554,6 +934,11 @@ def start( self ):
                 success = swclass.batchStartup( switches )
                 started.update( { s: s for s in success } )
         info( '\n' )
+        if self.cpuPlanner:
+            self.cpuPlanner.pinProcesses( ovs=any(
+                isinstance( s, OVSSwitch ) for s in self.switches ) )
+        if self.proactive:
+            installRoutes( self, ecmp=self.proactive == 'ecmp' )
         if self.waitConn:
             self.waitConnected()
 
@@ -839,13 +1224,13 @@ def iperf( self, hosts=None, l4Type='TCP', udpBw='10M', fmt=None,
         output( '*** Results: %s\n' % result )
         return result
 
-    def runCpuLimitTest( self, cpu, duration=5 ):
+    def runCpuLimitTest( self, cpu, duration=5, interval=1.0 ):
         """run CPU limit test with 'while true' processes.
         cpu: desired CPU fraction of each host
         duration: test duration in seconds (integer)
+        interval: seconds per measurement
         returns a single list of measured CPU fractions as floats.
         """
-        cores = int( quietRun( 'nproc' ) )
         pct = cpu * 100
         info( '*** Testing CPU %.0f%% bandwidth limit\n' % pct )
         hosts = self.hosts
@@ -854,34 +1239,24 @@ def runCpuLimitTest( self, cpu, duration=5 ):
         num_procs = int( ceil( cores * cpu ) )
         pids = {}
         for h in hosts:
-            pids[ h ] = []
-            for _core in range( num_procs ):
-                h.cmd( 'while true; do a=1; done &' )
-                pids[ h ].append( h.cmd( 'echo $!' ).strip() )
-        outputs = {}
-        time = {}
-        # get the initial cpu time for each host
-        for host in hosts:
-            outputs[ host ] = []
-            with open( '/sys/fs/cgroup/cpuacct/%s/cpuacct.usage' %
-                       host, 'r' ) as f:
-                time[ host ] = float( f.read() )
-        for _ in range( duration ):
-            sleep( 1 )
-            for host in hosts:
-                with open( '/sys/fs/cgroup/cpuacct/%s/cpuacct.usage' %
-                           host, 'r' ) as f:
-                    readTime = float( f.read() )
-                outputs[ host ].append( ( ( readTime - time[ host ] )
-                                        / 1000000000 ) / cores * 100 )
-                time[ host ] = readTime
-        for h, pids in pids.items():
-            for pid in pids:
-                h.cmd( 'kill -9 %s' % pid )
+            # One round trip per host to start all of its loops
+            pids[ h ] = h.cmd( 'for _ in $(seq %d); do '
+                               '( while true; do a=1; done ) & echo $!; '
+                               'done' % num_procs ).split()
+        sampler = CpuSampler( hosts, interval=interval )
+        try:
+            sampler.run( duration )
+        finally:
+            sampler.close()
+            for h, hpids in pids.items():
+                h.cmd( 'kill -9 %s' % ' '.join( hpids ) )
         cpu_fractions = []
-        for _host, outputs in outputs.items():
-            for pct in outputs:
-                cpu_fractions.append( pct )
+        for host in hosts:
+            fractions = sampler.fractions( host.name, cores )
+            cpu_fractions.extend( 100 * f for f in fractions )
+            periods, seconds = sampler.throttling( host.name )
+            debug( '%s: throttled %d times (%.3fs)\n' %
+                   ( host, periods, seconds ) )
         output( '*** Results: %s\n' % cpu_fractions )
         return cpu_fractions
 
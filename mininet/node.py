@@ -18,6 +18,9 @@
 CPULimitedHost: a virtual host whose CPU bandwidth is limited by
     RT or CFS bandwidth limiting.
 
+ResourceLimitedHost: a CPULimitedHost which can also limit memory,
+    processes and block I/O.
+
 Switch: superclass for switch nodes.
 
 UserSwitch: a switch using the user-space switch from the OpenFlow
@@ -40,6 +43,9 @@
 
 Ryu: The Ryu controller (https://osrg.github.io/ryu/)
 
+PyController: Mininet's built-in Python OpenFlow controller
+    (mininet.ofcontroller), used when no other controller is installed.
+
 RemoteController: a remote controller node, which may use any
     arbitrary OpenFlow-compatible controller, and which is not
     created or managed by Mininet.
@@ -52,22 +58,90 @@
 - Create proxy objects for remote nodes (Mininet: Cluster Edition)
 """
 
+import json
 import os
 import pty
 import re
 import signal
 import select
-from subprocess import Popen, PIPE
-from time import sleep
-
+import sys
+from collections import OrderedDict
+from contextlib import contextmanager
+from pipes import quote
+from subprocess import Popen, PIPE, STDOUT
+from tempfile import NamedTemporaryFile
+from time import sleep, time
+
+from mininet import ofcontroller
 from mininet.log import info, error, warn, debug
-from mininet.util import ( quietRun, errRun, errFail, moveIntf, isShellBuiltin,
-                           numCores, retry, mountCgroups )
+from mininet.util import ( quietRun, errRun, moveIntf, isShellBuiltin,
+                           numCores, mountCgroups, parallel, shard,
+                           tcpProbe )
+from mininet.cgroup import makeCgroup, sizeBytes
 from mininet.moduledeps import moduleDeps, pathCheck, TUN
 from mininet.link import Link, Intf, TCIntf, OVSIntf
+from mininet.ovsdb import OVSDB, ovsMap, ovsSet, setItems
 from re import findall
 from distutils.version import StrictVersion
 
+class PortMap( object ):
+    """Mapping of a node's interfaces to port numbers.
+       Port numbers are stored on the Intf objects themselves, so
+       this is a view over node.intfs rather than a second dict."""
+
+    __slots__ = ( 'intfs', )
+
+    def __init__( self, intfs ):
+        "intfs: dict of port numbers to interfaces"
+        self.intfs = intfs
+
+    def get( self, intf, default=None ):
+        "Return port number for intf, or default"
+        port = getattr( intf, 'port', None )
+        if port is not None and self.intfs.get( port ) is intf:
+            return port
+        return default
+
+    def __getitem__( self, intf ):
+        port = self.get( intf )
+        if port is None:
+            raise KeyError( intf )
+        return port
+
+    def __setitem__( self, intf, port ):
+        intf.port = port
+
+    def __delitem__( self, intf ):
+        if self.get( intf ) is None:
+            raise KeyError( intf )
+        # intfs[ port ] is removed separately by delIntf()
+        intf.port = None
+
+    def __contains__( self, intf ):
+        return self.get( intf ) is not None
+
+    def __iter__( self ):
+        return iter( self.keys() )
+
+    def __len__( self ):
+        return len( self.keys() )
+
+    def keys( self ):
+        "Return interfaces"
+        return [ intf for port, intf in self.intfs.iteritems()
+                 if getattr( intf, 'port', None ) == port ]
+
+    def values( self ):
+        "Return port numbers"
+        return [ intf.port for intf in self.keys() ]
+
+    def items( self ):
+        "Return ( intf, port ) pairs"
+        return [ ( intf, intf.port ) for intf in self.keys() ]
+
+    iterkeys, itervalues, iteritems = keys, values, items
+
+
 class Node( object ):
     """A virtual network node is simply a shell in a network namespace.
        We communicate with it using pipes."""
@@ -91,9 +165,9 @@ def __init__( self, name, inNamespace=True, **params ):
         self.params = params
 
         self.intfs = {}  # dict of port numbers to interfaces
-        self.ports = {}  # dict of interfaces to port numbers
-                         # replace with Port objects, eventually ?
+        self.ports = PortMap( self.intfs )  # interfaces to port numbers
         self.nameToIntf = {}  # dict of interface names to Intfs
+        self.maxPort = None  # highest allocated port number
 
         # Make pylint happy
         ( self.shell, self.execed, self.pid, self.stdin, self.stdout,
@@ -101,6 +175,7 @@ def __init__( self, name, inNamespace=True, **params ):
                 None, None, None, None, None, None, None, None )
         self.waiting = False
         self.readbuf = ''
+        self.deferred = None  # queued commands (see Mininet.batch())
 
         # Start command interpreter shell
         self.startShell()
@@ -351,6 +426,12 @@ def cmd( self, *args, **kwargs ):
         verbose = kwargs.get( 'verbose', False )
         log = info if verbose else debug
         log( '*** %s : %s\n' % ( self.name, args ) )
+        if self.deferred is not None:
+            # Queue command to be run later; output is not available
+            if len( args ) == 1 and isinstance( args[ 0 ], list ):
+                args = args[ 0 ]
+            self.deferred.append( ' '.join( str( arg ) for arg in args ) )
+            return ''
         if self.shell:
             self.sendCmd( *args, **kwargs )
             return self.waitOutput( verbose )
@@ -410,9 +491,12 @@ def pexec( self, *args, **kwargs ):
 
     def newPort( self ):
         "Return the next port number to allocate."
-        if len( self.ports ) > 0:
-            return max( self.ports.values() ) + 1
-        return self.portBase
+        if not self.intfs:
+            return self.portBase
+        # Cached high port, in case intfs was modified directly
+        if self.maxPort not in self.intfs:
+            self.maxPort = max( self.intfs )
+        return self.maxPort + 1
 
     def addIntf( self, intf, port=None, moveIntfFn=moveIntf ):
         """Add an interface.
@@ -422,7 +506,9 @@ def addIntf( self, intf, port=None, moveIntfFn=moveIntf ):
         if port is None:
             port = self.newPort()
         self.intfs[ port ] = intf
-        self.ports[ intf ] = port
+        intf.port = port
+        if self.maxPort is None or port > self.maxPort:
+            self.maxPort = port
         self.nameToIntf[ intf.name ] = intf
         debug( '\n' )
         debug( 'added intf %s (%d) to node %s\n' % (
@@ -431,13 +517,21 @@ def addIntf( self, intf, port=None, moveIntfFn=moveIntf ):
             debug( 'moving', intf, 'into namespace for', self.name, '\n' )
             moveIntfFn( intf.name, self  )
 
+    def deferIntfConfig( self, intf ):
+        """Will we configure a new interface ourselves later on?
+           If so, intf skips its initial config()
+           intf: newly added interface
+           returns: False"""
+        assert intf
+        return False
+
     def delIntf( self, intf ):
         """Remove interface from Node's known interfaces
            Note: to fully delete interface, call intf.delete() instead"""
         port = self.ports.get( intf )
         if port is not None:
             del self.intfs[ port ]
-            del self.ports[ intf ]
+            intf.port = None
             del self.nameToIntf[ intf.name ]
 
     def defaultIntf( self ):
@@ -502,6 +596,23 @@ def setARP( self, ip, mac ):
         result = self.cmd( 'arp', '-s', ip, mac )
         return result
 
+    def setARPs( self, entries, intf=None ):
+        """Add (or replace) many ARP entries with a single command
+           entries: list of ( IP address, MAC address ) strings
+           intf: interface for entries (default interface)
+           returns: output"""
+        intf = self.intf( intf )
+        f = NamedTemporaryFile( prefix='mn-arp-', delete=False )
+        for ip, mac in entries:
+            f.write( 'neigh replace %s lladdr %s dev %s nud permanent\n' %
+                     ( ip, mac, intf ) )
+        f.close()
+        try:
+            # -force: keep going after errors
+            return self.cmd( 'ip -force -batch', f.name )
+        finally:
+            os.unlink( f.name )
+
     def setHostRoute( self, ip, intf ):
         """Add route to host.
            ip: IP address as dotted decimal
@@ -651,17 +762,19 @@ class CPULimitedHost( Host ):
 
     "CPU limited host"
 
+    # cgroup controllers we use
+    cgroupControllers = ( 'cpu', 'cpuacct', 'cpuset' )
+
     def __init__( self, name, sched='cfs', **kwargs ):
         Host.__init__( self, name, **kwargs )
         # Initialize class if necessary
         if not CPULimitedHost.inited:
             CPULimitedHost.init()
         # Create a cgroup and move shell into it
-        self.cgroup = 'cpu,cpuacct,cpuset:/' + self.name
-        errFail( 'cgcreate -g ' + self.cgroup )
-        # We don't add ourselves to a cpuset because you must
+        self.cgroup = makeCgroup( self.name, self.cgroupControllers )
+        # We don't add ourselves to a (v1) cpuset because you must
         # specify the cpu and memory placement first
-        errFail( 'cgclassify -g cpu,cpuacct:/%s %s' % ( self.name, self.pid ) )
+        self.cgroup.addPid( self.pid )
         # BL: Setting the correct period/quota is tricky, particularly
         # for RT. RT allows very small quotas, but the overhead
         # seems to be high. CFS has a mininimum quota of 1 ms, but
@@ -674,28 +787,25 @@ def __init__( self, name, sched='cfs', **kwargs ):
 
     def cgroupSet( self, param, value, resource='cpu' ):
         "Set a cgroup parameter and return its value"
-        cmd = 'cgset -r %s.%s=%s /%s' % (
-            resource, param, value, self.name )
-        quietRun( cmd )
-        nvalue = int( self.cgroupGet( param, resource ) )
-        if nvalue != value:
-            error( '*** error: cgroupSet: %s set to %s instead of %s\n'
-                   % ( param, nvalue, value ) )
-        return nvalue
+        try:
+            self.cgroup.set( resource, param, value )
+        except IOError as e:
+            error( '*** error: cgroupSet: could not set %s.%s to %s: %s\n'
+                   % ( resource, param, value, e.strerror ) )
+            return self.cgroupGet( param, resource )
+        return value
 
     def cgroupGet( self, param, resource='cpu' ):
         "Return value of cgroup parameter"
-        cmd = 'cgget -r %s.%s /%s' % (
-            resource, param, self.name )
-        return int( quietRun( cmd ).split()[ -1 ] )
+        value = self.cgroup.get( resource, param )
+        try:
+            return int( value )
+        except ValueError:
+            return value
 
     def cgroupDel( self ):
         "Clean up our cgroup"
-        # info( '*** deleting cgroup', self.cgroup, '\n' )
-        _out, _err, exitcode = errRun( 'cgdelete -r ' + self.cgroup )
-        # Sometimes cgdelete returns a resource busy error but still
-        # deletes the group; next attempt will give "no such file"
-        return exitcode == 0  or ( 'no such file' in _err.lower() )
+        return self.cgroup.delete()
 
     def popen( self, *args, **kwargs ):
         """Return a Popen() object in node's namespace
@@ -717,7 +827,9 @@ def popen( self, *args, **kwargs ):
     def cleanup( self ):
         "Clean up Node, then clean up our cgroup"
         super( CPULimitedHost, self ).cleanup()
-        retry( retries=3, delaySecs=.1, fn=self.cgroupDel )
+        if not self.cgroupDel():
+            error( '*** error: could not delete cgroup for %s\n' %
+                   self.name )
 
     _rtGroupSched = False   # internal class var: Is CONFIG_RT_GROUP_SCHED set?
 
@@ -793,8 +905,16 @@ def setCPUFrac( self, f, sched=None ):
         else:
             return
         # Set cgroup's period and quota
-        setPeriod = self.cgroupSet( pstr, period )
-        setQuota = self.cgroupSet( qstr, quota )
+        try:
+            if sched == 'rt':
+                self.cgroup.setRT( period, quota )
+            else:
+                self.cgroup.setCPUQuota( period, quota )
+        except IOError as e:
+            error( '*** error: setCPUFrac: could not set %s/%s to %d/%d: '
+                   '%s\n' % ( qstr, pstr, quota, period, e.strerror ) )
+            return
+        setPeriod, setQuota = period, quota
         if sched == 'rt':
             # Set RT priority if necessary
             sched = self.chrt()
@@ -802,20 +922,14 @@ def setCPUFrac( self, f, sched=None ):
 
     def setCPUs( self, cores, mems=0 ):
         "Specify (real) cores that our cgroup can run on"
-        if not cores:
+        if cores is None or cores == []:
             return
         if isinstance( cores, list ):
             cores = ','.join( [ str( c ) for c in cores ] )
-        self.cgroupSet( resource='cpuset', param='cpus',
-                        value=cores )
         # Memory placement is probably not relevant, but we
-        # must specify it anyway
-        self.cgroupSet( resource='cpuset', param='mems',
-                        value=mems)
-        # We have to do this here after we've specified
-        # cpus and mems
-        errFail( 'cgclassify -g cpuset:/%s %s' % (
-                 self.name, self.pid ) )
+        # must specify it anyway; we can only join a (v1) cpuset
+        # after we've specified cpus and mems
+        self.cgroup.setCPUs( cores, mems, pid=self.pid )
 
     def config( self, cpu=-1, cores=None, **params ):
         """cpu: desired overall system CPU fraction
@@ -837,6 +951,100 @@ def init( cls ):
         cls.inited = True
 
 
+class ResourceLimitedHost( CPULimitedHost ):
+
+    """CPU limited host which can also limit memory, processes and
+       block I/O, and which reports when its limits were hit"""
+
+    cgroupControllers = CPULimitedHost.cgroupControllers + (
+        'memory', 'pids', 'io' )
+
+    def __init__( self, name, **kwargs ):
+        CPULimitedHost.__init__( self, name, **kwargs )
+        self.mem = None
+        self.lastEvents = {}
+
+    def cgroupLimit( self, method, *args, **kwargs ):
+        """Internal method: call cgroup limit method
+           returns: True on success"""
+        try:
+            getattr( self.cgroup, method )( *args, **kwargs )
+            return True
+        except IOError as e:
+            error( '*** error: %s: %s%s failed: %s\n' % (
+                self.name, method, args, e.strerror ) )
+            return False
+
+    def setMemory( self, mem ):
+        "Set hard memory limit (bytes, '512M' etc., or -1 for none)"
+        self.mem = sizeBytes( mem )
+        return self.cgroupLimit( 'setMemory', limit=self.mem )
+
+    def setMemHigh( self, memHigh ):
+        "Set memory level above which we are throttled and reclaimed"
+        return self.cgroupLimit( 'setMemory', high=sizeBytes( memHigh ) )
+
+    def setSwap( self, swap ):
+        "Set swap limit (with cgroup v1, requires a memory limit)"
+        return self.cgroupLimit( 'setMemory', limit=self.mem,
+                                 swap=sizeBytes( swap ) )
+
+    def setPids( self, pids ):
+        "Limit number of processes and threads"
+        return self.cgroupLimit( 'setPids', pids )
+
+    def setIO( self, **devices ):
+        """Limit block I/O
+           devices: { device: { 'rbps'|'wbps'|'riops'|'wiops': rate } }
+           where device is a path such as '/dev/sda' or major:minor"""
+        return all( self.cgroupLimit( 'setIO', device, **limits )
+                    for device, limits in devices.iteritems() )
+
+    def config( self, mem=None, memHigh=None, swap=None, pids=None,
+                io=None, **params ):
+        """mem: hard memory limit, e.g. '512M' (OOM kill beyond it)
+           memHigh: memory throttling threshold
+           swap: swap limit
+           pids: maximum number of processes and threads
+           io: { device: { 'rbps'|'wbps'|'riops'|'wiops': rate } }
+           params: parameters for CPULimitedHost.config()"""
+        r = CPULimitedHost.config( self, **params )
+        self.setParam( r, 'setMemory', mem=mem )
+        self.setParam( r, 'setMemHigh', memHigh=memHigh )
+        self.setParam( r, 'setSwap', swap=swap )
+        self.setParam( r, 'setPids', pids=pids )
+        self.setParam( r, 'setIO', io=io )
+        return r
+
+    def events( self ):
+        """Return counts of OOM kills, memory, process limit and CPU
+           throttling events (see mininet.cgroup.Cgroup.events())"""
+        return self.cgroup.events()
+
+    def checkEvents( self ):
+        """Warn about limit events since the last check
+           returns: { event: new count }"""
+        events = self.events()
+        new = { event: count - self.lastEvents.get( event, 0 )
+                for event, count in events.iteritems() }
+        new = { event: count for event, count in new.iteritems() if count }
+        self.lastEvents = events
+        if new.get( 'oom_kill' ):
+            warn( '*** %s: %d processes killed by the OOM killer\n' %
+                  ( self.name, new[ 'oom_kill' ] ) )
+        others = [ '%s=%d' % ( event, new[ event ] ) for event in
+                   sorted( new ) if event != 'oom_kill' ]
+        if others:
+            info( '*** %s hit its limits: %s\n' % ( self.name,
+                                                   ' '.join( others ) ) )
+        return new
+
+    def cleanup( self ):
+        "Report limit events, then clean up"
+        self.checkEvents()
+        super( ResourceLimitedHost, self ).cleanup()
+
+
 # Some important things to note:
 #
 # The "IP" address which setIP() assigns to the switch is not
@@ -857,6 +1065,30 @@ def init( cls ):
 # meaningless. It is important to understand this if you
 # want to create a functional router using OpenFlow.
 
+class BatchResult( list ):
+    """List of nodes handled by a batch operation, with the time
+       taken by each of its phases in seconds ( timings )"""
+
+    def __init__( self, nodes=() ):
+        list.__init__( self, nodes )
+        self.timings = OrderedDict()
+
+    @contextmanager
+    def phase( self, name ):
+        "Context manager which times a phase of the operation"
+        start = time()
+        try:
+            yield
+        finally:
+            self.timings[ name ] = ( self.timings.get( name, 0 ) +
+                                     time() - start )
+
+    def report( self ):
+        "Return phase timings as a string"
+        return ' '.join( '%s %.3fs' % item
+                         for item in self.timings.iteritems() )
+
+
 class Switch( Node ):
     """A Switch is a Node that is running (or has execed?)
        an OpenFlow switch."""
@@ -917,6 +1149,24 @@ def connected( self ):
         debug( 'Assuming', repr( self ), 'is connected to a controller\n' )
         return True
 
+    def addFlows( self, flows, **_kwargs ):
+        """Install flows, one dpctl() call per flow
+           (override this method to load flows in bulk)
+           flows: list of flows in dpctl syntax
+           returns: output"""
+        return ''.join( self.dpctl( 'add-flow', quote( flow ) )
+                        for flow in flows )
+
+    def delFlows( self, flows=None, **_kwargs ):
+        """Delete flows, one dpctl() call per flow
+           (override this method to delete flows in bulk)
+           flows: list of flows to delete, or None for all flows
+           returns: output"""
+        if flows is None:
+            return self.dpctl( 'del-flows' )
+        return ''.join( self.dpctl( 'del-flows', quote( flow ) )
+                        for flow in flows )
+
     def stop( self, deleteIntfs=True ):
         """Stop switch
            deleteIntfs: delete interfaces? (True)"""
@@ -956,15 +1206,45 @@ def setup( cls ):
         if not os.path.exists( '/dev/net/tun' ):
             moduleDeps( add=TUN )
 
-    def dpctl( self, *args ):
-        "Run dpctl command"
-        listenAddr = None
+    def listenAddr( self ):
+        "Return dpctl address of our switch"
         if not self.listenPort:
-            listenAddr = 'unix:/tmp/%s.listen' % self.name
+            return 'unix:/tmp/%s.listen' % self.name
         else:
-            listenAddr = 'tcp:127.0.0.1:%i' % self.listenPort
+            return 'tcp:127.0.0.1:%i' % self.listenPort
+
+    def dpctl( self, *args ):
+        "Run dpctl command"
         return self.cmd( 'dpctl ' + ' '.join( args ) +
-                         ' ' + listenAddr )
+                         ' ' + self.listenAddr() )
+
+    def dpctlScript( self, cmd, flows ):
+        """Run dpctl cmd for each flow from one script, rather than
+           one shell command per flow (dpctl has no bulk mode)
+           returns: output"""
+        f = NamedTemporaryFile( prefix='mn-flows-', delete=False )
+        for flow in flows:
+            f.write( 'dpctl %s %s %s\n' % ( cmd, quote( flow ),
+                                           self.listenAddr() ) )
+        f.close()
+        try:
+            return self.cmd( 'sh', f.name )
+        finally:
+            os.unlink( f.name )
+
+    def addFlows( self, flows, **_kwargs ):
+        """Install flows using a single dpctl script
+           flows: list of flows in dpctl syntax
+           returns: output"""
+        return self.dpctlScript( 'add-flow', flows )
+
+    def delFlows( self, flows=None, **_kwargs ):
+        """Delete flows using a single dpctl script
+           flows: list of flows to delete, or None for all flows
+           returns: output"""
+        if flows is None:
+            return self.dpctl( 'del-flows' )
+        return self.dpctlScript( 'del-flows', flows )
 
     def connected( self ):
         "Is the switch connected to a controller?"
@@ -1030,12 +1310,39 @@ def stop( self, deleteIntfs=True ):
         super( UserSwitch, self ).stop( deleteIntfs )
 
 
+def ofctlFlows( node, target, flows, bundle=False, protocols=None,
+                command=None, subcommand='add-flows' ):
+    """Stream flows to one ovs-ofctl add-flows call on its stdin
+       node: node to run ovs-ofctl in
+       target: switch name or ovs-ofctl connection target
+       flows: iterable of flows in ovs-ofctl syntax
+       bundle: use an OpenFlow 1.4 bundle (False)
+       protocols: OpenFlow versions to use (ovs-ofctl default)
+       command: flow_mod command prefix, e.g. 'delete' (add)
+       subcommand: ovs-ofctl command which reads a file ('add-flows')
+       returns: ovs-ofctl output"""
+    args = [ 'ovs-ofctl' ]
+    if protocols:
+        args += [ '-O', protocols ]
+    if bundle:
+        args.append( '--bundle' )
+    args += [ subcommand, target, '-' ]
+    prefix = command + ' ' if command else ''
+    popen = node.popen( args, stdin=PIPE, stdout=PIPE, stderr=STDOUT )
+    out, _err = popen.communicate(
+        ''.join( '%s%s\n' % ( prefix, flow ) for flow in flows ) )
+    if popen.returncode:
+        error( '*** Error: %s: %s' % ( ' '.join( args ), out ) )
+    return out
+
+
 class OVSSwitch( Switch ):
     "Open vSwitch switch. Depends on ovs-vsctl."
 
     def __init__( self, name, failMode='secure', datapath='kernel',
                   inband=False, protocols=None,
-                  reconnectms=1000, stp=False, batch=False, **params ):
+                  reconnectms=1000, stp=False, batch=False, ovsdb=False,
+                  **params ):
         """name: name for switch
            failMode: controller loss behavior (secure|standalone)
            datapath: userspace or kernel mode (kernel|user)
@@ -1044,7 +1351,9 @@ def __init__( self, name, failMode='secure', datapath='kernel',
                       Unspecified (or old OVS version) uses OVS default
            reconnectms: max reconnect timeout in ms (0/None for default)
            stp: enable STP (False, requires failMode=standalone)
-           batch: enable batch startup (False)"""
+           batch: enable batch startup (False)
+           ovsdb: talk to ovsdb-server directly instead of using
+                  ovs-vsctl (False, requires OVS 1.10+)"""
         Switch.__init__( self, name, **params )
         self.failMode = failMode
         self.datapath = datapath
@@ -1055,6 +1364,10 @@ def __init__( self, name, failMode='secure', datapath='kernel',
         self._uuids = []  # controller UUIDs
         self.batch = batch
         self.commands = []  # saved commands for batch startup
+        self.ovsdb = ovsdb
+        self.ops = []  # saved OVSDB operations for batch startup
+        self.started = False
+        self.deferredIntfs = []  # TCIntfs awaiting TCReapply()
 
     @classmethod
     def setup( cls ):
@@ -1088,10 +1401,93 @@ def dpctl( self, *args ):
         "Run ovs-ofctl command"
         return self.cmd( 'ovs-ofctl', args[ 0 ], self, *args[ 1: ] )
 
+    def ofctlArgs( self, *args ):
+        """Return argument list to run ovs-ofctl command for our
+           bridge, e.g. ofctlArgs( 'dump-ports' )"""
+        opts = [ '-O', self.protocols ] if self.protocols else []
+        return ( [ 'ovs-ofctl' ] + opts + [ args[ 0 ], self.name ] +
+                 list( args[ 1: ] ) )
+
+    def addFlows( self, flows, bundle=False ):
+        """Install flows with one ovs-ofctl add-flows call
+           flows: list of flows in ovs-ofctl syntax
+           bundle: install all or none of them, using an OpenFlow
+                   1.4 bundle (False)
+           returns: ovs-ofctl output"""
+        return ofctlFlows( self, self.name, flows, bundle=bundle,
+                           protocols=self.protocols )
+
+    def delFlows( self, flows=None, strict=False, bundle=False ):
+        """Delete flows with one ovs-ofctl call
+           flows: list of flows to delete, or None for all flows
+           strict: match priority and wildcards exactly (False)
+           bundle: use an OpenFlow 1.4 bundle (False)
+           returns: ovs-ofctl output"""
+        if flows is None:
+            return self.cmd( *self.ofctlArgs( 'del-flows' ) )
+        return ofctlFlows( self, self.name, flows, bundle=bundle,
+                           protocols=self.protocols,
+                           command='delete_strict' if strict
+                           else 'delete' )
+
+    def addGroups( self, groups ):
+        """Add OpenFlow groups with one ovs-ofctl add-groups call
+           (requires OpenFlow 1.1+ in protocols)
+           groups: list of groups in ovs-ofctl syntax
+           returns: ovs-ofctl output"""
+        return ofctlFlows( self, self.name, groups,
+                           protocols=self.protocols,
+                           subcommand='add-groups' )
+
+    def delGroups( self ):
+        "Delete all OpenFlow groups (requires OpenFlow 1.1+)"
+        return self.cmd( *self.ofctlArgs( 'del-groups' ) )
+
+    dbConnection = None  # shared OVSDB client
+
+    @staticmethod
+    def db():
+        "Return shared OVSDB connection"
+        if not OVSSwitch.dbConnection:
+            OVSSwitch.dbConnection = OVSDB()
+        return OVSSwitch.dbConnection
+
+    def transact( self, ops ):
+        "Run OVSDB operations (or queue for later execution)"
+        self.ops += ops
+        if not self.batch:
+            self.commitOps( [ self ] )
+
+    @classmethod
+    def commitOps( cls, switches, db=None ):
+        """Run queued OVSDB operations for switches as one
+           transaction, replacing any existing bridges with the
+           same names as bridges being created
+           db: OVSDB connection (shared connection)"""
+        ops = [ op for switch in switches for op in switch.ops ]
+        for switch in switches:
+            switch.ops = []
+        if not ops:
+            return
+        names = [ op[ 'row' ][ 'name' ] for op in ops
+                  if op[ 'op' ] == 'insert' and op[ 'table' ] == 'Bridge' ]
+        db = db or cls.db()
+        db.transact( db.delBridgeOps( names ) + ops, wait=True )
+
+    def queuedPorts( self ):
+        "Return names of ports added by queued commands"
+        ports = findall( r'add-port \S+ (\S+)', ' '.join( self.commands ) )
+        ports += [ op[ 'row' ][ 'name' ] for op in self.ops
+                   if op[ 'op' ] == 'insert' and op[ 'table' ] == 'Port' ]
+        return ports
+
     def vsctl( self, *args, **kwargs ):
         "Run ovs-vsctl command (or queue for later execution)"
         if self.batch:
             cmd = ' '.join( str( arg ).strip() for arg in args )
+            # Queued commands are joined into one ovs-vsctl call
+            if not cmd.startswith( '--' ):
+                cmd = '-- ' + cmd
             self.commands.append( cmd )
         else:
             return self.cmd( 'ovs-vsctl', *args, **kwargs )
@@ -1104,20 +1500,56 @@ def TCReapply( intf ):
         if isinstance( intf, TCIntf ):
             intf.config( **intf.params )
 
+    def deferIntfConfig( self, intf ):
+        """TC configuration is applied once, by TCReapply(), after
+           the port is attached: before start() or in batch mode
+           (where the caller reapplies it) we defer it"""
+        if isinstance( intf, TCIntf ) and ( self.batch or
+                                            not self.started ):
+            self.deferredIntfs.append( intf )
+            return True
+        return False
+
+    def reapplyDeferred( self, intfs=() ):
+        """TCReapply() intfs and any deferred TCIntfs, once each
+           intfs: additional interfaces (e.g. newly attached ports)"""
+        deferred, self.deferredIntfs = self.deferredIntfs, []
+        intfs = list( intfs )
+        seen = set( intfs )
+        intfs += [ intf for intf in deferred if intf not in seen ]
+        for intf in intfs:
+            # Skip interfaces which have since been deleted
+            if intf.node is self and intf.port is not None:
+                self.TCReapply( intf )
+
     def attach( self, intf ):
-        "Connect a data port"
-        self.vsctl( 'add-port', self, intf )
+        """Connect a data port
+           (in batch mode, TCReapply() is left to the caller)"""
+        if self.ovsdb:
+            self.transact( OVSDB.addPortOps( self.name, intf.name,
+                                             self.intfColumns( intf ) ) )
+        else:
+            self.vsctl( 'add-port', self, intf )
         self.cmd( 'ifconfig', intf, 'up' )
-        self.TCReapply( intf )
+        if not self.batch:
+            self.TCReapply( intf )
 
     def detach( self, intf ):
         "Disconnect a data port"
-        self.vsctl( 'del-port', self, intf )
+        if self.ovsdb:
+            self.transact( self.db().delPortOps( self.name, [ intf.name ] ) )
+        else:
+            self.vsctl( 'del-port', self, intf )
 
     def controllerUUIDs( self, update=False ):
         """Return ovsdb UUIDs for our controllers
            update: update cached value"""
-        if not self._uuids or update:
+        if ( not self._uuids or update ) and self.ovsdb:
+            rows = self.db().select( 'Bridge', [ [ 'name', '==', self.name ] ],
+                                     [ 'controller' ] )
+            self._uuids = [ uuid for row in rows[ : 1 ]
+                            for _, uuid in setItems( row[ 'controller' ] ) ]
+        elif not self._uuids or update:
             controllers = self.cmd( 'ovs-vsctl -- get Bridge', self,
                                     'Controller' ).strip()
             if controllers.startswith( '[' ) and controllers.endswith( ']' ):
@@ -1129,6 +1561,16 @@ def controllerUUIDs( self, update=False ):
 
     def connected( self ):
         "Are we connected to at least one of our controllers?"
+        if self.ovsdb:
+            results = self.db().transact(
+                [ { 'op': 'select', 'table': 'Controller',
+                    'where': [ [ '_uuid', '==', [ 'uuid', uuid ] ] ],
+                    'columns': [ 'is_connected' ] }
+                  for uuid in self.controllerUUIDs() ] )
+            if any( row[ 'is_connected' ] is True
+                    for result in results for row in result[ 'rows' ] ):
+                return True
+            return self.failMode == 'standalone'
         for uuid in self.controllerUUIDs():
             if 'true' in self.vsctl( '-- get Controller',
                                      uuid, 'is_connected' ):
@@ -1148,6 +1590,137 @@ def intfOpts( self, intf ):
                 opts += ' type=patch options:peer=%s' % peer
         return '' if not opts else ' -- set Interface %s' % intf + opts
 
+    @classmethod
+    def waitConnected( cls, switches, timeout=None, delay=.5 ):
+        """Wait for switches to connect to a controller: watch
+           ovsdb switches with an OVSDB monitor, and check others
+           with one ovs-vsctl call per round
+           timeout: time to wait, or None to wait indefinitely
+           delay: seconds to sleep per round (ovs-vsctl only)
+           returns: connected switches; remote switches are left
+                    to the caller"""
+        end = None if timeout is None else time() + timeout
+        switches = [ s for s in switches
+                     if not getattr( s, 'isRemote', False ) ]
+        dbSwitches = [ s for s in switches if s.ovsdb ]
+        remaining = [ s for s in switches if not s.ovsdb ]
+        connected = cls.monitorConnected( dbSwitches, end ) if (
+            dbSwitches ) else []
+        while remaining:
+            status = cls.connectionStatus()
+            for switch in tuple( remaining ):
+                if ( status.get( switch.name ) or
+                     switch.failMode == 'standalone' ):
+                    connected.append( switch )
+                    remaining.remove( switch )
+            if not remaining or end is not None and time() >= end:
+                break
+            sleep( delay )
+        return connected
+
+    @staticmethod
+    def connectionStatus():
+        """Return connection status of all bridges, using one
+           ovs-vsctl call
+           returns: { bridge name: connected to any controller? }"""
+        out = quietRun( 'ovs-vsctl --format=json'
+                        ' -- --columns=name,controller list Bridge'
+                        ' -- --columns=_uuid,is_connected list Controller' )
+        decoder, tables = json.JSONDecoder(), []
+        out = out.strip()
+        while out:
+            try:
+                table, index = decoder.raw_decode( out )
+            except ValueError:
+                error( 'Could not parse ovs-vsctl output: %s\n' % out )
+                return {}
+            tables.append( table[ 'data' ] )
+            out = out[ index: ].strip()
+        if len( tables ) != 2:
+            return {}
+        bridges, controllers = tables
+        isConnected = { uuid: up is True
+                        for ( _, uuid ), up in controllers }
+        return { name: any( isConnected.get( uuid )
+                            for _, uuid in setItems( clist ) )
+                 for name, clist in bridges }
+
+    @classmethod
+    def monitorConnected( cls, switches, end=None ):
+        """Wait for switches to connect, using one OVSDB monitor of
+           the Bridge and Controller tables
+           end: time to give up, or None to wait indefinitely
+           returns: connected switches"""
+        db = cls.db()
+        tables = db.monitorTables( { 'Bridge': [ 'name', 'controller' ],
+                                     'Controller': [ 'is_connected' ] } )
+        bridges, controllers = tables[ 'Bridge' ], tables[ 'Controller' ]
+        remaining, connected = list( switches ), []
+        try:
+            while True:
+                byName = { row.get( 'name' ): row
+                           for row in bridges.itervalues() }
+                for switch in tuple( remaining ):
+                    clist = byName.get( switch.name, {} ).get(
+                        'controller', ovsSet( [] ) )
+                    if ( switch.failMode == 'standalone' or
+                         any( controllers.get( uuid, {} ).get(
+                             'is_connected' ) is True
+                              for _, uuid in setItems( clist ) ) ):
+                        connected.append( switch )
+                        remaining.remove( switch )
+                wait = None if end is None else end - time()
+                if not remaining or wait is not None and wait <= 0:
+                    break
+                for table, uuid, row in db.updates( timeout=wait ):
+                    rows = { 'Bridge': bridges,
+                             'Controller': controllers }.get( table )
+                    if rows is None:
+                        continue
+                    if row is None:
+                        rows.pop( uuid, None )
+                    else:
+                        rows[ uuid ] = row
+        finally:
+            db.cancel()
+        return connected
+
+    def intfColumns( self, intf ):
+        "Return OVSDB Interface columns for intf (see intfOpts())"
+        columns = { 'ofport_request': self.ports[ intf ] }
+        if isinstance( intf, OVSIntf ):
+            intf1, intf2 = intf.link.intf1, intf.link.intf2
+            peer = intf1 if intf1 != intf else intf2
+            columns.update( type='patch',
+                            options=ovsMap( { 'peer': peer.name } ) )
+        return columns
+
+    def bridgeOps( self, controllers ):
+        "Return OVSDB operations to create our bridge (see start())"
+        ports = [ ( intf.name, self.intfColumns( intf ) )
+                  for intf in self.intfList()
+                  if self.ports[ intf ] and not intf.IP() ]
+        targets = [ '%s:%s:%d' % ( c.protocol, c.IP(), c.port )
+                    for c in controllers ]
+        if self.listenPort:
+            targets.append( 'ptcp:%s' % self.listenPort )
+        clist = [ { 'target': target } for target in targets ]
+        if self.reconnectms:
+            for controller in clist:
+                controller[ 'max_backoff' ] = self.reconnectms
+        otherConfig = { 'datapath-id': self.dpid }
+        if not self.inband:
+            otherConfig[ 'disable-in-band' ] = 'true'
+        bridge = { 'fail_mode': self.failMode,
+                   'other_config': ovsMap( otherConfig ) }
+        if self.datapath == 'user':
+            bridge[ 'datapath_type' ] = 'netdev'
+        if self.protocols:
+            bridge[ 'protocols' ] = ovsSet( self.protocols.split( ',' ) )
+        if self.stp and self.failMode == 'standalone':
+            bridge[ 'stp_enable' ] = True
+        return OVSDB.addBridgeOps( self.name, ports, clist, bridge )
+
     def bridgeOpts( self ):
         "Return OVS bridge options"
         opts = ( ' other_config:datapath-id=%s' % self.dpid +
@@ -1168,6 +1741,14 @@ def start( self, controllers ):
             raise Exception(
                 'OVS kernel switch does not work in a namespace' )
         int( self.dpid, 16 )  # DPID must be a hex string
+        if self.ovsdb:
+            # One OVSDB transaction (which also deletes any
+            # existing bridge with the same name)
+            self.transact( self.bridgeOps( controllers ) )
+            self.started = True
+            if not self.batch:
+                self.reapplyDeferred( self.intfList() )
+            return
         # Command to add interfaces
         intfs = ''.join( ' -- add-port %s %s' % ( self, intf ) +
                          self.intfOpts( intf )
@@ -1196,26 +1777,40 @@ def start( self, controllers ):
                     ' -- set bridge %s controller=[%s]' % ( self, cids  ) +
                     self.bridgeOpts() +
                     intfs )
+        self.started = True
         # If necessary, restore TC config overwritten by OVS
         if not self.batch:
-            for intf in self.intfList():
-                self.TCReapply( intf )
+            self.reapplyDeferred( self.intfList() )
 
     # This should be ~ int( quietRun( 'getconf ARG_MAX' ) ),
     # but the real limit seems to be much lower
     argmax = 128000
 
+    # Default number of concurrent ovs-vsctl calls or OVSDB
+    # transactions for batch startup and shutdown
+    shards = 4
+
     @classmethod
-    def batchStartup( cls, switches, run=errRun ):
-        """Batch startup for OVS
-           switches: switches to start up
-           run: function to run commands (errRun)"""
-        info( '...' )
+    def batchCommands( cls, switches, run=errRun, shards=1 ):
+        """Run queued ovs-vsctl commands for switches in as few
+           ovs-vsctl calls as possible, and turn off batch mode
+           switches: switches with queued commands
+           run: function to run commands (errRun)
+           shards: number of concurrent ovs-vsctl calls or OVSDB
+                   transactions (1)"""
+        groups = shard( switches, shards )
+        parallel( lambda group: cls.commitShard( group, run=run,
+                                                 newdb=len( groups ) > 1 ),
+                  groups )
+
+    @classmethod
+    def commitShard( cls, switches, run=errRun, newdb=False ):
+        """Run queued commands and OVSDB operations for one shard
+           switches: switches with queued commands
+           run: function to run commands (errRun)
+           newdb: use a separate OVSDB connection? (False)"""
         cmds = 'ovs-vsctl'
         for switch in switches:
-            if switch.isOldOVS():
-                # Ideally we'd optimize this also
-                run( 'ovs-vsctl del-br %s' % switch )
             for cmd in switch.commands:
                 cmd = cmd.strip()
                 # Don't exceed ARG_MAX
@@ -1223,40 +1818,108 @@ def batchStartup( cls, switches, run=errRun ):
                     run( cmds, shell=True )
                     cmds = 'ovs-vsctl'
                 cmds += ' ' + cmd
-                switch.cmds = []
-                switch.batch = False
-        if cmds:
+            switch.commands = []
+            switch.batch = False
+        if cmds != 'ovs-vsctl':
             run( cmds, shell=True )
-        # Reapply link config if necessary...
-        for switch in switches:
-            for intf in switch.intfs.itervalues():
-                if isinstance( intf, TCIntf ):
-                    intf.config( **intf.params )
-        return switches
+        # OVSDB operations don't need to be split up, but the shared
+        # connection can't be used by concurrent shards
+        if not newdb or not any( switch.ops for switch in switches ):
+            cls.commitOps( switches )
+            return
+        db = OVSDB()
+        try:
+            cls.commitOps( switches, db=db )
+        finally:
+            db.close()
+
+    @classmethod
+    def batchStartup( cls, switches, run=errRun, shards=None ):
+        """Batch startup for OVS
+           switches: switches to start up
+           run: function to run commands (errRun)
+           shards: number of concurrent ovs-vsctl calls, OVSDB
+                   transactions or TC updates (cls.shards)
+           returns: BatchResult of switches with phase timings"""
+        info( '...' )
+        shards = cls.shards if shards is None else shards
+        result = BatchResult( switches )
+        with result.phase( 'delete' ):
+            # Ideally we'd optimize this also
+            parallel( lambda switch: run( 'ovs-vsctl del-br %s' % switch ),
+                      [ switch for switch in switches
+                        if switch.isOldOVS() and not switch.ovsdb ],
+                      shards )
+        with result.phase( 'configure' ):
+            cls.batchCommands( switches, run=run, shards=shards )
+        with result.phase( 'tc' ):
+            # Reapply link config if necessary...
+            parallel( cls.reapplyTC, switches, shards )
+        debug( 'OVS batch startup: %s\n' % result.report() )
+        return result
+
+    @staticmethod
+    def reapplyTC( switch ):
+        "Reapply TC configuration to switch's TCIntfs"
+        switch.reapplyDeferred( switch.intfList() )
 
     def stop( self, deleteIntfs=True ):
         """Terminate OVS switch.
            deleteIntfs: delete interfaces? (True)"""
-        self.cmd( 'ovs-vsctl del-br', self )
+        if self.ovsdb:
+            self.db().delBridges( [ self.name ] )
+        else:
+            self.cmd( 'ovs-vsctl del-br', self )
         if self.datapath == 'user':
             self.cmd( 'ip link del', self )
         super( OVSSwitch, self ).stop( deleteIntfs )
 
     @classmethod
-    def batchShutdown( cls, switches, run=errRun ):
-        "Shut down a list of OVS switches"
+    def batchShutdown( cls, switches, run=errRun, shards=None ):
+        """Shut down a list of OVS switches
+           switches: switches to shut down
+           run: function to run commands (errRun)
+           shards: number of concurrent ovs-vsctl calls or OVSDB
+                   transactions (cls.shards)
+           returns: BatchResult of switches with phase timings"""
+        shards = cls.shards if shards is None else shards
+        result = BatchResult( switches )
         delcmd = 'del-br %s'
         if switches and not switches[ 0 ].isOldOVS():
             delcmd = '--if-exists ' + delcmd
         # First, delete them all from ovsdb
-        run( 'ovs-vsctl ' +
-             ' -- '.join( delcmd % s for s in switches ) )
+        dbSwitches = [ s for s in switches if s.ovsdb ]
+        vsctlSwitches = [ s for s in switches if not s.ovsdb ]
+        dbGroups = shard( dbSwitches, shards ) if dbSwitches else []
+        vsctlGroups = shard( vsctlSwitches, shards ) if (
+            vsctlSwitches ) else []
+
+        def delete( item ):
+            "Delete a shard of bridges"
+            usedb, group = item
+            if not usedb:
+                run( 'ovs-vsctl ' +
+                     ' -- '.join( delcmd % s for s in group ) )
+            elif len( dbGroups ) == 1:
+                cls.db().delBridges( [ s.name for s in group ] )
+            else:
+                db = OVSDB()
+                try:
+                    db.delBridges( [ s.name for s in group ] )
+                finally:
+                    db.close()
+
+        with result.phase( 'delete' ):
+            parallel( delete, [ ( True, g ) for g in dbGroups ] +
+                      [ ( False, g ) for g in vsctlGroups ] )
         # Next, shut down all of the processes
-        pids = ' '.join( str( switch.pid ) for switch in switches )
-        run( 'kill -HUP ' + pids )
+        with result.phase( 'kill' ):
+            pids = ' '.join( str( switch.pid ) for switch in switches )
+            run( 'kill -HUP ' + pids )
         for switch in switches:
             switch.shell = None
-        return switches
+        debug( 'OVS batch shutdown: %s\n' % result.report() )
+        return result
 
 
 OVSKernelSwitch = OVSSwitch
@@ -1353,6 +2016,36 @@ def dpctl( self, *args ):
         return self.cmd( 'ovs-ofctl ' + ' '.join( args ) +
                          ' tcp:127.0.0.1:%i' % self.listenPort )
 
+    def ofctlArgs( self, *args ):
+        """Return argument list to run ovs-ofctl command for our
+           switch (which must have a listening port)"""
+        return ( [ 'ovs-ofctl', args[ 0 ],
+                   'tcp:127.0.0.1:%i' % self.listenPort ] +
+                 list( args[ 1: ] ) )
+
+    def addFlows( self, flows, bundle=False ):
+        """Install flows with one ovs-ofctl add-flows call
+           flows: list of flows in ovs-ofctl syntax
+           bundle: use an OpenFlow 1.4 bundle (False)
+           returns: ovs-ofctl output"""
+        if not self.listenPort:
+            return "can't run dpctl without passive listening port"
+        return ofctlFlows( self, 'tcp:127.0.0.1:%i' % self.listenPort,
+                           flows, bundle=bundle )
+
+    def delFlows( self, flows=None, strict=False, bundle=False ):
+        """Delete flows with one ovs-ofctl call
+           flows: list of flows to delete, or None for all flows
+           strict: match priority and wildcards exactly (False)
+           bundle: use an OpenFlow 1.4 bundle (False)
+           returns: ovs-ofctl output"""
+        if flows is None or not self.listenPort:
+            return self.dpctl( 'del-flows' )
+        return ofctlFlows( self, 'tcp:127.0.0.1:%i' % self.listenPort,
+                           flows, bundle=bundle,
+                           command='delete_strict' if strict
+                           else 'delete' )
+
 
 class Controller( Node ):
     """A Controller is a Node that is running (or has execed?) an
@@ -1377,15 +2070,7 @@ def __init__( self, name, inNamespace=False, command='controller',
 
     def checkListening( self ):
         "Make sure no controllers are running on our port"
-        # Verify that Telnet is installed first:
-        out, _err, returnCode = errRun( "which telnet" )
-        if 'telnet' not in out or returnCode != 0:
-            raise Exception( "Error running telnet to check for listening "
-                             "controllers; please check that it is "
-                             "installed." )
-        listening = self.cmd( "echo A | telnet -e A %s %d" %
-                              ( self.ip, self.port ) )
-        if 'Connected' in listening:
+        if tcpProbe( self.ip, self.port, node=self ) == 0:
             servers = self.cmd( 'netstat -natp' ).split( '\n' )
             pstr = ':%d ' % self.port
             clist = servers[ 0:1 ] + [ s for s in servers if pstr in s ]
@@ -1491,6 +2176,46 @@ def __init__( self, name, *ryuArgs, **kwargs ):
                              **kwargs )
 
 
+class PyController( Controller ):
+    """Mininet's built-in Python OpenFlow 1.0/1.3 controller
+       (mininet.ofcontroller), which needs no external binaries"""
+
+    script = os.path.abspath(
+        os.path.splitext( ofcontroller.__file__ )[ 0 ] + '.py' )
+
+    def __init__( self, name, mode='learning', idleTimeout=60,
+                  queueLimit=1000, **kwargs ):
+        """name: name to give controller
+           mode: 'learning' or 'proactive' (routes from setRoutes())
+           idleTimeout: idle timeout for learned flows
+           queueLimit: maximum queued packet-ins per switch"""
+        if mode not in ( 'learning', 'proactive' ):
+            raise Exception( "PyController mode must be 'learning' "
+                             "or 'proactive'" )
+        self.mode = mode
+        self.routesFile = '/tmp/%s-routes.json' % name
+        cargs = '%s --mode %s --idle-timeout %d --queue %d' % (
+            self.script, mode, idleTimeout, queueLimit )
+        if mode == 'proactive':
+            cargs += ' --routes ' + self.routesFile
+        kwargs.setdefault( 'command', sys.executable )
+        kwargs.setdefault( 'cargs', cargs + ' --port %d' )
+        Controller.__init__( self, name, **kwargs )
+
+    def setRoutes( self, net ):
+        """Write net's shortest-path routes for proactive mode;
+           called by Mininet.start() before start()"""
+        if self.mode != 'proactive':
+            return
+        from mininet.routing import controllerRoutes
+        with open( self.routesFile, 'w' ) as f:
+            json.dump( controllerRoutes( net ), f )
+
+    @classmethod
+    def isAvailable( cls ):
+        return True
+
+
 class RemoteController( Controller ):
     "Controller running outside of Mininet's control."
 
@@ -1530,15 +2255,14 @@ def checkListening( self ):
 
     def isListening( self, ip, port ):
         "Check if a remote controller is listening at a specific ip and port"
-        listening = self.cmd( "echo A | telnet -e A %s %d" % ( ip, port ) )
-        if 'Connected' not in listening:
+        if tcpProbe( ip, port, node=self ) != 0:
             warn( "Unable to contact the remote controller"
                   " at %s:%d\n" % ( ip, port ) )
             return False
         else:
             return True
 
-DefaultControllers = ( Controller, OVSController )
+DefaultControllers = ( Controller, OVSController, PyController )
 
 def findController( controllers=DefaultControllers ):
     "Return first available controller from list, if any"
@@ -0,0 +1,448 @@
+#!/usr/bin/env python
+
+"""
+Built-in OpenFlow 1.0/1.3 controller for Mininet
+
+This is a single-process, event-driven controller (one epoll loop,
+non-blocking sockets) which can serve thousands of switch
+connections without any external controller binary:
+
+    python ofcontroller.py --port 6653 --mode learning
+
+Modes:
+
+- learning: per-switch MAC learning; known destinations get a flow
+  (dl_dst -> port) and unknown or broadcast destinations are flooded
+- proactive: flows are installed from a routes file (written by
+  PyController.setRoutes() using mininet.routing) as soon as each
+  switch connects; packets which miss are only flooded along the
+  spanning tree
+
+Flow-mods and packet-outs are queued per connection and written
+with one send() per loop iteration, and each connection's queue of
+unhandled packet-ins is bounded (the oldest are dropped) so that a
+flood of packet-ins can't starve other switches or exhaust memory.
+
+PyController (mininet.node) runs this controller in a Mininet
+Controller node.
+"""
+
+import errno
+import json
+import select
+import socket
+import struct
+import sys
+from collections import deque
+from optparse import OptionParser
+
+
+OFP10, OFP13 = 0x01, 0x04
+versions = ( OFP10, OFP13 )
+
+# Message types (the same in OpenFlow 1.0 and 1.3)
+HELLO, ERROR, ECHO_REQUEST, ECHO_REPLY = 0, 1, 2, 3
+FEATURES_REQUEST, FEATURES_REPLY = 5, 6
+PACKET_IN, PACKET_OUT, FLOW_MOD = 10, 13, 14
+
+NO_BUFFER = 0xffffffff
+BROADCAST = '\xff' * 6
+
+# Per-version port numbers
+FLOOD = { OFP10: 0xfffb, OFP13: 0xfffffffb }
+CONTROLLER = { OFP10: 0xfffd, OFP13: 0xfffffffd }
+ANY = { OFP10: 0xffff, OFP13: 0xffffffff }
+
+header = struct.Struct( '!BBHI' )
+
+
+def macBytes( mac ):
+    "Convert MAC string (00:00:00:00:00:01) to bytes"
+    return ''.join( chr( int( b, 16 ) ) for b in mac.split( ':' ) )
+
+
+# Message encoding
+
+def message( version, msgType, body='', xid=0 ):
+    "Return OpenFlow message"
+    return header.pack( version, msgType, header.size + len( body ),
+                        xid ) + body
+
+def hello():
+    "Return HELLO offering OpenFlow 1.0 and 1.3 (version bitmap)"
+    bitmap = sum( 1 << v for v in versions )
+    return message( max( versions ), HELLO,
+                    struct.pack( '!HHI', 1, 8, bitmap ) )
+
+def outputs( version, ports ):
+    "Return output actions for ports"
+    if version == OFP10:
+        return ''.join( struct.pack( '!HHHH', 0, 8, port, 0xffff )
+                        for port in ports )
+    return ''.join( struct.pack( '!HHIH6x', 0, 16, port, 0xffff )
+                    for port in ports )
+
+def match10( inPort=None, dlDst=None ):
+    "Return OpenFlow 1.0 ofp_match"
+    wildcards = ( 1 << 22 ) - 1
+    if inPort is not None:
+        wildcards &= ~1
+    if dlDst is not None:
+        wildcards &= ~( 1 << 3 )
+    return struct.pack( '!IH6s6sHBxHBBxxIIHH', wildcards, inPort or 0,
+                        '\0' * 6, dlDst or '\0' * 6,
+                        0, 0, 0, 0, 0, 0, 0, 0, 0 )
+
+def match13( inPort=None, dlDst=None ):
+    "Return OpenFlow 1.3 OXM ofp_match, padded to 8 bytes"
+    oxms = ''
+    if inPort is not None:
+        oxms += struct.pack( '!II', 0x80000000 | ( 0 << 9 ) | 4, inPort )
+    if dlDst is not None:
+        oxms += struct.pack( '!I', 0x80000000 | ( 3 << 9 ) | 6 ) + dlDst
+    length = 4 + len( oxms )
+    return ( struct.pack( '!HH', 1, length ) + oxms +
+             '\0' * ( ( length + 7 ) // 8 * 8 - length ) )
+
+def flowMod( version, ports, inPort=None, dlDst=None, priority=100,
+             idleTimeout=0, bufferId=NO_BUFFER ):
+    "Return FLOW_MOD (add) sending matching packets to ports"
+    actions = outputs( version, ports )
+    if version == OFP10:
+        body = ( match10( inPort, dlDst ) +
+                 struct.pack( '!QHHHHIHH', 0, 0, idleTimeout, 0, priority,
+                              bufferId, ANY[ version ], 0 ) + actions )
+    else:
+        body = ( struct.pack( '!QQBBHHHIIIH2x', 0, 0, 0, 0, idleTimeout, 0,
+                              priority, bufferId, ANY[ version ],
+                              0xffffffff, 0 ) +
+                 match13( inPort, dlDst ) +
+                 struct.pack( '!HH4x', 4, 8 + len( actions ) ) + actions )
+    return message( version, FLOW_MOD, body )
+
+def packetOut( version, bufferId, inPort, ports, data ):
+    "Return PACKET_OUT for a packet-in"
+    actions = outputs( version, ports )
+    data = data if bufferId == NO_BUFFER else ''
+    if version == OFP10:
+        body = struct.pack( '!IHH', bufferId, inPort, len( actions ) )
+    else:
+        body = struct.pack( '!IIH6x', bufferId, inPort, len( actions ) )
+    return message( version, PACKET_OUT, body + actions + data )
+
+
+# Message decoding
+
+def helloVersion( version, body ):
+    "Return version to use given a peer's HELLO, or None"
+    offset = 0
+    while offset + 4 <= len( body ):
+        elemType, length = struct.unpack_from( '!HH', body, offset )
+        if length < 4:
+            break
+        if elemType == 1:
+            bitmaps = body[ offset + 4: offset + length ]
+            common = [ v for v in versions
+                       if 4 * ( v // 32 ) + 4 <= len( bitmaps ) and
+                       struct.unpack_from( '!I', bitmaps, 4 * ( v // 32 ) )[
+                           0 ] & ( 1 << ( v % 32 ) ) ]
+            return max( common ) if common else None
+        offset += ( length + 7 ) // 8 * 8
+    version = min( version, max( versions ) )
+    return version if version in versions else None
+
+def parsePacketIn( version, body ):
+    "Return ( buffer id, in port, packet data ) for PACKET_IN body"
+    if version == OFP10:
+        bufferId, _total, inPort, _reason = struct.unpack_from(
+            '!IHHB', body )
+        return bufferId, inPort, body[ 10: ]
+    bufferId = struct.unpack_from( '!I', body )[ 0 ]
+    _matchType, length = struct.unpack_from( '!HH', body, 16 )
+    inPort, offset = None, 20
+    while offset + 4 <= 16 + length:
+        oxm, = struct.unpack_from( '!I', body, offset )
+        if oxm >> 16 == 0x8000 and ( oxm >> 9 ) & 0x7f == 0:
+            inPort, = struct.unpack_from( '!I', body, offset + 4 )
+        offset += 4 + ( oxm & 0xff )
+    data = body[ 16 + ( length + 7 ) // 8 * 8 + 2: ]
+    return bufferId, inPort, data
+
+
+class Connection( object ):
+    "OpenFlow connection to one switch"
+
+    def __init__( self, sock, queueLimit ):
+        self.sock = sock
+        self.inbuf = ''
+        self.outbuf = []
+        self.version = None
+        self.dpid = None
+        self.macs = {}  # learned MAC -> port
+        self.packetIns = deque( maxlen=queueLimit )
+        self.dropped = 0
+
+    def send( self, msg ):
+        "Queue message for the next flush()"
+        self.outbuf.append( msg )
+
+    def flush( self ):
+        """Write as much queued output as possible
+           returns: True if output remains"""
+        if not self.outbuf:
+            return False
+        data = ''.join( self.outbuf )
+        try:
+            sent = self.sock.send( data )
+        except socket.error as e:
+            if e.errno not in ( errno.EAGAIN, errno.EWOULDBLOCK ):
+                raise
+            sent = 0
+        self.outbuf = [ data[ sent: ] ] if sent < len( data ) else []
+        return bool( self.outbuf )
+
+    def messages( self ):
+        "Return complete messages from input buffer"
+        msgs = []
+        while len( self.inbuf ) >= header.size:
+            version, msgType, length, xid = header.unpack_from( self.inbuf )
+            if length < header.size:
+                raise ValueError( 'bad OpenFlow message length' )
+            if len( self.inbuf ) < length:
+                break
+            msgs.append( ( version, msgType, xid,
+                           self.inbuf[ header.size: length ] ) )
+            self.inbuf = self.inbuf[ length: ]
+        return msgs
+
+
+class OFController( object ):
+    "Event-driven OpenFlow controller"
+
+    def __init__( self, port=6653, mode='learning', routes=None,
+                  idleTimeout=60, queueLimit=1000, batch=100,
+                  address='0.0.0.0' ):
+        """port: TCP port to listen on
+           mode: 'learning' or 'proactive'
+           routes: { dpid: { 'routes': [ ( MAC, port ) ],
+                             'flood': [ port ] } } (proactive mode)
+           idleTimeout: idle timeout for learned flows
+           queueLimit: maximum unhandled packet-ins per switch
+           batch: packet-ins to handle per switch per iteration"""
+        self.mode = mode
+        self.routes = routes or {}
+        self.idleTimeout = idleTimeout
+        self.queueLimit = queueLimit
+        self.batch = batch
+        self.listener = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+        self.listener.setsockopt( socket.SOL_SOCKET, socket.SO_REUSEADDR, 1 )
+        self.listener.bind( ( address, port ) )
+        self.listener.listen( 1024 )
+        self.listener.setblocking( False )
+        self.port = self.listener.getsockname()[ 1 ]
+        self.conns = {}  # fd -> Connection
+        self.stats = dict( switches=0, packetIns=0, flowMods=0,
+                           packetOuts=0, dropped=0 )
+        self.poller = select.epoll()
+        self.poller.register( self.listener.fileno(), select.EPOLLIN )
+        self.running = False
+
+    def accept( self ):
+        "Accept new connections"
+        while True:
+            try:
+                sock, _addr = self.listener.accept()
+            except socket.error as e:
+                if e.errno in ( errno.EAGAIN, errno.EWOULDBLOCK ):
+                    return
+                raise
+            sock.setblocking( False )
+            sock.setsockopt( socket.IPPROTO_TCP, socket.TCP_NODELAY, 1 )
+            conn = Connection( sock, self.queueLimit )
+            self.conns[ sock.fileno() ] = conn
+            self.poller.register( sock.fileno(), select.EPOLLIN )
+            conn.send( hello() )
+
+    def close( self, conn ):
+        "Close connection"
+        fd = conn.sock.fileno()
+        self.poller.unregister( fd )
+        conn.sock.close()
+        del self.conns[ fd ]
+        if conn.dpid is not None:
+            self.stats[ 'switches' ] -= 1
+
+    def read( self, conn ):
+        "Read and dispatch messages from conn"
+        try:
+            data = conn.sock.recv( 65536 )
+        except socket.error as e:
+            if e.errno in ( errno.EAGAIN, errno.EWOULDBLOCK ):
+                return
+            data = ''
+        if not data:
+            self.close( conn )
+            return
+        conn.inbuf += data
+        for version, msgType, xid, body in conn.messages():
+            self.dispatch( conn, version, msgType, xid, body )
+
+    def dispatch( self, conn, version, msgType, xid, body ):
+        "Handle one message"
+        if msgType == HELLO:
+            conn.version = helloVersion( version, body )
+            if conn.version is None:
+                sys.stderr.write( 'No common OpenFlow version\n' )
+                conn.send( message( version, ERROR,
+                                    struct.pack( '!HH', 0, 0 ), xid ) )
+                return
+            conn.send( message( conn.version, FEATURES_REQUEST ) )
+        elif msgType == ECHO_REQUEST:
+            conn.send( message( version, ECHO_REPLY, body, xid ) )
+        elif msgType == FEATURES_REPLY:
+            conn.dpid = struct.unpack_from( '!Q', body )[ 0 ]
+            self.stats[ 'switches' ] += 1
+            self.connected( conn )
+        elif msgType == PACKET_IN and conn.version:
+            if len( conn.packetIns ) == conn.packetIns.maxlen:
+                conn.dropped += 1
+                self.stats[ 'dropped' ] += 1
+            conn.packetIns.append( parsePacketIn( conn.version, body ) )
+            self.stats[ 'packetIns' ] += 1
+        elif msgType == ERROR:
+            errType, code = struct.unpack_from( '!HH', body )
+            sys.stderr.write( 'OpenFlow error from %s: type %d code %d\n'
+                              % ( conn.dpid, errType, code ) )
+
+    def addFlow( self, conn, ports, **kwargs ):
+        "Queue FLOW_MOD for conn"
+        conn.send( flowMod( conn.version, ports, **kwargs ) )
+        self.stats[ 'flowMods' ] += 1
+
+    def connected( self, conn ):
+        "Configure a newly connected switch"
+        version = conn.version
+        if version == OFP13:
+            # OpenFlow 1.3 drops packets which miss by default
+            self.addFlow( conn, [ CONTROLLER[ version ] ], priority=0 )
+        if self.mode != 'proactive':
+            return
+        routes = self.routes.get( conn.dpid, {} )
+        for mac, port in routes.get( 'routes', () ):
+            self.addFlow( conn, [ port ], dlDst=macBytes( mac ) )
+        flood = routes.get( 'flood', () )
+        for port in flood:
+            self.addFlow( conn, flood, inPort=port, dlDst=BROADCAST,
+                          priority=50 )
+
+    def packetIn( self, conn, bufferId, inPort, data ):
+        "Handle a packet-in"
+        if len( data ) < 12:
+            return
+        dst, src = data[ 0:6 ], data[ 6:12 ]
+        version = conn.version
+        if self.mode == 'proactive':
+            # Packets which missed are flooded along the spanning tree
+            flood = self.routes.get( conn.dpid, {} ).get( 'flood', () )
+            if inPort in flood:
+                ports = [ p for p in flood if p != inPort ]
+                conn.send( packetOut( version, bufferId, inPort, ports,
+                                      data ) )
+                self.stats[ 'packetOuts' ] += 1
+            return
+        if not ord( src[ 0 ] ) & 1:
+            conn.macs[ src ] = inPort
+        port = conn.macs.get( dst ) if not ord( dst[ 0 ] ) & 1 else None
+        if port == inPort:
+            return
+        if port is None:
+            ports = [ FLOOD[ version ] ]
+        else:
+            ports = [ port ]
+            self.addFlow( conn, ports, dlDst=dst,
+                          idleTimeout=self.idleTimeout )
+        conn.send( packetOut( version, bufferId, inPort, ports, data ) )
+        self.stats[ 'packetOuts' ] += 1
+
+    def step( self, timeout=0.1 ):
+        "Run one iteration of the event loop"
+        busy = any( conn.packetIns for conn in self.conns.itervalues() )
+        for fd, event in self.poller.poll( 0 if busy else timeout ):
+            if fd == self.listener.fileno():
+                self.accept()
+                continue
+            conn = self.conns.get( fd )
+            if conn is None:
+                continue
+            if event & ( select.EPOLLERR | select.EPOLLHUP ):
+                self.close( conn )
+                continue
+            if event & select.EPOLLIN:
+                try:
+                    self.read( conn )
+                except ( ValueError, struct.error ) as e:
+                    sys.stderr.write( 'Closing connection: %s\n' % e )
+                    self.close( conn )
+        for conn in list( self.conns.itervalues() ):
+            for _ in range( min( self.batch, len( conn.packetIns ) ) ):
+                self.packetIn( conn, *conn.packetIns.popleft() )
+            try:
+                pending = conn.flush()
+            except socket.error:
+                self.close( conn )
+                continue
+            self.poller.modify( conn.sock.fileno(), select.EPOLLIN |
+                                ( select.EPOLLOUT if pending else 0 ) )
+
+    def serve( self ):
+        "Run until stop() is called"
+        self.running = True
+        while self.running:
+            self.step()
+
+    def stop( self ):
+        "Stop serve() and close all connections"
+        self.running = False
+        for conn in list( self.conns.values() ):
+            self.close( conn )
+        self.poller.close()
+        self.listener.close()
+
+
+def loadRoutes( filename ):
+    "Load routes file written by PyController.setRoutes()"
+    with open( filename ) as f:
+        routes = json.load( f )
+    return { int( dpid ): r for dpid, r in routes.iteritems() }
+
+def main():
+    "Run controller from the command line"
+    parser = OptionParser( usage='%prog [options]' )
+    parser.add_option( '--port', type='int', default=6653,
+                       help='TCP port to listen on (6653)' )
+    parser.add_option( '--mode', type='choice', default='learning',
+                       choices=[ 'learning', 'proactive' ],
+                       help='learning|proactive' )
+    parser.add_option( '--routes', default=None,
+                       help='routes file for proactive mode' )
+    parser.add_option( '--idle-timeout', type='int', default=60,
+                       dest='idleTimeout',
+                       help='idle timeout for learned flows' )
+    parser.add_option( '--queue', type='int', default=1000,
+                       help='maximum queued packet-ins per switch' )
+    opts, _args = parser.parse_args()
+    routes = loadRoutes( opts.routes ) if opts.routes else None
+    controller = OFController( port=opts.port, mode=opts.mode,
+                               routes=routes,
+                               idleTimeout=opts.idleTimeout,
+                               queueLimit=opts.queue )
+    try:
+        controller.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sys.stderr.write( 'Controller stats: %s\n' % controller.stats )
+
+
+if __name__ == '__main__':
+    main()
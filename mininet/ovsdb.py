@@ -0,0 +1,361 @@
+"""
+Minimal OVSDB (RFC 7047) JSON-RPC client for Mininet
+
+OVSSwitch normally talks to ovsdb-server by running ovs-vsctl.
+This module talks to ovsdb-server directly over its unix socket,
+so that many bridges, ports, interfaces and controllers can be
+created or deleted in a single transaction of any size, and so
+that table changes (e.g. Controller.is_connected) can be monitored
+without polling:
+
+    db = OVSDB()
+    db.transact( db.addBridgeOps( 's1', ports=[ ( 's1-eth1', {} ) ] ),
+                 wait=True )
+    db.monitor( 'Controller', [ 'is_connected' ] )
+    for table, uuid, row in db.updates( timeout=1 ): ...
+    db.delBridges( [ 's1' ] )
+
+OVSDB values use the RFC 7047 JSON notation; the helpers ovsSet(),
+ovsMap(), namedUUID() and rowUUID() build the common cases.
+"""
+
+import json
+import os
+import re
+import socket
+from select import select
+from time import time
+
+from mininet.log import debug
+
+
+def ovsSet( items ):
+    "Return OVSDB set containing items"
+    return [ 'set', list( items ) ]
+
+def ovsMap( pairs ):
+    "Return OVSDB map from dict (or list of pairs)"
+    if isinstance( pairs, dict ):
+        pairs = sorted( pairs.items() )
+    return [ 'map', [ [ k, v ] for k, v in pairs ] ]
+
+def namedUUID( name ):
+    """Return reference to a row inserted in the same transaction,
+       with uuid-name derived from name (e.g. an interface name)"""
+    return [ 'named-uuid', uuidName( name ) ]
+
+def rowUUID( uuid ):
+    "Return reference to an existing row"
+    return [ 'uuid', uuid ]
+
+def uuidName( name ):
+    "Return valid (and unique) OVSDB uuid-name for name"
+    # uuid-names must match [_a-zA-Z][_a-zA-Z0-9]*
+    return 'row_' + re.sub( r'[^a-zA-Z0-9]',
+                            lambda m: '_%02x' % ord( m.group() ), name )
+
+def setItems( value ):
+    "Return items of an OVSDB set value (or single atom)"
+    if isinstance( value, list ) and value and value[ 0 ] == 'set':
+        return value[ 1 ]
+    return [ value ]
+
+
+class OVSDBError( Exception ):
+    "Error returned by ovsdb-server"
+    pass
+
+
+class OVSDB( object ):
+    "OVSDB JSON-RPC client connection"
+
+    # Default ovsdb-server socket
+    rundir = os.environ.get( 'OVS_RUNDIR', '/var/run/openvswitch' )
+    defaultPath = os.path.join( rundir, 'db.sock' )
+
+    def __init__( self, path=None, db='Open_vSwitch', timeout=10 ):
+        """path: unix socket path (OVS_RUNDIR/db.sock)
+           db: database name (Open_vSwitch)
+           timeout: seconds to wait for replies (10; None=forever)"""
+        self.path = path or self.defaultPath
+        self.db = db
+        self.timeout = timeout
+        self.sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+        self.sock.connect( self.path )
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.nextId = 0
+        self.pending = []  # update notifications not yet returned
+        self.monitors = 0
+        self.monitorId = None  # most recent monitor
+
+    def close( self ):
+        "Close connection"
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    # JSON-RPC messages
+
+    def send( self, msg ):
+        "Send JSON-RPC message"
+        self.sock.sendall( json.dumps( msg, separators=( ',', ':' ) ) )
+
+    def recv( self, timeout=None ):
+        """Receive one JSON-RPC message
+           timeout: seconds to wait (None: forever)
+           returns: message, or None on timeout"""
+        end = None if timeout is None else time() + timeout
+        while True:
+            self.buf = self.buf.lstrip()
+            if self.buf:
+                try:
+                    msg, index = self.decoder.raw_decode( self.buf )
+                    self.buf = self.buf[ index: ]
+                    return msg
+                except ValueError:
+                    # Incomplete message
+                    pass
+            wait = None if end is None else max( end - time(), 0 )
+            readable, _w, _x = select( [ self.sock ], [], [], wait )
+            if not readable:
+                return None
+            data = self.sock.recv( 65536 )
+            if not data:
+                raise OVSDBError( 'connection to %s closed' % self.path )
+            self.buf += data
+
+    def handle( self, msg ):
+        """Handle request or notification from server
+           returns: True if msg was handled"""
+        method = msg.get( 'method' )
+        if method == 'echo':
+            # Keepalive: reply with the same params
+            self.send( { 'id': msg[ 'id' ], 'result': msg[ 'params' ],
+                         'error': None } )
+        elif method == 'update':
+            self.pending.append( msg[ 'params' ] )
+        else:
+            return False
+        return True
+
+    def call( self, method, *params ):
+        """Make JSON-RPC call and wait for its result
+           raises OVSDBError on error or timeout"""
+        msgId = self.nextId
+        self.nextId += 1
+        self.send( { 'method': method, 'params': list( params ),
+                     'id': msgId } )
+        end = None if self.timeout is None else time() + self.timeout
+        while True:
+            wait = None if end is None else max( end - time(), 0 )
+            msg = self.recv( wait )
+            if msg is None:
+                raise OVSDBError( '%s: timed out waiting for %s' %
+                                  ( self.path, method ) )
+            if self.handle( msg ):
+                continue
+            if msg.get( 'id' ) != msgId:
+                debug( 'ovsdb: ignoring %s\n' % msg )
+                continue
+            if msg.get( 'error' ):
+                raise OVSDBError( '%s: %s' % ( method, msg[ 'error' ] ) )
+            return msg[ 'result' ]
+
+    # Transactions
+
+    def transact( self, ops, wait=False ):
+        """Run ops as a single transaction
+           ops: list of OVSDB operations
+           wait: wait until ovs-vswitchd has applied the changes
+                 (like ovs-vsctl without --no-wait)
+           returns: list of operation results
+           raises OVSDBError if any operation fails"""
+        ops = list( ops )
+        if wait:
+            ops += [ { 'op': 'mutate', 'table': 'Open_vSwitch',
+                       'where': [],
+                       'mutations': [ [ 'next_cfg', '+=', 1 ] ] },
+                     { 'op': 'select', 'table': 'Open_vSwitch',
+                       'where': [], 'columns': [ 'next_cfg' ] } ]
+        results = self.call( 'transact', self.db, *ops )
+        for op, result in zip( ops + [ None ] * len( results ), results ):
+            if result and 'error' in result:
+                raise OVSDBError( 'transaction failed: %s: %s (%s)' % (
+                    result[ 'error' ], result.get( 'details', '' ),
+                    op and op.get( 'op' ) ) )
+        if wait:
+            rows = results[ len( ops ) - 1 ][ 'rows' ]
+            if rows:
+                self.waitConfig( rows[ 0 ][ 'next_cfg' ] )
+            results = results[ : len( ops ) - 2 ]
+        return results
+
+    def waitConfig( self, cfg ):
+        "Wait for Open_vSwitch.cur_cfg to reach cfg"
+        end = None if self.timeout is None else time() + self.timeout
+        monitor = self.monitor( 'Open_vSwitch', [ 'cur_cfg' ] )
+        try:
+            current = [ row.get( 'cur_cfg', 0 )
+                        for _uuid, row in monitor.iteritems() ]
+            while not current or max( current ) < cfg:
+                wait = None if end is None else end - time()
+                if wait is not None and wait <= 0:
+                    raise OVSDBError( 'timed out waiting for '
+                                      'ovs-vswitchd to reconfigure' )
+                current = [ row.get( 'cur_cfg', 0 ) for table, _uuid, row
+                            in self.updates( timeout=wait )
+                            if table == 'Open_vSwitch' and row ]
+        finally:
+            self.cancel()
+
+    def select( self, table, where=None, columns=None ):
+        """Select rows from table
+           where: list of conditions, e.g. [ [ 'name', '==', 's1' ] ]
+           columns: columns to return (all)
+           returns: list of rows"""
+        op = { 'op': 'select', 'table': table, 'where': where or [] }
+        if columns:
+            op[ 'columns' ] = columns
+        return self.transact( [ op ] )[ 0 ][ 'rows' ]
+
+    # Monitoring
+
+    def monitor( self, table, columns=None ):
+        """Monitor table for changes (see updates())
+           columns: columns to monitor (all)
+           returns: dict of current rows { uuid: row }"""
+        return self.monitorTables( { table: columns } )[ table ]
+
+    def monitorTables( self, tables ):
+        """Monitor several tables with one monitor (see updates())
+           tables: dict of table name to columns (or None for all)
+           returns: dict of table name to current rows { uuid: row }"""
+        requests = { table: {} if columns is None else
+                     { 'columns': columns }
+                     for table, columns in tables.iteritems() }
+        monitorId = 'mn%d' % self.monitors
+        self.monitors += 1
+        result = self.call( 'monitor', self.db, monitorId, requests )
+        self.monitorId = monitorId
+        return { table: { uuid: change.get( 'new', {} ) for uuid, change
+                          in result.get( table, {} ).iteritems() }
+                 for table in tables }
+
+    def cancel( self ):
+        "Cancel the most recent monitor, dropping its pending updates"
+        monitorId = self.monitorId
+        self.call( 'monitor_cancel', monitorId )
+        self.pending = [ ( mid, update ) for mid, update in self.pending
+                         if mid != monitorId ]
+
+    def updates( self, timeout=None ):
+        """Return changes to monitored tables, waiting for at least
+           one update until timeout
+           returns: list of ( table, uuid, row ); row is None for
+                    deleted rows, and has all monitored columns"""
+        if not self.pending:
+            end = None if timeout is None else time() + timeout
+            while not self.pending:
+                wait = None if end is None else max( end - time(), 0 )
+                msg = self.recv( wait )
+                if msg is None:
+                    break
+                if not self.handle( msg ):
+                    debug( 'ovsdb: ignoring %s\n' % msg )
+        changes = []
+        for _monitorId, update in self.pending:
+            for table, rows in update.iteritems():
+                for uuid, change in rows.iteritems():
+                    changes.append( ( table, uuid, change.get( 'new' ) ) )
+        self.pending = []
+        return changes
+
+    # Bridges and ports
+
+    @staticmethod
+    def addPortOps( bridge, name, interface=None ):
+        """Return ops to create port name with one interface
+           bridge: bridge name, or None if the bridge is being
+                   created in the same transaction
+           interface: dict of Interface columns"""
+        intfRow = dict( interface or {}, name=name )
+        ops = [ { 'op': 'insert', 'table': 'Interface', 'row': intfRow,
+                  'uuid-name': uuidName( 'i' + name ) },
+                { 'op': 'insert', 'table': 'Port',
+                  'row': { 'name': name,
+                           'interfaces': namedUUID( 'i' + name ) },
+                  'uuid-name': uuidName( 'p' + name ) } ]
+        if bridge:
+            ops.append( { 'op': 'mutate', 'table': 'Bridge',
+                          'where': [ [ 'name', '==', bridge ] ],
+                          'mutations': [ [ 'ports', 'insert', ovsSet(
+                              [ namedUUID( 'p' + name ) ] ) ] ] } )
+        return ops
+
+    @classmethod
+    def addBridgeOps( cls, name, ports=(), controllers=(), bridge=None ):
+        """Return ops to create bridge name, like ovs-vsctl add-br
+           ports: list of ( port name, Interface columns )
+           controllers: list of Controller rows (dicts)
+           bridge: dict of additional Bridge columns"""
+        # The bridge's local port is an internal interface
+        ops = cls.addPortOps( None, name, { 'type': 'internal' } )
+        for port, interface in ports:
+            ops += cls.addPortOps( None, port, interface )
+        for i, controller in enumerate( controllers ):
+            ops.append( { 'op': 'insert', 'table': 'Controller',
+                          'row': controller,
+                          'uuid-name': uuidName( 'c%d%s' % ( i, name ) ) } )
+        row = dict( bridge or {}, name=name )
+        row[ 'ports' ] = ovsSet( namedUUID( 'p' + port ) for port in
+                                 [ name ] + [ p for p, _i in ports ] )
+        row[ 'controller' ] = ovsSet( namedUUID( 'c%d%s' % ( i, name ) )
+                                      for i in range( len( controllers ) ) )
+        ops += [ { 'op': 'insert', 'table': 'Bridge', 'row': row,
+                   'uuid-name': uuidName( 'b' + name ) },
+                 { 'op': 'mutate', 'table': 'Open_vSwitch', 'where': [],
+                   'mutations': [ [ 'bridges', 'insert',
+                                    ovsSet( [ namedUUID( 'b' + name ) ] )
+                                    ] ] } ]
+        return ops
+
+    def findUUIDs( self, table, names ):
+        """Look up rows by name, in one transaction
+           returns: dict of name to uuid for existing rows"""
+        names = list( names )
+        results = self.transact(
+            [ { 'op': 'select', 'table': table,
+                'where': [ [ 'name', '==', name ] ],
+                'columns': [ '_uuid' ] } for name in names ] )
+        return { name: result[ 'rows' ][ 0 ][ '_uuid' ][ 1 ]
+                 for name, result in zip( names, results )
+                 if result[ 'rows' ] }
+
+    def delBridgeOps( self, names ):
+        """Return ops to delete existing bridges, like
+           ovs-vsctl --if-exists del-br (needs one lookup)"""
+        uuids = self.findUUIDs( 'Bridge', names ).values()
+        if not uuids:
+            return []
+        # Ports, interfaces and controllers are garbage collected
+        return [ { 'op': 'mutate', 'table': 'Open_vSwitch', 'where': [],
+                   'mutations': [ [ 'bridges', 'delete', ovsSet(
+                       rowUUID( uuid ) for uuid in uuids ) ] ] } ]
+
+    def delBridges( self, names, wait=False ):
+        "Delete bridges (which may not exist)"
+        ops = self.delBridgeOps( names )
+        if ops:
+            self.transact( ops, wait=wait )
+
+    def delPortOps( self, bridge, names ):
+        """Return ops to delete ports from bridge, like
+           ovs-vsctl --if-exists del-port (needs one lookup)"""
+        uuids = self.findUUIDs( 'Port', names ).values()
+        if not uuids:
+            return []
+        return [ { 'op': 'mutate', 'table': 'Bridge',
+                   'where': [ [ 'name', '==', bridge ] ],
+                   'mutations': [ [ 'ports', 'delete', ovsSet(
+                       rowUUID( uuid ) for uuid in uuids ) ] ] } ]
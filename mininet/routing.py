@@ -0,0 +1,182 @@
+"""
+Proactive shortest-path forwarding without a controller
+
+Routes are computed from the network's switch graph (one breadth-first
+search per switch with hosts attached) and installed into every
+OVSSwitch in bulk, before any traffic is sent:
+
+- unicast: one flow per destination MAC address per switch, sending
+  packets towards the destination's switch along a shortest path, or
+  with ecmp=True, to an OpenFlow select group which hashes flows over
+  all equal-cost next hops
+- broadcast and multicast: flooded along a spanning tree (per
+  connected component), so that loops in the topology are safe
+
+This is what Mininet( proactive='shortest' | 'ecmp' ) and
+mn --proactive use; installRoutes( net ) may also be called directly,
+e.g. after changing the topology. controllerRoutes( net ) returns the
+same routes by datapath ID for PyController's proactive mode.
+"""
+
+from collections import deque
+
+from mininet.log import info, warn
+from mininet.node import OVSSwitch
+from mininet.util import natural, parallel
+
+
+def switchGraph( net ):
+    """Return the switch graph of net
+       returns: adjacency { switch: [ ( neighbor, port, neighbor port ) ] },
+                hostPorts { switch: [ ( host MAC, port ) ] }"""
+    switches = set( net.switches )
+    adjacency = { switch: [] for switch in net.switches }
+    hostPorts = { switch: [] for switch in net.switches }
+    for link in net.links:
+        intf1, intf2 = link.intf1, link.intf2
+        for intf, other in ( intf1, intf2 ), ( intf2, intf1 ):
+            node = intf.node
+            if node not in switches:
+                continue
+            port = node.ports[ intf ]
+            if other.node in switches:
+                adjacency[ node ].append(
+                    ( other.node, port, other.node.ports[ other ] ) )
+            elif other.MAC():
+                hostPorts[ node ].append( ( other.MAC(), port ) )
+    for ports in adjacency.itervalues():
+        ports.sort( key=lambda edge: ( natural( edge[ 0 ].name ),
+                                       edge[ 1 ] ) )
+    return adjacency, hostPorts
+
+def distances( adjacency, root ):
+    "Return { switch: hops from root } (breadth-first search)"
+    dist, queue = { root: 0 }, deque( [ root ] )
+    while queue:
+        node = queue.popleft()
+        for neighbor, _port, _peerPort in adjacency[ node ]:
+            if neighbor not in dist:
+                dist[ neighbor ] = dist[ node ] + 1
+                queue.append( neighbor )
+    return dist
+
+def unicastRoutes( adjacency, hostPorts, ecmp=False ):
+    """Compute next hops for every switch and destination MAC
+       ecmp: return all equal-cost next hops (or just the first)
+       returns: { switch: { MAC: ( port, ... ) } }"""
+    routes = { switch: {} for switch in adjacency }
+    for dst, hosts in hostPorts.iteritems():
+        if not hosts:
+            continue
+        dist = distances( adjacency, dst )
+        for mac, port in hosts:
+            routes[ dst ][ mac ] = ( port, )
+        for switch, hops in dist.iteritems():
+            if switch is dst:
+                continue
+            ports = tuple( port for neighbor, port, _peerPort
+                           in adjacency[ switch ]
+                           if dist.get( neighbor ) == hops - 1 )
+            ports = ports if ecmp else ports[ :1 ]
+            for mac, _port in hosts:
+                routes[ switch ][ mac ] = ports
+    return routes
+
+def spanningTree( adjacency ):
+    """Compute a spanning tree for each connected component
+       returns: { switch: set of tree ports }"""
+    treePorts = { switch: set() for switch in adjacency }
+    seen = set()
+    for root in sorted( adjacency, key=lambda s: natural( s.name ) ):
+        if root in seen:
+            continue
+        seen.add( root )
+        queue = deque( [ root ] )
+        while queue:
+            node = queue.popleft()
+            for neighbor, port, peerPort in adjacency[ node ]:
+                if neighbor in seen:
+                    continue
+                seen.add( neighbor )
+                queue.append( neighbor )
+                treePorts[ node ].add( port )
+                treePorts[ neighbor ].add( peerPort )
+    return treePorts
+
+def switchFlows( routes, floodPorts, ecmp=False ):
+    """Return flows and groups for one switch
+       routes: { MAC: ( port, ... ) }
+       floodPorts: ports for broadcast and multicast
+       returns: flows, groups (ovs-ofctl syntax)"""
+    flows, groups, groupIds = [], [], {}
+    for mac, ports in sorted( routes.iteritems() ):
+        if not ports:
+            continue
+        if len( ports ) == 1 or not ecmp:
+            actions = 'output:%d' % ports[ 0 ]
+        else:
+            if ports not in groupIds:
+                groupIds[ ports ] = len( groupIds ) + 1
+                groups.append( 'group_id=%d,type=select,%s' % (
+                    groupIds[ ports ], ','.join(
+                        'bucket=output:%d' % port for port in ports ) ) )
+            actions = 'group:%d' % groupIds[ ports ]
+        flows.append( 'priority=100,dl_dst=%s,actions=%s' % ( mac, actions ) )
+    # OVS doesn't send packets back out of their input port
+    outputs = ','.join( 'output:%d' % port for port in sorted( floodPorts ) )
+    for port in sorted( floodPorts ):
+        flows.append( 'priority=50,in_port=%d,'
+                      'dl_dst=01:00:00:00:00:00/01:00:00:00:00:00,'
+                      'actions=%s' % ( port, outputs ) )
+    return flows, groups
+
+def controllerRoutes( net ):
+    """Compute shortest-path routes for an OpenFlow controller
+       returns: { dpid: { 'routes': [ ( MAC, port ) ],
+                          'flood': [ port ] } }"""
+    adjacency, hostPorts = switchGraph( net )
+    routes = unicastRoutes( adjacency, hostPorts )
+    treePorts = spanningTree( adjacency )
+    result = {}
+    for switch in net.switches:
+        floodPorts = treePorts[ switch ] | set(
+            port for _mac, port in hostPorts[ switch ] )
+        result[ int( switch.dpid, 16 ) ] = {
+            'routes': sorted( ( mac, ports[ 0 ] ) for mac, ports
+                              in routes[ switch ].iteritems() if ports ),
+            'flood': sorted( floodPorts ) }
+    return result
+
+def installRoutes( net, ecmp=False, workers=None ):
+    """Compute routes for net and install them into its OVSSwitches,
+       replacing their existing flows (and groups)
+       ecmp: spread flows over equal-cost paths with select groups
+       workers: maximum number of switches to update at once (all)"""
+    adjacency, hostPorts = switchGraph( net )
+    routes = unicastRoutes( adjacency, hostPorts, ecmp=ecmp )
+    treePorts = spanningTree( adjacency )
+    switches = [ s for s in net.switches if isinstance( s, OVSSwitch ) ]
+    for switch in net.switches:
+        if switch not in switches:
+            warn( '*** installRoutes: skipping %s (not an OVSSwitch)\n'
+                  % switch )
+    info( '*** Installing %s routes on %d switches\n' % (
+        'ECMP' if ecmp else 'shortest-path', len( switches ) ) )
+
+    def install( switch ):
+        "Install flows and groups on one switch"
+        floodPorts = treePorts[ switch ] | set(
+            port for _mac, port in hostPorts[ switch ] )
+        flows, groups = switchFlows( routes[ switch ], floodPorts,
+                                     ecmp=ecmp )
+        switch.delFlows()
+        if ecmp:
+            switch.delGroups()
+            if groups:
+                switch.addGroups( groups )
+        switch.addFlows( flows )
+        return len( flows )
+
+    count = sum( parallel( install, switches, workers ) )
+    info( '*** Installed %d flows\n' % count )
+    return count
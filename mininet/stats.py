@@ -0,0 +1,343 @@
+"""
+Flow, port and table statistics for many switches
+
+StatsCollector fetches OpenFlow statistics from all of its switches
+concurrently (one ovs-ofctl call per switch and kind of statistics,
+run as separate processes so that switch shells stay free), parses
+them into records and keeps the last two samples so that it can
+report counter deltas and rates:
+
+    stats = StatsCollector( net.switches, interval=1 )
+    stats.start()
+    ...
+    for ( switch, port ), rates in stats.portRates().iteritems(): ...
+    keys, array = stats.portArray( rates=True )
+    stats.stop()
+
+Switches must provide ofctlArgs() (OVSSwitch and IVSSwitch do).
+If NumPy is installed, portArray() and flowArray() return NumPy
+arrays; otherwise they return lists of rows.
+"""
+
+import re
+import threading
+from subprocess import Popen, PIPE
+from time import time
+
+from mininet.log import debug, warn
+from mininet.util import parallel
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Parsers for ovs-ofctl output
+
+# Flow fields which are statistics or flow_mod settings, not match
+flowStatFields = ( 'cookie', 'duration', 'table', 'n_packets', 'n_bytes',
+                   'idle_timeout', 'hard_timeout', 'idle_age', 'hard_age',
+                   'importance', 'send_flow_rem', 'reset_counts',
+                   'no_packet_counts', 'no_byte_counts', 'check_overlap' )
+
+def statValue( value ):
+    """Convert ovs-ofctl statistic to a number
+       returns: int, float or None for unavailable ('?') values"""
+    value = value.rstrip( 's' )
+    if value.startswith( '0x' ):
+        return int( value, 16 )
+    try:
+        return int( value )
+    except ValueError:
+        try:
+            return float( value )
+        except ValueError:
+            return None
+
+def parseFlows( text ):
+    """Parse ovs-ofctl dump-flows output
+       returns: list of flow records (dicts) with table, match,
+                actions, n_packets, n_bytes, duration, cookie..."""
+    flows = []
+    for line in text.splitlines():
+        if 'n_packets=' not in line or ' actions=' not in line:
+            continue
+        fields, actions = line.strip().split( ' actions=', 1 )
+        flow, match = { 'actions': actions }, []
+        for field in fields.replace( ', ', ',' ).split( ',' ):
+            key, _, value = field.partition( '=' )
+            if key in flowStatFields:
+                flow[ key ] = statValue( value )
+            elif field:
+                match.append( field )
+        flow[ 'match' ] = ','.join( match )
+        flow.setdefault( 'table', 0 )
+        flows.append( flow )
+    return flows
+
+_portRegex = re.compile( r'port\s+"?([^":\s]+)"?:' )
+_counterRegex = re.compile( r'(\w+)=(\S+?),?(?=\s|$)' )
+
+# ovs-ofctl port counter names
+portCounterNames = { 'pkts': 'packets', 'bytes': 'bytes', 'drop': 'dropped',
+                     'errs': 'errors', 'frame': 'frame_err',
+                     'over': 'over_err', 'crc': 'crc_err',
+                     'coll': 'collisions' }
+
+def parsePorts( text ):
+    """Parse ovs-ofctl dump-ports output
+       returns: { port: record } where port is a number, name or
+                'LOCAL' and record has rx_packets, tx_bytes, etc."""
+    ports, record, direction = {}, None, None
+    for line in text.splitlines():
+        m = _portRegex.search( line )
+        if m:
+            port = m.group( 1 )
+            port = int( port ) if port.isdigit() else port
+            record = ports.setdefault( port, {} )
+            line = line[ m.end(): ]
+        if record is None:
+            continue
+        for word in line.split():
+            if word in ( 'rx', 'tx' ):
+                direction = word
+        for key, value in _counterRegex.findall( line ):
+            if key == 'duration':
+                record[ key ] = statValue( value )
+            elif key in portCounterNames and direction:
+                name = '%s_%s' % ( direction, portCounterNames[ key ] )
+                record[ name ] = statValue( value )
+    return ports
+
+_tableRegex = re.compile( r'^\s*(?:table\s+)?(\d+):' )
+
+def parseTables( text ):
+    """Parse ovs-ofctl dump-tables output
+       returns: { table: record } with active, lookup and matched"""
+    tables, record = {}, None
+    for line in text.splitlines():
+        m = _tableRegex.match( line )
+        if m:
+            record = tables.setdefault( int( m.group( 1 ) ), {} )
+        elif 'ditto' in line or 'tables' in line.split( ':' )[ 0 ]:
+            record = None
+        if record is None:
+            continue
+        for key, value in _counterRegex.findall( line ):
+            if key in ( 'active', 'lookup', 'matched', 'max' ):
+                record[ key ] = statValue( value )
+    return tables
+
+
+class Sample( object ):
+    """Statistics for a set of switches at one point in time
+       times: { switch name: time fetched }
+       flows: { switch name: [ flow record ] }
+       ports: { switch name: { port: record } }
+       tables: { switch name: { table: record } }"""
+
+    def __init__( self ):
+        self.times, self.flows, self.ports, self.tables = {}, {}, {}, {}
+
+    def flowsByKey( self, name ):
+        "Return { ( table, match ): flow record } for switch name"
+        return { ( flow[ 'table' ], flow[ 'match' ] ): flow
+                 for flow in self.flows.get( name, () ) }
+
+
+class StatsCollector( object ):
+    "Collect OpenFlow statistics from many switches in parallel"
+
+    kinds = { 'flows': ( 'dump-flows', parseFlows ),
+              'ports': ( 'dump-ports', parsePorts ),
+              'tables': ( 'dump-tables', parseTables ) }
+
+    def __init__( self, switches, interval=1.0, flows=True, ports=True,
+                  tables=False, workers=32 ):
+        """switches: switches to collect from
+           interval: seconds between samples for start()
+           flows, ports, tables: kinds of statistics to collect
+           workers: maximum number of concurrent ovs-ofctl calls"""
+        self.switches = [ s for s in switches if hasattr( s, 'ofctlArgs' ) ]
+        for switch in switches:
+            if switch not in self.switches:
+                warn( '*** %s does not support ovs-ofctl statistics\n'
+                      % switch )
+        self.interval = interval
+        self.wanted = [ kind for kind, on in ( ( 'flows', flows ),
+                                               ( 'ports', ports ),
+                                               ( 'tables', tables ) )
+                        if on ]
+        self.workers = workers
+        self.previous, self.current = None, None
+        self.thread, self.stopped = None, threading.Event()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def fetch( switch, args ):
+        """Run ovs-ofctl for switch without using its shell
+           returns: output"""
+        if switch.inNamespace or getattr( switch, 'isRemote', False ):
+            out, err, code = switch.pexec( args )
+        else:
+            popen = Popen( args, stdout=PIPE, stderr=PIPE )
+            out, err = popen.communicate()
+            code = popen.returncode
+        if code:
+            debug( '*** %s: %s' % ( ' '.join( args ), err ) )
+        return out
+
+    def fetchSwitch( self, item ):
+        "Fetch and parse one kind of statistics for one switch"
+        switch, kind = item
+        command, parse = self.kinds[ kind ]
+        return time(), parse( self.fetch( switch,
+                                          switch.ofctlArgs( command ) ) )
+
+    def poll( self ):
+        """Fetch a new sample from all switches
+           returns: Sample"""
+        items = [ ( switch, kind ) for switch in self.switches
+                  for kind in self.wanted ]
+        results = parallel( self.fetchSwitch, items, self.workers )
+        sample = Sample()
+        for ( switch, kind ), ( when, stats ) in zip( items, results ):
+            getattr( sample, kind )[ switch.name ] = stats
+            sample.times[ switch.name ] = max(
+                when, sample.times.get( switch.name, 0 ) )
+        with self.lock:
+            self.previous, self.current = self.current, sample
+        return sample
+
+    def run( self ):
+        "Poll every interval until stop() is called"
+        start = time()
+        while not self.stopped.is_set():
+            self.poll()
+            # Stay on schedule, skipping samples if we fall behind
+            start += self.interval * max(
+                1, int( ( time() - start ) / self.interval ) )
+            self.stopped.wait( max( start - time(), 0 ) )
+
+    def start( self ):
+        "Start polling in a background thread"
+        self.stopped.clear()
+        self.thread = threading.Thread( target=self.run )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop( self ):
+        "Stop polling"
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    # Deltas and rates
+
+    def samples( self ):
+        "Return previous and current samples (or raise if too few)"
+        with self.lock:
+            previous, current = self.previous, self.current
+        if previous is None:
+            raise Exception( 'StatsCollector needs two samples; '
+                             'call poll() twice or start()' )
+        return previous, current
+
+    @staticmethod
+    def diff( old, new, scale=1.0 ):
+        "Return scaled differences of numeric counters in two records"
+        return { key: ( value - old[ key ] ) * scale
+                 for key, value in new.iteritems()
+                 if isinstance( value, ( int, long, float ) ) and
+                 isinstance( old.get( key ), ( int, long, float ) ) }
+
+    def portDeltas( self, rates=False ):
+        """Return per-port counter changes between the last two samples
+           rates: divide by elapsed time to get rates per second
+           returns: { ( switch name, port ): { counter: delta } }"""
+        previous, current = self.samples()
+        result = {}
+        for name, ports in current.ports.iteritems():
+            oldPorts = previous.ports.get( name, {} )
+            elapsed = current.times[ name ] - previous.times.get( name, 0 )
+            scale = 1.0 / elapsed if rates and elapsed > 0 else 1.0
+            for port, record in ports.iteritems():
+                if port in oldPorts:
+                    result[ name, port ] = self.diff( oldPorts[ port ],
+                                                      record, scale )
+        return result
+
+    def portRates( self ):
+        "Return per-port counter rates per second (see portDeltas())"
+        return self.portDeltas( rates=True )
+
+    def flowDeltas( self, rates=False ):
+        """Return per-flow counter changes between the last two samples
+           rates: divide by elapsed time to get rates per second
+           returns: { ( switch name, table, match ):
+                      { 'n_packets': delta, 'n_bytes': delta } }"""
+        previous, current = self.samples()
+        result = {}
+        for name in current.flows:
+            oldFlows = previous.flowsByKey( name )
+            elapsed = current.times[ name ] - previous.times.get( name, 0 )
+            scale = 1.0 / elapsed if rates and elapsed > 0 else 1.0
+            for key, flow in current.flowsByKey( name ).iteritems():
+                old = oldFlows.get( key )
+                if old is None:
+                    continue
+                result[ ( name, ) + key ] = self.diff(
+                    { k: old.get( k ) for k in ( 'n_packets', 'n_bytes' ) },
+                    { k: flow.get( k ) for k in ( 'n_packets', 'n_bytes' ) },
+                    scale )
+        return result
+
+    def flowRates( self ):
+        "Return per-flow counter rates per second (see flowDeltas())"
+        return self.flowDeltas( rates=True )
+
+    # Array output
+
+    @staticmethod
+    def array( records, counters ):
+        """Return ( keys, rows ) for { key: record }, with one column
+           per counter; rows is a NumPy array if NumPy is available"""
+        keys = sorted( records )
+        rows = [ [ records[ key ].get( counter ) or 0
+                   for counter in counters ] for key in keys ]
+        if numpy is not None:
+            rows = numpy.array( rows, dtype=float ).reshape(
+                len( keys ), len( counters ) )
+        return keys, rows
+
+    def portArray( self, counters=( 'rx_packets', 'rx_bytes', 'tx_packets',
+                                    'tx_bytes' ), rates=False,
+                   deltas=False ):
+        """Return port counters (or their rates or deltas) as an array
+           counters: counters to use as columns
+           returns: ( [ ( switch name, port ) ], rows )"""
+        if rates or deltas:
+            records = self.portDeltas( rates=rates )
+        else:
+            current = self.current or self.poll()
+            records = { ( name, port ): record
+                        for name, ports in current.ports.iteritems()
+                        for port, record in ports.iteritems() }
+        return self.array( records, counters )
+
+    def flowArray( self, counters=( 'n_packets', 'n_bytes' ), rates=False,
+                   deltas=False ):
+        """Return flow counters (or their rates or deltas) as an array
+           counters: counters to use as columns
+           returns: ( [ ( switch name, table, match ) ], rows )"""
+        if rates or deltas:
+            records = self.flowDeltas( rates=rates )
+        else:
+            current = self.current or self.poll()
+            records = { ( name, ) + key: flow
+                        for name in current.flows
+                        for key, flow in
+                        current.flowsByKey( name ).iteritems() }
+        return self.array( records, counters )
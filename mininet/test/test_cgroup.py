@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Tests for the cgroup filesystem backend, using a stand-in
+   cgroup directory tree (no root required)."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mininet.cgroup import ( makeCgroup, CgroupV1, CgroupV2, CpuSampler,
+                             readFile, sizeBytes )
+from mininet.log import setLogLevel
+
+
+class testCgroup( unittest.TestCase ):
+    "Test cgroup v1 and v2 parameter files"
+
+    def setUp( self ):
+        self.root = tempfile.mkdtemp( prefix='mn-cgroup-' )
+        CgroupV2.enabled = set()
+
+    def tearDown( self ):
+        shutil.rmtree( self.root )
+
+    def testV1( self ):
+        "Co-mounted controllers share one directory"
+        os.mkdir( os.path.join( self.root, 'cpu,cpuacct' ) )
+        os.mkdir( os.path.join( self.root, 'cpuset' ) )
+        for link in 'cpu', 'cpuacct':
+            os.symlink( 'cpu,cpuacct', os.path.join( self.root, link ) )
+        cgroup = makeCgroup( 'h1', root=self.root )
+        self.assertTrue( isinstance( cgroup, CgroupV1 ) )
+        self.assertEqual( len( cgroup.dirs() ), 2 )
+        cgroup.setCPUQuota( 100000, -1 )
+        self.assertEqual( cgroup.get( 'cpu', 'cfs_quota_us' ), '-1' )
+        cgroup.addPid( 42 )
+        self.assertEqual( readFile( os.path.join(
+            self.root, 'cpu', 'h1', 'cgroup.procs' ) ), '42\n' )
+        self.assertFalse( os.path.exists( os.path.join(
+            self.root, 'cpuset', 'h1', 'cgroup.procs' ) ) )
+
+    def testV2( self ):
+        "Unified hierarchy uses cpu.max and enables controllers once"
+        open( os.path.join( self.root, 'cgroup.controllers' ), 'w' ).close()
+        cgroup = makeCgroup( 'h1', root=self.root )
+        self.assertTrue( isinstance( cgroup, CgroupV2 ) )
+        self.assertEqual( cgroup.dirs(), [ os.path.join( self.root, 'h1' ) ] )
+        # The last controller enabled is the last one written
+        self.assertEqual( readFile( os.path.join(
+            self.root, 'cgroup.subtree_control' ) ), '+cpuset\n' )
+        cgroup.setCPUQuota( 100000, 50000 )
+        self.assertEqual( cgroup.get( 'cpu', 'max' ), '50000 100000' )
+        cgroup.setCPUQuota( 100000, -1 )
+        self.assertEqual( cgroup.get( 'cpu', 'max' ), 'max 100000' )
+        cgroup.set( 'cpu', 'stat', 'usage_usec 1500\nuser_usec 1000' )
+        self.assertEqual( cgroup.cpuUsage(), 1500000 )
+        self.assertRaises( Exception, cgroup.setRT, 100000, 50000 )
+
+    def testLimits( self ):
+        "Memory, process and I/O limits and their events"
+        open( os.path.join( self.root, 'cgroup.controllers' ), 'w' ).close()
+        cgroup = makeCgroup( 'h1', controllers=( 'memory', 'pids', 'io' ),
+                             root=self.root )
+        self.assertEqual( sizeBytes( '512M' ), 512 << 20 )
+        self.assertEqual( sizeBytes( '1.5k' ), 1536 )
+        cgroup.setMemory( limit=sizeBytes( '1G' ), high=-1 )
+        self.assertEqual( cgroup.get( 'memory', 'max' ), str( 1 << 30 ) )
+        self.assertEqual( cgroup.get( 'memory', 'high' ), 'max' )
+        cgroup.setPids( 100 )
+        self.assertEqual( cgroup.get( 'pids', 'max' ), '100' )
+        cgroup.setIO( '8:0', rbps=1000000, wiops=-1 )
+        self.assertEqual( cgroup.get( 'io', 'max' ),
+                          '8:0 rbps=1000000 wiops=max' )
+        cgroup.set( 'memory', 'events',
+                    'low 0\nhigh 7\nmax 3\noom 1\noom_kill 1' )
+        cgroup.set( 'pids', 'events', 'max 2' )
+        events = cgroup.events()
+        self.assertEqual( ( events[ 'mem_high' ], events[ 'mem_max' ],
+                            events[ 'oom_kill' ], events[ 'pids_max' ],
+                            events[ 'cpu_throttled' ] ), ( 7, 3, 1, 2, 0 ) )
+
+    def testSampler( self ):
+        "Sampler re-reads open stat files"
+        open( os.path.join( self.root, 'cgroup.controllers' ), 'w' ).close()
+        cgroups = [ makeCgroup( name, root=self.root )
+                    for name in 'h1', 'h2' ]
+        for cgroup in cgroups:
+            cgroup.set( 'cpu', 'stat', 'usage_usec 0\nnr_throttled 0\n'
+                        'throttled_usec 0' )
+        sampler = CpuSampler( cgroups, interval=.01 )
+        sampler.sample()
+        cgroups[ 0 ].set( 'cpu', 'stat', 'usage_usec 500000\n'
+                          'nr_throttled 3\nthrottled_usec 20000' )
+        sampler.sample()
+        # Pretend the samples were one second apart
+        sampler.times[ 1 ] = sampler.times[ 0 ] + 1
+        sampler.close()
+        self.assertEqual( sampler.fractions( 'h1', cores=2 ), [ .25 ] )
+        self.assertEqual( sampler.fractions( 'h2' ), [ 0 ] )
+        self.assertEqual( sampler.throttling( 'h1' ), ( 3, .02 ) )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Tests for topology-aware CPU pinning plans (no root required)."""
+
+import unittest
+
+from mininet.cpuplan import CpuPlanner, parseCpuList, cpuList
+from mininet.topo import LinearTopo
+from mininet.topolib import TreeTopo
+from mininet.log import setLogLevel
+
+
+# Two NUMA nodes with four cores each
+twoNodes = { cpu: ( cpu // 4, cpu // 4, cpu % 4 ) for cpu in range( 8 ) }
+
+
+class testCpuPlan( unittest.TestCase ):
+    "Test CPU lists and host placement"
+
+    def testCpuLists( self ):
+        "CPU list strings round-trip"
+        self.assertEqual( parseCpuList( '0-3,8,10-11\n' ),
+                          [ 0, 1, 2, 3, 8, 10, 11 ] )
+        self.assertEqual( cpuList( [ 11, 0, 1, 2, 3, 8, 10 ] ),
+                          '0-3,8,10-11' )
+
+    def testEdgeGroups( self ):
+        "Hosts on one edge switch share cores and a NUMA node"
+        planner = CpuPlanner( topology=twoNodes )
+        plan = planner.plan( LinearTopo( k=2, n=4 ) )
+        self.assertEqual( set( plan[ 'h%ds1' % i ][ 'cores' ]
+                               for i in range( 1, 5 ) ), set( range( 4 ) ) )
+        self.assertEqual( set( plan[ 'h%ds2' % i ][ 'mems' ]
+                               for i in range( 1, 5 ) ), set( [ 1 ] ) )
+
+    def testReserved( self ):
+        "Reserved cores are not used for hosts"
+        planner = CpuPlanner( switchCores=2, controlCores=1,
+                              topology=twoNodes )
+        plan = planner.plan( TreeTopo( depth=2, fanout=4 ) )
+        self.assertEqual( planner.switchCpus, [ 5, 6 ] )
+        self.assertEqual( planner.controlCpus, [ 7 ] )
+        cores = [ placement[ 'cores' ] for placement in plan.values() ]
+        self.assertEqual( len( cores ), 16 )
+        self.assertEqual( set( cores ), set( range( 5 ) ) )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Tests for the built-in OpenFlow controller (no root or switches
+   required)."""
+
+import socket
+import struct
+import unittest
+
+from mininet.ofcontroller import ( OFController, OFP10, OFP13, HELLO,
+                                   FEATURES_REQUEST, FEATURES_REPLY,
+                                   PACKET_IN, PACKET_OUT, FLOW_MOD,
+                                   NO_BUFFER, header, message, hello,
+                                   macBytes, match13 )
+from mininet.log import setLogLevel
+
+
+def frame( dst, src ):
+    "Return Ethernet frame from src to dst"
+    return macBytes( dst ) + macBytes( src ) + '\x08\x00' + '\0' * 46
+
+def packetIn( version, inPort, data ):
+    "Return PACKET_IN for data received on inPort"
+    if version == OFP10:
+        body = struct.pack( '!IHHBx', NO_BUFFER, len( data ), inPort, 0 )
+    else:
+        body = ( struct.pack( '!IHBBQ', NO_BUFFER, len( data ), 0, 0, 0 ) +
+                 match13( inPort=inPort ) + '\0\0' )
+    return message( version, PACKET_IN, body + data )
+
+
+class Switch( object ):
+    "Switch end of a connection to an OFController"
+
+    def __init__( self, controller ):
+        self.controller = controller
+        self.sock = socket.create_connection(
+            ( '127.0.0.1', controller.port ) )
+        self.sock.setblocking( False )
+        self.inbuf = ''
+
+    def exchange( self, data, count ):
+        """Send data and run controller until count messages arrive
+           returns: [ ( version, type, body ) ]"""
+        if data:
+            self.sock.sendall( data )
+        msgs = []
+        for _ in range( 100 ):
+            self.controller.step( timeout=0.01 )
+            try:
+                self.inbuf += self.sock.recv( 65536 )
+            except socket.error:
+                pass
+            while len( self.inbuf ) >= header.size:
+                version, msgType, length, _xid = header.unpack_from(
+                    self.inbuf )
+                msgs.append( ( version, msgType,
+                               self.inbuf[ header.size: length ] ) )
+                self.inbuf = self.inbuf[ length: ]
+            if len( msgs ) >= count:
+                break
+        return msgs
+
+    def connect( self, version, dpid, helloMsg=None ):
+        """Complete handshake
+           returns: messages sent after FEATURES_REPLY"""
+        msgs = self.exchange( helloMsg or message( version, HELLO ), 2 )
+        self.version = msgs[ 1 ][ 0 ]
+        assert [ m[ 1 ] for m in msgs ] == [ HELLO, FEATURES_REQUEST ]
+        reply = message( self.version, FEATURES_REPLY,
+                         struct.pack( '!QIB3xII', dpid, 0, 1, 0, 0 ) )
+        return self.exchange( reply, 1 if self.version == OFP13 else 0 )
+
+    def close( self ):
+        "Close connection"
+        self.sock.close()
+
+
+class testController( unittest.TestCase ):
+    "Drive OFController with stand-in switches"
+
+    def setUp( self ):
+        self.controller = None
+
+    def tearDown( self ):
+        if self.controller:
+            self.controller.stop()
+
+    def start( self, **kwargs ):
+        "Start controller on a free port"
+        self.controller = OFController( port=0, address='127.0.0.1',
+                                        **kwargs )
+        return self.controller
+
+    def testNegotiation( self ):
+        "Version bitmaps select 1.3; OpenFlow 1.0 HELLOs select 1.0"
+        self.start()
+        switch13 = Switch( self.controller )
+        msgs = switch13.connect( OFP13, 1, helloMsg=hello() )
+        self.assertEqual( switch13.version, OFP13 )
+        # OpenFlow 1.3 switches get a table-miss flow
+        self.assertEqual( [ m[ 1 ] for m in msgs ], [ FLOW_MOD ] )
+        switch10 = Switch( self.controller )
+        switch10.connect( OFP10, 2 )
+        self.assertEqual( switch10.version, OFP10 )
+        self.assertEqual( self.controller.stats[ 'switches' ], 2 )
+
+    def testLearning( self ):
+        "Unknown destinations are flooded; known ones get a flow"
+        self.start()
+        for version in OFP10, OFP13:
+            switch = Switch( self.controller )
+            switch.connect( version, version )
+            h1, h2 = '00:00:00:00:00:01', '00:00:00:00:00:02'
+            msgs = switch.exchange( packetIn( version, 1,
+                                              frame( h2, h1 ) ), 1 )
+            self.assertEqual( [ m[ 1 ] for m in msgs ], [ PACKET_OUT ] )
+            msgs = switch.exchange( packetIn( version, 2,
+                                              frame( h1, h2 ) ), 2 )
+            self.assertEqual( [ m[ 1 ] for m in msgs ],
+                              [ FLOW_MOD, PACKET_OUT ] )
+            self.assertTrue( macBytes( h1 ) in msgs[ 0 ][ 2 ] )
+            switch.close()
+
+    def testProactive( self ):
+        "Routes are installed on connect and misses use the tree"
+        routes = { 7: { 'routes': [ ( '00:00:00:00:00:01', 1 ),
+                                    ( '00:00:00:00:00:02', 2 ) ],
+                        'flood': [ 1, 3 ] } }
+        self.start( mode='proactive', routes=routes )
+        switch = Switch( self.controller )
+        msgs = switch.connect( OFP10, 7 )
+        msgs += switch.exchange( None, 4 )
+        # Two unicast flows and one broadcast flow per flood port
+        self.assertEqual( [ m[ 1 ] for m in msgs ], [ FLOW_MOD ] * 4 )
+        data = frame( '00:00:00:00:00:09', '00:00:00:00:00:01' )
+        msgs = switch.exchange( packetIn( OFP10, 1, data ), 1 )
+        self.assertEqual( [ m[ 1 ] for m in msgs ], [ PACKET_OUT ] )
+        # Packets arriving off the tree are dropped
+        msgs = switch.exchange( packetIn( OFP10, 2, data ), 1 )
+        self.assertEqual( msgs, [] )
+        switch.close()
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Tests for the OVSDB client, using a small local stand-in for
+   ovsdb-server (no root or Open vSwitch required)."""
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from copy import deepcopy
+from time import time
+from uuid import uuid4
+
+from mininet.ovsdb import OVSDB, OVSDBError, ovsSet, setItems
+from mininet.node import OVSSwitch
+from mininet.log import setLogLevel
+
+
+class FakeSwitch( object ):
+    "Just enough of a switch for OVSSwitch.monitorConnected()"
+
+    def __init__( self, name, failMode ):
+        self.name = name
+        self.failMode = failMode
+
+
+class StandInServer( object ):
+    """In-memory subset of ovsdb-server: transact (insert, select,
+       update, mutate, delete), monitor and echo, with garbage
+       collection of unreferenced rows and unique names"""
+
+    # Tables and the columns which refer to their children
+    tables = { 'Open_vSwitch': 'bridges', 'Bridge': 'ports',
+               'Port': 'interfaces', 'Interface': None,
+               'Controller': None }
+
+    def __init__( self, path ):
+        self.rows = { table: {} for table in self.tables }
+        self.rows[ 'Open_vSwitch' ][ str( uuid4() ) ] = {
+            'bridges': ovsSet( [] ), 'next_cfg': 0, 'cur_cfg': 0 }
+        self.monitors = {}  # monitor id -> { table: columns }
+        self.echo = False  # send an echo request before each reply
+        self.lock = threading.Lock()
+        self.listener = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+        self.listener.bind( path )
+        self.listener.listen( 1 )
+        self.conn = None
+        self.thread = threading.Thread( target=self.serve )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def send( self, msg ):
+        "Send message to client"
+        self.conn.sendall( json.dumps( msg ) )
+
+    def serve( self ):
+        "Serve one client connection"
+        self.conn, _addr = self.listener.accept()
+        decoder, buf = json.JSONDecoder(), ''
+        while True:
+            data = self.conn.recv( 65536 )
+            if not data:
+                break
+            buf += data
+            while buf.strip():
+                try:
+                    msg, index = decoder.raw_decode( buf.lstrip() )
+                except ValueError:
+                    break
+                buf = buf.lstrip()[ index: ]
+                with self.lock:
+                    self.dispatch( msg )
+
+    def dispatch( self, msg ):
+        "Handle one request"
+        method, params = msg.get( 'method' ), msg.get( 'params' )
+        if method is None:
+            # Reply to our echo request
+            return
+        if self.echo:
+            self.send( { 'method': 'echo', 'params': [], 'id': 'echo' } )
+        result, error = None, None
+        if method == 'transact':
+            result = self.transact( params[ 1: ] )
+        elif method == 'monitor':
+            result = self.monitor( params[ 1 ], params[ 2 ] )
+        elif method == 'monitor_cancel':
+            del self.monitors[ params[ 0 ] ]
+            result = {}
+        else:
+            error = 'unknown method'
+        self.send( { 'id': msg[ 'id' ], 'result': result, 'error': error } )
+
+    @staticmethod
+    def resolve( value, names ):
+        "Replace named-uuids in value"
+        if isinstance( value, list ):
+            if value[ :1 ] == [ 'named-uuid' ]:
+                return [ 'uuid', names[ value[ 1 ] ] ]
+            return [ StandInServer.resolve( v, names ) for v in value ]
+        if isinstance( value, dict ):
+            return { k: StandInServer.resolve( v, names )
+                     for k, v in value.items() }
+        return value
+
+    def match( self, uuid, row, where ):
+        "Does row match where conditions?"
+        for column, function, value in where:
+            assert function == '=='
+            actual = [ 'uuid', uuid ] if column == '_uuid' else row.get(
+                column )
+            if actual != value:
+                return False
+        return True
+
+    def select( self, table, where ):
+        "Return matching ( uuid, row ) pairs"
+        return [ ( uuid, row ) for uuid, row in self.rows[ table ].items()
+                 if self.match( uuid, row, where ) ]
+
+    def transact( self, ops ):
+        "Run a transaction, returning results"
+        before = deepcopy( self.rows )
+        names, results = {}, []
+        for op in ops:
+            op = self.resolve( op, names )
+            kind, table = op[ 'op' ], op[ 'table' ]
+            if kind == 'insert':
+                uuid = str( uuid4() )
+                names[ op.get( 'uuid-name' ) ] = uuid
+                self.rows[ table ][ uuid ] = dict( op[ 'row' ] )
+                result = { 'uuid': [ 'uuid', uuid ] }
+            elif kind == 'select':
+                rows = [ dict( row, _uuid=[ 'uuid', uuid ] )
+                         for uuid, row in self.select( table, op[ 'where' ] ) ]
+                if 'columns' in op:
+                    rows = [ { c: row.get( c ) for c in op[ 'columns' ] }
+                             for row in rows ]
+                result = { 'rows': rows }
+            elif kind in ( 'update', 'mutate', 'delete' ):
+                matches = self.select( table, op[ 'where' ] )
+                for uuid, row in matches:
+                    if kind == 'delete':
+                        del self.rows[ table ][ uuid ]
+                    elif kind == 'update':
+                        row.update( op[ 'row' ] )
+                    else:
+                        self.mutate( row, op[ 'mutations' ] )
+                result = { 'count': len( matches ) }
+            results.append( result )
+        self.collectGarbage()
+        names = [ row[ 'name' ] for row in self.rows[ 'Bridge' ].values() ]
+        if len( names ) != len( set( names ) ):
+            self.rows = before
+            return results + [ { 'error': 'constraint violation',
+                                 'details': 'duplicate bridge name' } ]
+        # Pretend that ovs-vswitchd has applied the changes
+        for row in self.rows[ 'Open_vSwitch' ].values():
+            row[ 'cur_cfg' ] = row[ 'next_cfg' ]
+        self.notify( before )
+        return results
+
+    @staticmethod
+    def mutate( row, mutations ):
+        "Apply mutations to row"
+        for column, mutator, value in mutations:
+            if mutator == '+=':
+                row[ column ] += value
+                continue
+            items = setItems( row.get( column, ovsSet( [] ) ) )
+            if mutator == 'insert':
+                items = items + [ v for v in setItems( value )
+                                  if v not in items ]
+            elif mutator == 'delete':
+                items = [ v for v in items if v not in setItems( value ) ]
+            row[ column ] = ovsSet( items )
+
+    def collectGarbage( self ):
+        "Delete unreferenced rows of non-root tables"
+        referenced = set( self.rows[ 'Open_vSwitch' ] )
+        for parent in 'Open_vSwitch', 'Bridge', 'Port':
+            column = self.tables[ parent ]
+            for uuid, row in self.rows[ parent ].items():
+                if uuid not in referenced:
+                    continue
+                for _, child in setItems( row.get( column, ovsSet( [] ) ) ):
+                    referenced.add( child )
+                if parent == 'Bridge':
+                    for _, child in setItems( row.get( 'controller',
+                                                       ovsSet( [] ) ) ):
+                        referenced.add( child )
+        for table, rows in self.rows.items():
+            for uuid in list( rows ):
+                if uuid not in referenced and table != 'Open_vSwitch':
+                    del rows[ uuid ]
+
+    def monitor( self, monitorId, requests ):
+        "Start monitoring and return initial rows"
+        tables = { table: request.get( 'columns' )
+                   for table, request in requests.items() }
+        self.monitors[ monitorId ] = tables
+        return { table: { uuid: { 'new': self.filter( row, columns ) }
+                          for uuid, row in self.rows[ table ].items() }
+                 for table, columns in tables.items() }
+
+    @staticmethod
+    def filter( row, columns ):
+        "Return monitored columns of row"
+        if columns is None:
+            return dict( row )
+        return { c: row[ c ] for c in columns if c in row }
+
+    def notify( self, before ):
+        "Send updates for changed rows to monitors"
+        for monitorId, tables in self.monitors.items():
+            update = {}
+            for table, columns in tables.items():
+                changes = {}
+                rows = self.rows[ table ]
+                for uuid in set( before[ table ] ) | set( rows ):
+                    old, new = before[ table ].get( uuid ), rows.get( uuid )
+                    if new is None:
+                        old = self.filter( old, columns )
+                        changes[ uuid ] = { 'old': old }
+                    elif ( old is None or old != new or
+                           table == 'Open_vSwitch' ):
+                        new = self.filter( new, columns )
+                        changes[ uuid ] = { 'new': new }
+                if changes:
+                    update[ table ] = changes
+            if update:
+                self.send( { 'method': 'update', 'id': None,
+                             'params': [ monitorId, update ] } )
+
+    def setColumn( self, table, name, column, value ):
+        "Change column of named row, as ovs-vswitchd would"
+        with self.lock:
+            before = deepcopy( self.rows )
+            for row in self.rows[ table ].values():
+                if row.get( 'name' ) == name:
+                    row[ column ] = value
+            self.notify( before )
+
+    def names( self, table ):
+        "Return names of rows in table"
+        with self.lock:
+            return sorted( row.get( 'name' )
+                           for row in self.rows[ table ].values() )
+
+
+class testOVSDB( unittest.TestCase ):
+    "Test OVSDB client against a stand-in server"
+
+    def setUp( self ):
+        self.tmpdir = tempfile.mkdtemp()
+        path = os.path.join( self.tmpdir, 'db.sock' )
+        self.server = StandInServer( path )
+        self.db = OVSDB( path, timeout=5 )
+
+    def tearDown( self ):
+        self.db.close()
+        shutil.rmtree( self.tmpdir )
+
+    def addBridge( self, name, ports=(), controllers=() ):
+        "Create bridge with ports and controllers"
+        self.db.transact(
+            self.db.addBridgeOps( name, [ ( p, {} ) for p in ports ],
+                                  [ { 'target': c } for c in controllers ],
+                                  { 'fail_mode': 'secure' } ),
+            wait=True )
+
+    def testAddDelBridge( self ):
+        "Add and delete bridges with ports and controllers"
+        self.addBridge( 's1', [ 's1-eth1', 's1-eth2' ],
+                        [ 'tcp:1.2.3.4:6653' ] )
+        self.addBridge( 's2', [ 's2-eth1' ] )
+        self.assertEqual( self.server.names( 'Bridge' ), [ 's1', 's2' ] )
+        self.assertEqual( self.server.names( 'Port' ),
+                          [ 's1', 's1-eth1', 's1-eth2', 's2', 's2-eth1' ] )
+        rows = self.db.select( 'Bridge', [ [ 'name', '==', 's1' ] ],
+                               [ 'controller', 'fail_mode' ] )
+        self.assertEqual( rows[ 0 ][ 'fail_mode' ], 'secure' )
+        self.assertEqual( len( setItems( rows[ 0 ][ 'controller' ] ) ), 1 )
+        # Ports, interfaces and controllers are garbage collected
+        self.db.delBridges( [ 's1', 'nonexistent' ] )
+        self.assertEqual( self.server.names( 'Bridge' ), [ 's2' ] )
+        self.assertEqual( self.server.names( 'Interface' ),
+                          [ 's2', 's2-eth1' ] )
+        self.assertEqual( self.server.names( 'Controller' ), [] )
+
+    def testReplaceBridge( self ):
+        "Replace existing bridge in one transaction"
+        self.addBridge( 's1', [ 's1-eth1' ] )
+        self.db.transact( self.db.delBridgeOps( [ 's1' ] ) +
+                          self.db.addBridgeOps( 's1', [ ( 's1-eth2', {} ) ] ) )
+        self.assertEqual( self.server.names( 'Bridge' ), [ 's1' ] )
+        self.assertEqual( self.server.names( 'Port' ), [ 's1', 's1-eth2' ] )
+
+    def testError( self ):
+        "Failed transactions raise OVSDBError"
+        self.addBridge( 's1' )
+        self.assertRaises( OVSDBError, self.addBridge, 's1' )
+        self.assertEqual( self.server.names( 'Bridge' ), [ 's1' ] )
+
+    def testPorts( self ):
+        "Add and delete ports of an existing bridge"
+        self.addBridge( 's1' )
+        self.db.transact( self.db.addPortOps( 's1', 's1-eth1',
+                                              { 'ofport_request': 1 } ) )
+        self.assertEqual( self.server.names( 'Port' ), [ 's1', 's1-eth1' ] )
+        self.db.transact( self.db.delPortOps( 's1', [ 's1-eth1' ] ) )
+        self.assertEqual( self.server.names( 'Port' ), [ 's1' ] )
+
+    def testLargeTransaction( self ):
+        "Many bridges and ports in one transaction"
+        ops = []
+        for i in range( 200 ):
+            name = 's%d' % i
+            ports = [ ( '%s-eth%d' % ( name, j ), {} ) for j in range( 20 ) ]
+            ops += self.db.addBridgeOps( name, ports )
+        self.db.transact( ops, wait=True )
+        self.assertEqual( len( self.server.names( 'Interface' ) ), 200 * 21 )
+
+    def testMonitor( self ):
+        "Monitor reports changed columns"
+        self.addBridge( 's1', controllers=[ 'tcp:1.2.3.4:6653' ] )
+        self.server.rows[ 'Controller' ].values()[ 0 ][ 'name' ] = 'c0'
+        rows = self.db.monitor( 'Controller', [ 'is_connected' ] )
+        self.assertEqual( len( rows ), 1 )
+        self.server.setColumn( 'Controller', 'c0', 'is_connected', True )
+        updates = self.db.updates( timeout=5 )
+        self.assertEqual( [ row for _table, _uuid, row in updates ],
+                          [ { 'is_connected': True } ] )
+        self.assertEqual( self.db.updates( timeout=0 ), [] )
+
+    def testMonitorConnected( self ):
+        "OVSSwitch.monitorConnected() returns when switches connect"
+        for name in 's1', 's2':
+            self.addBridge( name, controllers=[ 'tcp:1.2.3.4:6653' ] )
+        for row in self.server.rows[ 'Controller' ].values():
+            row[ 'name' ] = 'c0'
+        switches = [ FakeSwitch( 's1', 'secure' ),
+                     FakeSwitch( 's2', 'secure' ),
+                     FakeSwitch( 's3', 'standalone' ) ]
+        OVSSwitch.dbConnection = self.db
+        self.addCleanup( setattr, OVSSwitch, 'dbConnection', None )
+        connected = OVSSwitch.monitorConnected( switches, time() + 0.2 )
+        self.assertEqual( connected, switches[ 2: ] )
+        timer = threading.Timer( 0.2, self.server.setColumn,
+                                 ( 'Controller', 'c0', 'is_connected', True ) )
+        timer.start()
+        start = time()
+        connected = OVSSwitch.monitorConnected( switches, time() + 5 )
+        self.assertEqual( set( connected ), set( switches ) )
+        self.assertTrue( time() - start < 1 )
+
+    def testEcho( self ):
+        "Client answers echo requests while waiting for replies"
+        self.server.echo = True
+        self.addBridge( 's1' )
+        self.assertEqual( self.server.names( 'Bridge' ), [ 's1' ] )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Tests for proactive route computation (no root or switches required)."""
+
+import unittest
+
+from mininet.routing import unicastRoutes, spanningTree, switchFlows
+from mininet.log import setLogLevel
+
+
+class Node( object ):
+    "Named stand-in for a switch"
+
+    def __init__( self, name ):
+        self.name = name
+
+    def __repr__( self ):
+        return self.name
+
+
+def ring( n ):
+    """Return adjacency and host ports for a ring of n switches, with
+       port 1 to the next switch, port 2 to the previous switch and
+       one host (MAC 00:00:00:00:00:0i) on port 3 of switch i"""
+    switches = [ Node( 's%d' % i ) for i in range( 1, n + 1 ) ]
+    adjacency = { s: [] for s in switches }
+    for i, s in enumerate( switches ):
+        nxt = switches[ ( i + 1 ) % n ]
+        adjacency[ s ].append( ( nxt, 1, 2 ) )
+        adjacency[ nxt ].append( ( s, 2, 1 ) )
+    hostPorts = { s: [ ( '00:00:00:00:00:%02x' % ( i + 1 ), 3 ) ]
+                  for i, s in enumerate( switches ) }
+    return switches, adjacency, hostPorts
+
+
+class testRouting( unittest.TestCase ):
+    "Test shortest paths, ECMP and flooding"
+
+    def testShortest( self ):
+        "Every switch has exactly one next hop to every host"
+        switches, adjacency, hostPorts = ring( 4 )
+        routes = unicastRoutes( adjacency, hostPorts )
+        s1, s2, s3, s4 = switches
+        self.assertEqual( routes[ s1 ][ '00:00:00:00:00:01' ], ( 3, ) )
+        self.assertEqual( routes[ s1 ][ '00:00:00:00:00:02' ], ( 1, ) )
+        self.assertEqual( routes[ s1 ][ '00:00:00:00:00:04' ], ( 2, ) )
+        self.assertEqual( len( routes[ s1 ][ '00:00:00:00:00:03' ] ), 1 )
+        for switch in s2, s3, s4:
+            self.assertEqual( len( routes[ switch ] ), 4 )
+            for ports in routes[ switch ].values():
+                self.assertEqual( len( ports ), 1 )
+
+    def testECMP( self ):
+        "Equal-cost next hops share one select group"
+        switches, adjacency, hostPorts = ring( 4 )
+        routes = unicastRoutes( adjacency, hostPorts, ecmp=True )
+        s1 = switches[ 0 ]
+        self.assertEqual( routes[ s1 ][ '00:00:00:00:00:03' ], ( 1, 2 ) )
+        flows, groups = switchFlows( routes[ s1 ], set( [ 1, 2, 3 ] ),
+                                     ecmp=True )
+        self.assertEqual( groups, [ 'group_id=1,type=select,'
+                                    'bucket=output:1,bucket=output:2' ] )
+        self.assertTrue( 'priority=100,dl_dst=00:00:00:00:00:03,'
+                         'actions=group:1' in flows )
+        self.assertEqual( len( flows ), 4 + 3 )
+
+    def testSpanningTree( self ):
+        "Flooding uses a loop-free tree"
+        switches, adjacency, _hostPorts = ring( 5 )
+        tree = spanningTree( adjacency )
+        # A tree on n switches has n - 1 links, i.e. 2n - 2 ports
+        self.assertEqual( sum( len( ports ) for ports in tree.values() ),
+                          2 * len( switches ) - 2 )
+        # A second component gets its own tree
+        other, adjacency2, _hostPorts = ring( 3 )
+        adjacency.update( adjacency2 )
+        tree = spanningTree( adjacency )
+        self.assertEqual( sum( len( tree[ s ] ) for s in other ), 4 )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
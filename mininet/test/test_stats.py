@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Tests for statistics parsing and rates (no root or switches required)."""
+
+import unittest
+
+from mininet.stats import ( parseFlows, parsePorts, parseTables,
+                            StatsCollector, Sample )
+from mininet.log import setLogLevel
+
+
+flowText = """NXST_FLOW reply (xid=0x4):
+ cookie=0x0, duration=5.123s, table=0, n_packets=10, n_bytes=980,\
+ idle_age=2, priority=1,in_port=1 actions=output:2
+ cookie=0x1f, duration=5.1s, table=1, n_packets=0, n_bytes=0,\
+ priority=0 actions=CONTROLLER:65535
+"""
+
+portText = """OFPST_PORT reply (xid=0x2): 2 ports
+  port LOCAL: rx pkts=0, bytes=0, drop=0, errs=0, frame=0, over=0, crc=0
+           tx pkts=0, bytes=0, drop=?, errs=0, coll=0
+  port  "s1-eth1": rx pkts=10, bytes=868, drop=0, errs=0, frame=0, over=0,\
+ crc=0
+           tx pkts=15, bytes=1234, drop=0, errs=0, coll=0
+           duration=12.345s
+"""
+
+tableText = """OFPST_TABLE reply (xid=0x2):
+  table 0:
+    active=3, lookup=27, matched=25
+  table 1:
+    active=0, lookup=0, matched=0
+
+  tables 2...253: ditto
+"""
+
+oldTableText = """OFPST_TABLE reply (xid=0x2): 254 tables
+  0: classifier: wild=0x3fffff, max=1000000, active=3
+               lookup=27, matched=25
+"""
+
+
+class testParse( unittest.TestCase ):
+    "Test ovs-ofctl output parsers"
+
+    def testFlows( self ):
+        "Flow statistics are separated from match and actions"
+        flows = parseFlows( flowText )
+        self.assertEqual( len( flows ), 2 )
+        self.assertEqual( flows[ 0 ][ 'match' ], 'priority=1,in_port=1' )
+        self.assertEqual( flows[ 0 ][ 'actions' ], 'output:2' )
+        self.assertEqual( ( flows[ 0 ][ 'n_packets' ],
+                            flows[ 0 ][ 'n_bytes' ] ), ( 10, 980 ) )
+        self.assertEqual( flows[ 0 ][ 'duration' ], 5.123 )
+        self.assertEqual( ( flows[ 1 ][ 'table' ], flows[ 1 ][ 'cookie' ] ),
+                          ( 1, 0x1f ) )
+
+    def testPorts( self ):
+        "Port counters are named by direction"
+        ports = parsePorts( portText )
+        self.assertEqual( sorted( ports ), [ 'LOCAL', 's1-eth1' ] )
+        port = ports[ 's1-eth1' ]
+        self.assertEqual( ( port[ 'rx_packets' ], port[ 'rx_bytes' ],
+                            port[ 'tx_packets' ], port[ 'tx_bytes' ] ),
+                          ( 10, 868, 15, 1234 ) )
+        self.assertEqual( port[ 'duration' ], 12.345 )
+        self.assertEqual( ports[ 'LOCAL' ][ 'tx_dropped' ], None )
+
+    def testTables( self ):
+        "Both dump-tables formats are parsed"
+        for text in tableText, oldTableText:
+            tables = parseTables( text )
+            self.assertEqual( tables[ 0 ][ 'active' ], 3 )
+            self.assertEqual( tables[ 0 ][ 'matched' ], 25 )
+        self.assertEqual( sorted( parseTables( tableText ) ), [ 0, 1 ] )
+
+
+class testRates( unittest.TestCase ):
+    "Test deltas and rates between samples"
+
+    @staticmethod
+    def sample( when, rxBytes, packets ):
+        "Return a sample for one switch"
+        sample = Sample()
+        sample.times[ 's1' ] = when
+        sample.ports[ 's1' ] = { 1: { 'rx_bytes': rxBytes,
+                                      'tx_bytes': None } }
+        sample.flows[ 's1' ] = [ { 'table': 0, 'match': 'priority=0',
+                                   'n_packets': packets, 'n_bytes': 0 } ]
+        return sample
+
+    def testRates( self ):
+        "Rates are deltas divided by elapsed time"
+        stats = StatsCollector( [] )
+        self.assertRaises( Exception, stats.portDeltas )
+        stats.previous = self.sample( 10, 1000, 5 )
+        stats.current = self.sample( 12, 3000, 9 )
+        self.assertEqual( stats.portDeltas(),
+                          { ( 's1', 1 ): { 'rx_bytes': 2000 } } )
+        self.assertEqual( stats.portRates(),
+                          { ( 's1', 1 ): { 'rx_bytes': 1000 } } )
+        self.assertEqual( stats.flowRates()[ 's1', 0, 'priority=0' ],
+                          { 'n_packets': 2, 'n_bytes': 0 } )
+        keys, rows = stats.portArray( counters=( 'rx_bytes', ),
+                                      rates=True )
+        self.assertEqual( keys, [ ( 's1', 1 ) ] )
+        self.assertEqual( [ list( row ) for row in rows ], [ [ 1000 ] ] )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Tests for Topo and MultiGraph (no root or switches required)."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mininet.topo import Topo, MultiGraph, LinearTopo
+from mininet.topolib import TreeTopo
+from mininet.log import setLogLevel
+
+
+class testMultiGraph( unittest.TestCase ):
+    "Test MultiGraph edge storage"
+
+    def testKeys( self ):
+        "Automatic keys are ordinals per node pair"
+        g = MultiGraph()
+        self.assertEqual( g.add_edge( 'a', 'b' ), 1 )
+        self.assertEqual( g.add_edge( 'b', 'a' ), 2 )
+        self.assertEqual( g.add_edge( 'a', 'c' ), 1 )
+        self.assertEqual( g.add_edge( 'a', 'b', key=5 ), 5 )
+        self.assertEqual( g.add_edge( 'a', 'b' ), 6 )
+        self.assertEqual( sorted( g[ 'a' ][ 'b' ] ), [ 1, 2, 5, 6 ] )
+
+    def testReplaceKey( self ):
+        "Adding an edge with an existing key replaces its data"
+        g = MultiGraph()
+        g.add_edge( 'a', 'b', x=1 )
+        g.add_edge( 'b', 'a', key=1, x=2 )
+        g.add_edge( 'a', 'b', key='k', x=3 )
+        g.add_edge( 'a', 'b', key='k', x=4 )
+        self.assertEqual( len( g.edges() ), 2 )
+        self.assertEqual( g[ 'b' ][ 'a' ][ 1 ], { 'x': 2 } )
+        self.assertEqual( g[ 'a' ][ 'b' ][ 'k' ], { 'x': 4 } )
+
+    def testAdjacency( self ):
+        "Adjacency includes both directions and self-loops"
+        g = MultiGraph()
+        g.add_node( 'd' )
+        g.add_edge( 'a', 'b' )
+        g.add_edge( 'c', 'a' )
+        g.add_edge( 'a', 'a' )
+        self.assertEqual( sorted( g.neighbors( 'a' ) ), [ 'a', 'b', 'c' ] )
+        self.assertEqual( g.neighbors( 'b' ), [ 'a' ] )
+        self.assertEqual( g.neighbors( 'd' ), [] )
+        self.assertEqual( len( g ), 4 )
+        self.assertEqual( g.edges( keys=True ),
+                          [ ( 'a', 'b', 1 ), ( 'c', 'a', 1 ),
+                            ( 'a', 'a', 1 ) ] )
+
+
+class testTopo( unittest.TestCase ):
+    "Test Topo link queries"
+
+    def testSortedLinks( self ):
+        "links( sort=True ) uses natural order"
+        topo = LinearTopo( k=10 )
+        links = topo.links( sort=True )
+        self.assertEqual( links[ :2 ], [ ( 'h1', 's1' ), ( 'h2', 's2' ) ] )
+        self.assertEqual( links[ -1 ], ( 's10', 's9' ) )
+        self.assertEqual( topo.links( sort=True ), links )
+        # Cached order is updated when links are added
+        topo.addHost( 'h0' )
+        topo.addLink( 'h0', 's1' )
+        self.assertEqual( topo.links( sort=True )[ 0 ], ( 'h0', 's1' ) )
+
+    def testLinkInfo( self ):
+        "linkInfo and setlinkInfo"
+        topo = TreeTopo( depth=2, fanout=2 )
+        info = topo.linkInfo( 's1', 's2' )
+        self.assertEqual( ( info[ 'node1' ], info[ 'node2' ] ),
+                          ( 's1', 's2' ) )
+        topo.setlinkInfo( 's2', 's1', dict( info, bw=10 ) )
+        self.assertEqual( topo.linkInfo( 's1', 's2' )[ 'bw' ], 10 )
+        self.assertEqual( len( topo.links() ), 6 )
+        self.assertEqual( topo.links( sort=True, withInfo=True )[ 0 ][ 2 ],
+                          topo.linkInfo( 's1', 's2' ) )
+
+    def testMultiLink( self ):
+        "Multiple links between the same nodes"
+        topo = Topo()
+        topo.addSwitch( 's1' )
+        topo.addSwitch( 's2' )
+        for _ in range( 3 ):
+            topo.addLink( 's1', 's2' )
+        self.assertEqual( topo.links( sort=True, withKeys=True ),
+                          [ ( 's1', 's2', 1 ), ( 's1', 's2', 2 ),
+                            ( 's1', 's2', 3 ) ] )
+        self.assertEqual( topo.port( 's1', 's2' ),
+                          [ ( 1, 1 ), ( 2, 2 ), ( 3, 3 ) ] )
+
+
+class testSnapshot( unittest.TestCase ):
+    "Test topology snapshots and the build cache"
+
+    def setUp( self ):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown( self ):
+        shutil.rmtree( self.tmpdir )
+
+    def testSaveLoad( self ):
+        "Loaded snapshot matches the original topology"
+        topo = TreeTopo( depth=2, fanout=3 )
+        topo.setlinkInfo( 's1', 's2', dict( topo.linkInfo( 's1', 's2' ),
+                                            bw=10 ) )
+        filename = os.path.join( self.tmpdir, 'tree' )
+        topo.save( filename )
+        loaded = TreeTopo.load( filename )
+        self.assertEqual( type( loaded ), TreeTopo )
+        self.assertEqual( loaded.hostNum, topo.hostNum )
+        self.assertEqual( loaded.nodes(), topo.nodes() )
+        self.assertEqual( loaded.links( withKeys=True, withInfo=True ),
+                          topo.links( withKeys=True, withInfo=True ) )
+        self.assertEqual( loaded.port( 's1', 's2' ), topo.port( 's1', 's2' ) )
+        self.assertEqual( loaded.g.neighbors( 's1' ),
+                          topo.g.neighbors( 's1' ) )
+        # Loaded topologies can still be extended
+        loaded.addHost( 'h0' )
+        self.assertEqual( loaded.addLink( 'h0', 's1' ), 1 )
+
+    def testBadSnapshot( self ):
+        "Loading a file which is not a snapshot fails"
+        filename = os.path.join( self.tmpdir, 'bad' )
+        with open( filename, 'w' ) as f:
+            f.write( 'not a topology snapshot' )
+        self.assertRaises( Exception, Topo.load, filename )
+
+    def testCached( self ):
+        "Cached builds are keyed by parameters"
+        self.patchCacheDir()
+        topo = LinearTopo.cached( k=3 )
+        self.assertEqual( len( os.listdir( self.tmpdir ) ), 1 )
+        again = LinearTopo.cached( k=3 )
+        self.assertEqual( again.links( sort=True ), topo.links( sort=True ) )
+        LinearTopo.cached( k=4 )
+        self.assertEqual( len( os.listdir( self.tmpdir ) ), 2 )
+
+    def patchCacheDir( self ):
+        "Use our temporary directory for the build cache"
+        cacheDir = Topo.cacheDir
+        Topo.cacheDir = self.tmpdir
+        self.addCleanup( setattr, Topo, 'cacheDir', cacheDir )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Tests for utility functions (no root required)."""
+
+import errno
+import socket
+import unittest
+from time import time
+
+from mininet.util import tcpProbe, waitListening
+from mininet.log import setLogLevel
+
+
+class testTcpProbe( unittest.TestCase ):
+    "Test TCP readiness probes in our own namespace"
+
+    def setUp( self ):
+        self.server = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+        self.server.bind( ( '127.0.0.1', 0 ) )
+        self.port = self.server.getsockname()[ 1 ]
+
+    def tearDown( self ):
+        self.server.close()
+
+    def testListening( self ):
+        "A listening socket is detected at once"
+        self.server.listen( 1 )
+        start = time()
+        self.assertEqual( tcpProbe( '127.0.0.1', self.port ), 0 )
+        self.assertTrue( waitListening( port=self.port, timeout=1 ) )
+        self.assertTrue( time() - start < .5 )
+
+    def testRefused( self ):
+        "Closed ports are retried until timeout"
+        start = time()
+        self.assertEqual( tcpProbe( '127.0.0.1', self.port, timeout=.2 ),
+                          errno.ECONNREFUSED )
+        self.assertTrue( .1 < time() - start < 1 )
+        self.assertFalse( waitListening( port=self.port, timeout=0 ) )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'critical' )
+    unittest.main()
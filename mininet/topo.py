@@ -11,14 +11,58 @@
 setup for testing, and can even be emulated with the Mininet package.
 """
 
-from mininet.util import irange, natural, naturalSeq
+from array import array
+import cPickle
+import gc
+import hashlib
+import inspect
+import os
+import struct
+import zlib
+
+from mininet.util import irange, natural
+from mininet.log import debug, warn
+
+def withoutGC( fn, *args, **kwargs ):
+    """Call fn( *args, **kwargs ) with the cyclic garbage collector
+       paused. Building large topologies allocates many small, acyclic
+       objects, and repeated collections can double the build time."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return fn( *args, **kwargs )
+    finally:
+        if enabled:
+            gc.enable()
+
 
 class MultiGraph( object ):
-    "Utility class to track nodes and edges - replaces networkx.MultiGraph"
+    """Utility class to track nodes and edges - replaces networkx.MultiGraph
+       Nodes are interned as integer ids, and edges are stored in flat
+       arrays; adjacency is built on demand in compressed sparse row
+       (CSR) form, so large graphs are cheap to build and store."""
 
     def __init__( self ):
-        self.node = {}
-        self.edge = {}
+        self.node = {}  # node name -> attribute dict
+        self.names = []  # node id -> node name
+        self.ids = {}  # node name -> node id
+        # Edge i connects node ids src[ i ] and dst[ i ]
+        self.src = array( 'l' )
+        self.dst = array( 'l' )
+        self.keys = []  # edge keys
+        self.attrs = []  # edge attribute dicts
+        self.nextKey = {}  # ( id1, id2 ) -> next ordinal edge key
+        self.explicitKeys = {}  # ( id1, id2, key ) -> edge, for given keys
+        self._csr = None  # cached ( offsets, edges ) adjacency
+
+    def _id( self, node ):
+        "Return id for node, adding it to the graph if necessary"
+        nid = self.ids.get( node )
+        if nid is None:
+            nid = self.ids[ node ] = len( self.names )
+            self.names.append( node )
+            self.node.setdefault( node, {} )
+        return nid
 
     def add_node( self, node, attr_dict=None, **attrs):
         """Add node to graph
@@ -27,6 +71,7 @@ def add_node( self, node, attr_dict=None, **attrs):
            warning: updates attr_dict with attrs"""
         attr_dict = {} if attr_dict is None else attr_dict
         attr_dict.update( attrs )
+        self._id( node )
         self.node[ node ] = attr_dict
 
     def add_edge( self, src, dst, key=None, attr_dict=None, **attrs ):
@@ -37,19 +82,71 @@ def add_edge( self, src, dst, key=None, attr_dict=None, **attrs ):
            warning: udpates attr_dict with attrs"""
         attr_dict = {} if attr_dict is None else attr_dict
         attr_dict.update( attrs )
-        self.node.setdefault( src, {} )
-        self.node.setdefault( dst, {} )
-        self.edge.setdefault( src, {} )
-        self.edge.setdefault( dst, {} )
-        self.edge[ src ].setdefault( dst, {} )
-        entry = self.edge[ dst ][ src ] = self.edge[ src ][ dst ]
+        sid, did = self._id( src ), self._id( dst )
+        pair = ( sid, did ) if sid <= did else ( did, sid )
+        nextKey = self.nextKey.get( pair, 1 )
         # If no key, pick next ordinal number
         if key is None:
-            keys = [ k for k in entry.keys() if isinstance( k, int ) ]
-            key = max( [ 0 ] + keys ) + 1
-        entry[ key ] = attr_dict
+            key = nextKey
+        else:
+            # Replace existing edge with the same key, if any
+            edge = self.explicitKeys.get( pair + ( key, ) )
+            if edge is None and isinstance( key, int ) and key < nextKey:
+                edge = self._findEdge( sid, did, key )
+            if edge is not None:
+                self.attrs[ edge ] = attr_dict
+                return key
+            self.explicitKeys[ pair + ( key, ) ] = len( self.keys )
+        if isinstance( key, int ) and key >= nextKey:
+            self.nextKey[ pair ] = key + 1
+        self.src.append( sid )
+        self.dst.append( did )
+        self.keys.append( key )
+        self.attrs.append( attr_dict )
+        self._csr = None
         return key
 
+    def csr( self ):
+        """Return adjacency in compressed sparse row form
+           returns: offsets, edges where edges[ offsets[ n ]:
+                    offsets[ n + 1 ] ] are the edges of node id n"""
+        if self._csr is None:
+            nodeCount, edgeCount = len( self.names ), len( self.keys )
+            offsets = array( 'l', [ 0 ] * ( nodeCount + 1 ) )
+            for ends in self.src, self.dst:
+                for nid in ends:
+                    offsets[ nid + 1 ] += 1
+            # Self-loops are only listed once
+            for i in xrange( edgeCount ):
+                if self.src[ i ] == self.dst[ i ]:
+                    offsets[ self.src[ i ] + 1 ] -= 1
+            for nid in xrange( nodeCount ):
+                offsets[ nid + 1 ] += offsets[ nid ]
+            fill = array( 'l', offsets )
+            edges = array( 'l', [ 0 ] * offsets[ nodeCount ] )
+            for i in xrange( edgeCount ):
+                sid, did = self.src[ i ], self.dst[ i ]
+                edges[ fill[ sid ] ] = i
+                fill[ sid ] += 1
+                if did != sid:
+                    edges[ fill[ did ] ] = i
+                    fill[ did ] += 1
+            self._csr = offsets, edges
+        return self._csr
+
+    def _edgesOf( self, nid ):
+        "Return edge indices for node id nid"
+        offsets, edges = self.csr()
+        return edges[ offsets[ nid ]: offsets[ nid + 1 ] ]
+
+    def _findEdge( self, sid, did, key ):
+        "Return index of edge sid-did with key, or None"
+        for edge in self._edgesOf( sid ):
+            if ( self.keys[ edge ] == key and
+                 did in ( self.src[ edge ], self.dst[ edge ] ) ):
+                return edge
+        return None
+
     def nodes( self, data=False):
         """Return list of graph nodes
            data: return list of ( node, attrs)"""
@@ -57,35 +154,61 @@ def nodes( self, data=False):
 
     def edges_iter( self, data=False, keys=False ):
         "Iterator: return graph edges"
-        for src, entry in self.edge.iteritems():
-            for dst, keys in entry.iteritems():
-                if src > dst:
-                    # Skip duplicate edges
-                    continue
-                for k, attrs in keys.iteritems():
-                    if data:
-                        if keys:
-                            yield( src, dst, k, attrs )
-                        else:
-                            yield( src, dst, attrs )
-                    else:
-                        if keys:
-                            yield( src, dst, k )
-                        else:
-                            yield( src, dst )
+        names, src, dst = self.names, self.src, self.dst
+        for i, k in enumerate( self.keys ):
+            edge = ( names[ src[ i ] ], names[ dst[ i ] ] )
+            if keys:
+                edge += ( k, )
+            if data:
+                edge += ( self.attrs[ i ], )
+            yield edge
 
     def edges( self, data=False, keys=False ):
         "Return list of graph edges"
         return list( self.edges_iter( data=data, keys=keys ) )
 
+    def neighbors( self, node ):
+        "Return list of nodes adjacent to node"
+        nid = self.ids[ node ]
+        seen = set()
+        result = []
+        for edge in self._edgesOf( nid ):
+            other = self.dst[ edge ] if self.src[ edge ] == nid else (
+                self.src[ edge ] )
+            if other not in seen:
+                seen.add( other )
+                result.append( self.names[ other ] )
+        return result
+
     def __getitem__( self, node ):
-        "Return link dict for given src node"
-        return self.edge[ node ]
+        """Return link dict for given src node
+           (built on demand: modifying it does not modify the graph)"""
+        nid = self.ids[ node ]
+        result = {}
+        for edge in self._edgesOf( nid ):
+            other = self.dst[ edge ] if self.src[ edge ] == nid else (
+                self.src[ edge ] )
+            entry = result.setdefault( self.names[ other ], {} )
+            entry[ self.keys[ edge ] ] = self.attrs[ edge ]
+        return result
 
     def __len__( self ):
         "Return the number of nodes"
         return len( self.node )
 
+    def __getstate__( self ):
+        "Pickle support: store edge arrays as raw bytes"
+        state = dict( self.__dict__, _csr=None )
+        state.update( src=self.src.tostring(), dst=self.dst.tostring() )
+        return state
+
+    def __setstate__( self, state ):
+        "Pickle support: restore edge arrays from raw bytes"
+        src, dst = array( 'l' ), array( 'l' )
+        src.fromstring( state.pop( 'src' ) )
+        dst.fromstring( state.pop( 'dst' ) )
+        self.__dict__.update( state, src=src, dst=dst )
+
     def convertTo( self, cls, data=False, keys=False ):
         """Convert to a new object of networkx.MultiGraph-like class cls
            data: include node and edge data
@@ -112,7 +235,10 @@ def __init__( self, *args, **params ):
         self.lopts = params.pop( 'lopts', {} )
         # ports[src][dst][sport] is port on dst that connects to src
         self.ports = {}
-        self.build( *args, **params )
+        # Cached natural-order nodes and links
+        self._sortedNodes = None
+        self._sortedLinks = {}
+        withoutGC( self.build, *args, **params )
 
     def build( self, *args, **params ):
         "Override this method to build your topology."
@@ -124,6 +250,7 @@ def addNode( self, name, **opts ):
            opts: node options
            returns: node name"""
         self.g.add_node( name, **opts )
+        self._sortedNodes = None
         return name
 
     def addHost( self, name, **opts ):
@@ -156,13 +283,17 @@ def addLink( self, node1, node2, port1=None, port2=None,
         port1, port2 = self.addPort( node1, node2, port1, port2 )
         opts = dict( opts )
         opts.update( node1=node1, node2=node2, port1=port1, port2=port2 )
-        self.g.add_edge(node1, node2, key, opts )
+        key = self.g.add_edge(node1, node2, key, opts )
+        if self._sortedLinks:
+            self._sortedLinks = {}
         return key
 
     def nodes( self, sort=True ):
         "Return nodes in graph"
         if sort:
-            return self.sorted( self.g.nodes() )
+            if self._sortedNodes is None:
+                self._sortedNodes = self.sorted( self.g.nodes() )
+            return list( self._sortedNodes )
         else:
             return self.g.nodes()
 
@@ -206,12 +337,31 @@ def links( self, sort=False, withKeys=False, withInfo=False ):
            withKeys: return link keys
            withInfo: return link info
            returns: list of ( src, dst [,key, info ] )"""
-        links = list( self.iterLinks( withKeys, withInfo ) )
         if not sort:
-            return links
+            return list( self.iterLinks( withKeys, withInfo ) )
         # Ignore info when sorting
         tupleSize = 3 if withKeys else 2
-        return sorted( links, key=( lambda l: naturalSeq( l[ :tupleSize ] ) ) )
+        links = self._sortedLinks.get( tupleSize )
+        if links is None:
+            # Compute each node's natural sort key only once
+            nkeys = {}
+            def nkey( name ):
+                "Cached natural sort key"
+                if name not in nkeys:
+                    nkeys[ name ] = natural( name )
+                return nkeys[ name ]
+            links = withoutGC(
+                sorted, self.iterLinks( withKeys=True, withInfo=True ),
+                key=( lambda l: [ nkey( l[ 0 ] ), nkey( l[ 1 ] ) ] +
+                      [ natural( k ) for k in l[ 2: tupleSize ] ] ) )
+            self._sortedLinks[ tupleSize ] = links
+        if withKeys and withInfo:
+            return list( links )
+        elif withKeys:
+            return [ l[ :3 ] for l in links ]
+        elif withInfo:
+            return [ ( l[ 0 ], l[ 1 ], l[ 3 ] ) for l in links ]
+        return [ l[ :2 ] for l in links ]
 
     # This legacy port management mechanism is clunky and will probably
     # be removed at some point.
@@ -264,8 +414,9 @@ def linkInfo( self, src, dst, key=None ):
 
     def setlinkInfo( self, src, dst, info, key=None ):
         "Set link metadata dict"
-        entry, key = self._linkEntry( src, dst, key )
-        entry[ key ] = info
+        _entry, key = self._linkEntry( src, dst, key )
+        self.g.add_edge( src, dst, key, info )
+        self._sortedLinks = {}
 
     def nodeInfo( self, name ):
         "Return metadata (dict) for node"
@@ -286,6 +437,112 @@ def sorted( items ):
         "Items sorted in natural (i.e. alphabetical) order"
         return sorted( items, key=natural )
 
+    # Topology snapshots
+    #
+    # A snapshot is a small header followed by a compressed pickle
+    # of the graph's node table, edge arrays, port map and link
+    # options. Like --custom files, snapshots can contain arbitrary
+    # Python objects (e.g. cls=...), so only load trusted files.
+
+    snapshotMagic = 'MNTOPO'
+    snapshotVersion = 1
+
+    # Attributes which are part of every snapshot
+    _snapshotAttrs = ( 'g', 'ports', 'hopts', 'sopts', 'lopts' )
+
+    def save( self, filename ):
+        """Save topology snapshot to a file
+           filename: snapshot file name"""
+        state = { attr: getattr( self, attr )
+                  for attr in self._snapshotAttrs }
+        # Also save any attributes set by build(), e.g. self.k
+        state[ 'attrs' ] = { k: v for k, v in self.__dict__.iteritems()
+                             if k not in self._snapshotAttrs
+                             and not k.startswith( '_' ) }
+        state[ 'class' ] = '%s.%s' % ( type( self ).__module__,
+                                       type( self ).__name__ )
+        data = zlib.compress( cPickle.dumps( state, 2 ), 1 )
+        # Write to a temporary file and rename, so that a concurrent
+        # reader never sees a partial snapshot
+        tmpname = '%s.%d.tmp' % ( filename, os.getpid() )
+        with open( tmpname, 'wb' ) as f:
+            f.write( struct.pack( '!6sH', self.snapshotMagic,
+                                  self.snapshotVersion ) )
+            f.write( data )
+        os.rename( tmpname, filename )
+
+    @classmethod
+    def load( cls, filename ):
+        """Load topology snapshot from a file, without calling build()
+           filename: snapshot file name
+           returns: Topo (or subclass) object"""
+        with open( filename, 'rb' ) as f:
+            header = f.read( struct.calcsize( '!6sH' ) )
+            data = f.read()
+        magic, version = struct.unpack( '!6sH', header )
+        if magic != cls.snapshotMagic:
+            raise Exception( '%s is not a Mininet topology snapshot'
+                             % filename )
+        if version != cls.snapshotVersion:
+            raise Exception( 'Unsupported topology snapshot version %d '
+                             'in %s (expected %d)' %
+                             ( version, filename, cls.snapshotVersion ) )
+        state = withoutGC( cPickle.loads, zlib.decompress( data ) )
+        topo = cls.__new__( cls )
+        topo.__dict__.update( state.pop( 'attrs' ) )
+        for attr in cls._snapshotAttrs:
+            setattr( topo, attr, state[ attr ] )
+        topo._sortedNodes = None
+        topo._sortedLinks = {}
+        return topo
+
+    # Topology build cache, keyed by class, class source and parameters
+
+    cacheDir = os.environ.get( 'MININET_TOPO_CACHE',
+                               '/tmp/mininet-topocache' )
+
+    @classmethod
+    def cacheKey( cls, *args, **params ):
+        "Return cache key for cls( *args, **params )"
+        sources = []
+        for klass in cls.__mro__:
+            if klass is Topo:
+                break
+            try:
+                sources.append( inspect.getsource( klass ) )
+            except ( IOError, TypeError ):
+                sources.append( '' )
+        params = sorted( params.items() )
+        key = repr( ( cls.__module__, cls.__name__, sources, args, params,
+                      cls.snapshotVersion ) )
+        return '%s-%s' % ( cls.__name__, hashlib.sha1( key ).hexdigest() )
+
+    @classmethod
+    def cached( cls, *args, **params ):
+        """Return cls( *args, **params ), loading it from the build
+           cache if possible, or building and caching it otherwise.
+           Changing the class's source code invalidates its entries."""
+        filename = os.path.join( cls.cacheDir,
+                                 cls.cacheKey( *args, **params ) )
+        if os.path.exists( filename ):
+            try:
+                debug( '*** Loading cached topology %s\n' % filename )
+                return cls.load( filename )
+            # pylint: disable=broad-except
+            except Exception as e:
+                warn( '*** Ignoring bad topology cache file %s: %s\n' %
+                      ( filename, e ) )
+            # pylint: enable=broad-except
+        topo = cls( *args, **params )
+        try:
+            if not os.path.isdir( cls.cacheDir ):
+                os.makedirs( cls.cacheDir )
+            topo.save( filename )
+        except ( IOError, OSError, cPickle.PicklingError ) as e:
+            warn( '*** Could not cache topology in %s: %s\n' %
+                  ( filename, e ) )
+        return topo
+
 
 # Our idiom defines additional parameters in build(param...)
 # pylint: disable=arguments-differ
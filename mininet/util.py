@@ -3,15 +3,19 @@
 
 from mininet.log import output, info, error, warn, debug
 
-from time import sleep
+from time import sleep, time
 from resource import getrlimit, setrlimit, RLIMIT_NPROC, RLIMIT_NOFILE
 from select import poll, POLLIN, POLLHUP
 from subprocess import call, check_call, Popen, PIPE, STDOUT
+import ctypes
+import errno
 import re
+import select
+import socket
 from fcntl import fcntl, F_GETFL, F_SETFL
 from os import O_NONBLOCK
 import os
-from functools import partial
+from multiprocessing.pool import ThreadPool
 
 # Command execution support
 
@@ -463,6 +467,9 @@ def mountCgroups():
     mounts = quietRun( 'cat /proc/mounts' )
     cgdir = '/sys/fs/cgroup'
     csdir = cgdir + '/cpuset'
+    if os.path.exists( cgdir + '/cgroup.controllers' ):
+        # Unified (v2) hierarchy: all controllers are already there
+        return
     if ('cgroup %s' % cgdir not in mounts and
             'cgroups %s' % cgdir not in mounts):
         raise Exception( "cgroups not mounted on " + cgdir )
@@ -491,6 +498,30 @@ def numCores():
         return 0
     return numCores.ncores
 
+def parallel( fn, items, workers=None ):
+    """Call fn on each item, using up to workers threads; useful for
+       functions which mostly wait for commands to complete
+       workers: maximum number of concurrent calls (len( items ))
+       returns: list of results, in order"""
+    items = list( items )
+    workers = len( items ) if workers is None else workers
+    workers = min( workers, len( items ) )
+    if workers <= 1:
+        return [ fn( item ) for item in items ]
+    pool = ThreadPool( workers )
+    try:
+        return pool.map( fn, items, chunksize=1 )
+    finally:
+        pool.close()
+        pool.join()
+
+def shard( items, count ):
+    """Split items into at most count non-empty shards
+       returns: list of lists"""
+    items = list( items )
+    count = max( min( count, len( items ) ), 1 )
+    return [ items[ i::count ] for i in range( count ) ]
+
 def irange(start, end):
     """Inclusive range from start to end (vs. Python insanity.)
        irange(1,5) -> 1, 2, 3, 4, 5"""
@@ -573,14 +604,18 @@ def __init__( self, *args, **params ):
     return CustomClass
 
 
-def buildTopo( topos, topoStr ):
+def buildTopo( topos, topoStr, cache=False ):
     """Create topology from string with format (object, arg1, arg2,...).
     input topos is a dict of topo names to constructors, possibly w/args.
+    cache: use Topo build cache if the constructor supports it
     """
     topo, args, kwargs = splitArgs( topoStr )
     if topo not in topos:
         raise Exception( 'Invalid topo name %s' % topo )
-    return topos[ topo ]( *args, **kwargs )
+    constructor = topos[ topo ]
+    if cache and getattr( constructor, 'cached', None ):
+        constructor = constructor.cached
+    return constructor( *args, **kwargs )
 
 def ensureRoot():
     """Ensure that we are running as root.
@@ -592,29 +627,99 @@ def ensureRoot():
         exit( 1 )
     return
 
+# TCP readiness probes
+
+# Errors which mean that retrying is pointless
+unreachable = ( errno.ENETUNREACH, errno.EHOSTUNREACH )
+
+def localTcpProbe( ip, port, timeout=0, attempt=1.0, maxDelay=.5 ):
+    """Check whether something is listening on ip:port in our network
+       namespace, retrying with exponential backoff (1 ms, 2 ms, ...
+       maxDelay) until timeout (None: forever)
+       attempt: maximum time to wait for one connection
+       returns: 0 if listening, else errno of the last attempt"""
+    delay = .001
+    end = None if timeout is None else time() + timeout
+    while True:
+        sock = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+        sock.setblocking( False )
+        try:
+            code = sock.connect_ex( ( ip, port ) )
+            if code == errno.EINPROGRESS:
+                wait = attempt if end is None else min(
+                    attempt, max( end - time(), delay ) )
+                _r, writable, _x = select.select( [], [ sock ], [], wait )
+                code = ( sock.getsockopt( socket.SOL_SOCKET,
+                                          socket.SO_ERROR )
+                         if writable else errno.ETIMEDOUT )
+        finally:
+            sock.close()
+        if code == 0 or code in unreachable:
+            return code
+        if end is not None and time() + delay > end:
+            return code
+        sleep( delay )
+        delay = min( delay * 2, maxDelay )
+
+_libc = None
+
+def setns( pid, nstype='net' ):
+    "Move this process into a namespace (net, mnt or uts) of process pid"
+    global _libc  # pylint: disable=global-statement
+    if _libc is None:
+        _libc = ctypes.CDLL( None, use_errno=True )
+    flags = { 'net': 0x40000000, 'mnt': 0x00020000, 'uts': 0x04000000 }
+    fd = os.open( '/proc/%d/ns/%s' % ( pid, nstype ), os.O_RDONLY )
+    try:
+        if _libc.setns( fd, flags[ nstype ] ) != 0:
+            code = ctypes.get_errno()
+            raise OSError( code, os.strerror( code ) )
+    finally:
+        os.close( fd )
+
+def tcpProbe( ip, port, timeout=0, node=None, **kwargs ):
+    """Check whether something is listening on ip:port, as seen from
+       node's network namespace (default: ours); see localTcpProbe()
+       returns: 0 if listening, else an errno value"""
+    if node is None or not node.inNamespace:
+        return localTcpProbe( ip, port, timeout, **kwargs )
+    if getattr( node, 'isRemote', False ):
+        # We can't join a remote namespace, but bash can connect
+        seconds = 1 if timeout is None else max( int( timeout ), 1 )
+        cmd = ( "timeout %d bash -c 'until exec 3<>/dev/tcp/%s/%d; "
+                "do sleep .01; done' 2>/dev/null && echo Connected" %
+                ( seconds, ip, port ) )
+        while 'Connected' not in node.cmd( cmd ):
+            if timeout is not None:
+                return errno.ECONNREFUSED
+        return 0
+    # Probe from a child process which joins node's namespace
+    pid = os.fork()
+    if pid == 0:
+        code = 255
+        try:
+            setns( node.pid )
+            code = localTcpProbe( ip, port, timeout, **kwargs )
+        except OSError as e:
+            code = e.errno
+        finally:
+            os._exit( code )  # pylint: disable=protected-access
+    _pid, status = os.waitpid( pid, 0 )
+    return os.WEXITSTATUS( status )
+
 def waitListening( client=None, server='127.0.0.1', port=80, timeout=None ):
     """Wait until server is listening on port.
+       client: node to connect from (default: root namespace)
        returns True if server is listening"""
-    runCmd = ( client.cmd if client else
-               partial( quietRun, shell=True ) )
-    if not runCmd( 'which telnet' ):
-        raise Exception('Could not find telnet' )
     # pylint: disable=maybe-no-member
     serverIP = server if isinstance( server, basestring ) else server.IP()
-    cmd = ( 'echo A | telnet -e A %s %s' % ( serverIP, port ) )
-    time = 0
-    result = runCmd( cmd )
-    while 'Connected' not in result:
-        if 'No route' in result:
-            rtable = runCmd( 'route' )
-            error( 'no route to %s:\n%s' % ( server, rtable ) )
-            return False
-        if timeout and time >= timeout:
-            error( 'could not connect to %s on port %d\n' % ( server, port ) )
-            return False
-        debug( 'waiting for', server, 'to listen on port', port, '\n' )
-        info( '.' )
-        sleep( .5 )
-        time += .5
-        result = runCmd( cmd )
+    debug( 'waiting for', server, 'to listen on port', port, '\n' )
+    code = tcpProbe( serverIP, port, timeout, node=client )
+    if code in unreachable:
+        rtable = client.cmd( 'route' ) if client else quietRun( 'route' )
+        error( 'no route to %s:\n%s' % ( server, rtable ) )
+        return False
+    if code:
+        error( 'could not connect to %s on port %d\n' % ( server, port ) )
+        return False
     return True